@@ -1,10 +1,14 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, jsonify, send_from_directory
 import os
 import socket
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import secrets
+import hashlib
+import hmac
+import io
 import logging
 import json
+import time
 import urllib.parse
 from dotenv import load_dotenv
 
@@ -33,16 +37,35 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
 # local modules (split responsibilities)
-from utils.pdf_generator import generar_presupuesto_pdf
-from db import get_db
+from utils import email_outbox, pdf_cache, pdf_pool, ticket_termico
+from utils.pdf_generator import COLUMNAS_HISTORIAL
+from db import get_db, open_db, release_db, pool_stats, DB_PATH
 from auth import (
     login_required, role_required, permiso_requerido, tiene_permiso,
-    init_permisos_db, obtener_permisos_usuario,
+    obtener_permisos_usuario,
     PERMISOS_DISPONIBLES, PERMISOS_ADMIN, PERMISOS_TECNICO,
 )
 from alerts import calcular_alertas_reparacion
-from historial import registrar_cambio_estado, validar_transicion
-from audit import registrar_auditoria, obtener_auditoria_reciente, crear_tabla_auditoria
+from historial import cambios_desde, registrar_cambio_estado, validar_transicion
+from audit import registrar_auditoria
+from migrations import migraciones_pendientes, aplicar_migraciones
+from kpis import obtener_kpis
+from paginacion import pagina_keyset, total_cacheado
+from busqueda import buscar as buscar_texto
+from dashboard import datos_dashboard, METRICAS_API
+from cache import en_cache, version_datos
+from cambios import generar_cambios
+from importacion import TIPOS as TIPOS_IMPORTACION, importar as importar_csv
+from facturacion import (
+    FORMATOS as FORMATOS_LOTE, MAX_DOCUMENTOS_LOTE, TIPOS_DOCUMENTO,
+    documentos as documentos_facturacion,
+    documentos_lote, zip_documentos, pdf_combinado,
+)
+from exportaciones import (
+    INFORMES, FILTROS_REPARACIONES, EXPORT_TTL_HORAS,
+    informe_csv, crear_trabajo, obtener_trabajo, listar_trabajos,
+    estado_publico, despertar_worker,
+)
 from utils.security import (
     ensure_csrf_token,
     inject_csrf_token,
@@ -51,8 +74,11 @@ from utils.security import (
     validar_contraseña,
 )
 from utils.email_service import EmailService
+from utils.csv_export import respuesta_csv
 
 app = Flask(__name__)
+# Devolver la conexion de BD de cada peticion al pool del worker
+app.teardown_appcontext(release_db)
 # Trust Railway / Nginx reverse-proxy headers so request.host_url returns https://
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 # Secret key should be provided via environment variable in production
@@ -143,101 +169,18 @@ if STRIPE_SECRET_KEY and not STRIPE_SECRET_KEY.startswith('sk_'):
         _mask_key(STRIPE_SECRET_KEY)
     )
 
-# Inicializar tabla de auditoría
-_conn_init = get_db()
-crear_tabla_auditoria(_conn_init)
-
-# Inicializar tabla de fotos de reparaciones
-_conn_init.execute("""
-    CREATE TABLE IF NOT EXISTS fotos_reparacion (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        reparacion_id INTEGER NOT NULL,
-        filename TEXT NOT NULL,
-        descripcion TEXT,
-        fecha_subida TEXT NOT NULL,
-        subido_por TEXT,
-        FOREIGN KEY (reparacion_id) REFERENCES reparaciones(id) ON DELETE CASCADE
-    )
-""")
-# Añadir columna firma si no existe
+# El esquema lo gestionan las migraciones (python -m migrations), que se
+# ejecutan una vez por despliegue. Aqui solo avisamos si faltan por aplicar.
+_conn_check = get_db()
 try:
-    _conn_init.execute("ALTER TABLE reparaciones ADD COLUMN firma TEXT")
-    _conn_init.commit()
-except Exception:
-    pass  # columna ya existe
-
-# Tabla de notas internas
-_conn_init.execute("""
-    CREATE TABLE IF NOT EXISTS notas_reparacion (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        reparacion_id INTEGER NOT NULL,
-        usuario TEXT NOT NULL,
-        contenido TEXT NOT NULL,
-        fecha_creacion TEXT NOT NULL,
-        es_importante INTEGER DEFAULT 0,
-        FOREIGN KEY (reparacion_id) REFERENCES reparaciones(id) ON DELETE CASCADE
-    )
-""")
-_conn_init.commit()
-
-# Tabla de inventario de piezas
-_conn_init.execute("""
-    CREATE TABLE IF NOT EXISTS inventario_piezas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nombre TEXT NOT NULL,
-        categoria TEXT DEFAULT 'General',
-        descripcion TEXT,
-        cantidad INTEGER DEFAULT 0,
-        cantidad_minima INTEGER DEFAULT 5,
-        precio_coste REAL DEFAULT 0,
-        precio_venta REAL DEFAULT 0,
-        proveedor TEXT,
-        ubicacion TEXT,
-        fecha_actualizacion TEXT
-    )
-""")
-
-# Tabla de piezas usadas en reparaciones
-_conn_init.execute("""
-    CREATE TABLE IF NOT EXISTS piezas_reparacion (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        reparacion_id INTEGER NOT NULL,
-        pieza_id INTEGER NOT NULL,
-        cantidad INTEGER DEFAULT 1,
-        fecha_uso TEXT NOT NULL,
-        usuario TEXT,
-        FOREIGN KEY (reparacion_id) REFERENCES reparaciones(id),
-        FOREIGN KEY (pieza_id) REFERENCES inventario_piezas(id)
-    )
-""")
-_conn_init.commit()
-
-# Tabla de solicitudes de reparacion (formulario publico)
-_conn_init.execute("""
-    CREATE TABLE IF NOT EXISTS solicitudes_reparacion (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nombre TEXT NOT NULL,
-        telefono TEXT NOT NULL,
-        email TEXT,
-        dispositivo TEXT NOT NULL,
-        marca TEXT,
-        modelo TEXT,
-        descripcion TEXT NOT NULL,
-        urgencia TEXT DEFAULT 'normal',
-        fecha_preferida TEXT,
-        horario_preferido TEXT,
-        estado TEXT DEFAULT 'pendiente',
-        notas_admin TEXT,
-        fecha_solicitud TEXT NOT NULL,
-        fecha_gestion TEXT
-    )
-""")
-_conn_init.commit()
-
-# Inicializar sistema de roles y permisos
-init_permisos_db(_conn_init)
-
-_conn_init.close()
+    _pendientes = migraciones_pendientes(_conn_check)
+    if _pendientes:
+        logger.warning(
+            "Hay migraciones de esquema sin aplicar (%s). Ejecuta: python -m migrations",
+            ", ".join(str(v) for v in _pendientes)
+        )
+finally:
+    _conn_check.close()
 
 # Configuración de subida de fotos
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads', 'reparaciones')
@@ -291,6 +234,8 @@ MAIL_CONFIGURED = bool(
 
 mail = Mail(app)
 email_service = EmailService(mail)
+# Los send_* solo encolan; el hilo de utils/email_outbox.py envia
+email_outbox.configurar(app.config)
 
 # register CSRF helpers from utils/security
 app.before_request(ensure_csrf_token)
@@ -313,47 +258,6 @@ def strftime_filter(date_str, format_str='%d/%m/%Y'):
     return date_obj.strftime(format_str)
 
 
-# -------------------------
-# Helpers: filters builder
-# -------------------------
-def build_reparaciones_filters(args):
-    """Construye cláusula WHERE y parámetros a partir de query params.
-
-    args: objeto parecido a dict (p. ej. request.args)
-    Devuelve (where_clause, params_list)
-    """
-    clauses = []
-    params = []
-
-    cliente = args.get('cliente')
-    if cliente:
-        clauses.append("clientes.nombre LIKE ?")
-        params.append(f"%{cliente}%")
-
-    estado = args.get('estado')
-    if estado:
-        clauses.append("reparaciones.estado = ?")
-        params.append(estado)
-
-    pago = args.get('pago')
-    if pago:
-        clauses.append("reparaciones.estado_pago = ?")
-        params.append(pago)
-
-    fecha_desde = args.get('fecha_desde')
-    if fecha_desde:
-        clauses.append("reparaciones.fecha_entrada >= ?")
-        params.append(fecha_desde)
-
-    fecha_hasta = args.get('fecha_hasta')
-    if fecha_hasta:
-        clauses.append("reparaciones.fecha_entrada <= ?")
-        params.append(fecha_hasta)
-
-    where = " AND ".join(clauses) if clauses else "1=1"
-    return where, params
-
-
 # ==============================
 # Endpoint: Export reparaciones (filtrado)
 # ==============================
@@ -366,106 +270,9 @@ def export_reparaciones():
         flash('No tienes permisos para exportar datos.', 'danger')
         return redirect(url_for('reparaciones'))
 
-    where, params = build_reparaciones_filters(request.args)
-
-    conn = get_db()
-    query = (
-        "SELECT reparaciones.id, clientes.nombre as cliente, clientes.telefono, "
-        "reparaciones.dispositivo, reparaciones.estado, reparaciones.estado_pago, "
-        "reparaciones.precio, reparaciones.fecha_entrada, reparaciones.fecha_pago as fecha_finalizacion "
-        "FROM reparaciones JOIN clientes ON clientes.id = reparaciones.cliente_id "
-        f"WHERE {where} ORDER BY reparaciones.id DESC"
-    )
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-
-    # ── Estadísticas ─────────────────────────────────────────────────────────
-    total            = len(rows)
-    total_facturado  = sum(r['precio'] or 0 for r in rows)
-    total_pagado     = sum(r['precio'] or 0 for r in rows if r['estado_pago'] == 'Pagado')
-    total_pendiente  = total_facturado - total_pagado
-    n_pendiente      = sum(1 for r in rows if r['estado'] == 'Pendiente')
-    n_en_proceso     = sum(1 for r in rows if r['estado'] == 'En proceso')
-    n_terminado      = sum(1 for r in rows if r['estado'] == 'Terminado')
-    n_entregado      = sum(1 for r in rows if r['estado'] == 'Entregado')
-
-    si = StringIO()
-    w  = csv.writer(si, delimiter=';')
-
-    # ── Cabecera corporativa ──────────────────────────────────────────────────
-    _csv_empresa_header(w, 'INFORME FILTRADO DE REPARACIONES')
-
-    # ── Resumen ejecutivo ─────────────────────────────────────────────────────
-    w.writerow(['--- RESUMEN ---'])
-    w.writerow(['Total reparaciones', total])
-    w.writerow(['Total facturado',    _fmt_precio_csv(total_facturado)])
-    w.writerow(['Total cobrado',      _fmt_precio_csv(total_pagado)])
-    w.writerow(['Pendiente de cobro', _fmt_precio_csv(total_pendiente)])
-    w.writerow([])
-    w.writerow(['Estado', 'Cantidad'])
-    w.writerow(['Pendiente',   n_pendiente])
-    w.writerow(['En proceso',  n_en_proceso])
-    w.writerow(['Terminado',   n_terminado])
-    w.writerow(['Entregado',   n_entregado])
-    w.writerow([])
-
-    # ── Datos ─────────────────────────────────────────────────────────────────
-    w.writerow(['--- DETALLE DE REPARACIONES ---'])
-    w.writerow([
-        'N. Reparacion', 'Cliente', 'Telefono', 'Dispositivo',
-        'Estado', 'Estado Pago', 'Precio',
-        'Fecha Entrada', 'Fecha Finalizacion', 'Dias en Taller', 'Alertas',
-    ])
-
-    for r in rows:
-        rdict = dict(r)
-        fecha_entrada = rdict.get('fecha_entrada')
-        fecha_fin     = rdict.get('fecha_finalizacion')
-
-        # calcular dias en taller (usando fechas crudas)
-        dias = ''
-        try:
-            if fecha_entrada:
-                d_ent = datetime.strptime(str(fecha_entrada)[:10], '%Y-%m-%d')
-                d_fin = datetime.strptime(str(fecha_fin)[:10], '%Y-%m-%d') if fecha_fin else datetime.now()
-                dias  = (d_fin - d_ent).days
-        except Exception:
-            dias = ''
-
-        # alertas en texto plano
-        alertas_txt = ''
-        try:
-            alert_info = calcular_alertas_reparacion(rdict)
-            if alert_info and alert_info.get('tiene_alertas'):
-                alertas_txt = ' | '.join(a['mensaje'] for a in alert_info['alertas'])
-        except Exception:
-            alertas_txt = ''
-
-        w.writerow([
-            rdict.get('id'),
-            rdict.get('cliente')   or 'Sin asignar',
-            rdict.get('telefono')  or '',
-            rdict.get('dispositivo'),
-            rdict.get('estado'),
-            rdict.get('estado_pago'),
-            _fmt_precio_csv(rdict.get('precio')),
-            _fmt_fecha_csv(fecha_entrada),
-            _fmt_fecha_csv(fecha_fin),
-            dias,
-            alertas_txt,
-        ])
-
-    # ── Pie ───────────────────────────────────────────────────────────────────
-    w.writerow([])
-    w.writerow([_SEP_CSV])
-    w.writerow([f'Fin del informe  |  AndroTech  |  {datetime.now().strftime("%d/%m/%Y %H:%M")}'])
-    w.writerow([_SEP_CSV])
-
-    output = BytesIO()
-    output.write(si.getvalue().encode('utf-8-sig'))
-    output.seek(0)
-    return send_file(output, mimetype='text/csv', as_attachment=True,
-                     download_name=f'AndroTech_Reparaciones_Filtro_{datetime.now().strftime("%Y%m%d_%H%M")}.csv')
+    parametros = {k: request.args[k] for k in FILTROS_REPARACIONES if request.args.get(k)}
+    informe, nombre = informe_csv('reparaciones_filtrado', parametros, session.get('usuario', 'sistema'))
+    return respuesta_csv(informe, nombre)
 
 
 
@@ -590,21 +397,21 @@ def healthcheck():
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "mail_configured": bool(MAIL_CONFIGURED),
         "python": f"{os.sys.version_info.major}.{os.sys.version_info.minor}",
+        "db_pool": pool_stats(),
     }), 200
 
 # PÁGINA PRINCIPAL
 @app.route("/")
 def index():
     conn = get_db()
-    total_clientes = conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
-    activas = conn.execute("SELECT COUNT(*) FROM reparaciones WHERE estado != 'Terminado' AND estado != 'Entregado'").fetchone()[0]
-    terminadas = conn.execute("SELECT COUNT(*) FROM reparaciones WHERE estado = 'Terminado' OR estado = 'Entregado'").fetchone()[0]
-    ingresos = conn.execute("SELECT COALESCE(SUM(precio), 0) FROM reparaciones WHERE estado = 'Terminado' OR estado = 'Entregado'").fetchone()[0]
-    # Desglose por estado para mini-panel del hero
-    estados_count = {}
-    for row in conn.execute("SELECT estado, COUNT(*) as c FROM reparaciones GROUP BY estado").fetchall():
-        estados_count[row['estado']] = row['c']
+    kpis = obtener_kpis(conn)
     conn.close()
+    total_clientes = kpis['total_clientes']
+    activas = kpis['activas']
+    terminadas = kpis['terminadas']
+    ingresos = kpis['ingresos_terminadas']
+    # Desglose por estado para mini-panel del hero
+    estados_count = {e: c for e, c in kpis['por_estado'].items() if c}
     return render_template("index.html",
         total_clientes=total_clientes,
         activas=activas,
@@ -621,218 +428,12 @@ def index():
 @login_required
 def dashboard():
     conn = get_db()
-    
-    # ========== ESTADÍSTICAS GENERALES ==========
-    total_clientes = conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
-    total_reparaciones = conn.execute("SELECT COUNT(*) FROM reparaciones").fetchone()[0]
-    
-    reparaciones_activas = conn.execute("""
-        SELECT COUNT(*) FROM reparaciones
-        WHERE estado != 'Terminado' AND estado != 'Entregado'
-    """).fetchone()[0]
-    
-    reparaciones_terminadas = conn.execute("""
-        SELECT COUNT(*) FROM reparaciones
-        WHERE estado = 'Terminado' OR estado = 'Entregado'
-    """).fetchone()[0]
-    
-    # Ingresos totales
-    ingresos_total = conn.execute("""
-        SELECT IFNULL(SUM(precio), 0) FROM reparaciones
-        WHERE precio IS NOT NULL
-    """).fetchone()[0]
-    
-    # ========== ESTADÍSTICAS DE ESTE MES ==========
     hoy = datetime.now()
-    inicio_mes = datetime(hoy.year, hoy.month, 1)
-    
-    ingresos_mes = conn.execute("""
-        SELECT IFNULL(SUM(precio), 0) FROM reparaciones
-        WHERE fecha_entrada >= ? AND precio IS NOT NULL
-    """, (inicio_mes.strftime("%Y-%m-%d"),)).fetchone()[0]
-    
-    reparaciones_mes = conn.execute("""
-        SELECT COUNT(*) FROM reparaciones
-        WHERE fecha_entrada >= ?
-    """, (inicio_mes.strftime("%Y-%m-%d"),)).fetchone()[0]
-    
-    reparaciones_completadas_mes = conn.execute("""
-        SELECT COUNT(*) FROM reparaciones
-        WHERE (estado = 'Terminado' OR estado = 'Entregado')
-        AND fecha_entrada >= ?
-    """, (inicio_mes.strftime("%Y-%m-%d"),)).fetchone()[0]
-    
-    # ========== ESTADÍSTICAS DE PAGOS ==========
-    dinero_cobrado = conn.execute("""
-        SELECT IFNULL(SUM(precio), 0) FROM reparaciones
-        WHERE estado_pago = 'Pagado' AND precio IS NOT NULL
-    """).fetchone()[0]
-    
-    dinero_por_cobrar = ingresos_total - dinero_cobrado
-    
-    reparaciones_pendiente_pago = conn.execute("""
-        SELECT COUNT(*) FROM reparaciones
-        WHERE estado_pago = 'Pendiente' AND precio IS NOT NULL AND precio > 0
-    """).fetchone()[0]
-    
-    reparaciones_pagadas = conn.execute("""
-        SELECT COUNT(*) FROM reparaciones
-        WHERE estado_pago = 'Pagado'
-    """).fetchone()[0]
-    
-    # Calcular tasa de cobro (porcentaje)
-    tasa_cobro = 0
-    if ingresos_total > 0:
-        tasa_cobro = round((dinero_cobrado / ingresos_total * 100), 1)
-    
-    # Obtener reparaciones pendientes de pago (últimas 5)
-    reparaciones_sin_pagar = conn.execute("""
-        SELECT reparaciones.*, clientes.nombre AS cliente
-        FROM reparaciones
-        LEFT JOIN clientes ON clientes.id = reparaciones.cliente_id
-        WHERE reparaciones.estado_pago = 'Pendiente' 
-        AND reparaciones.precio IS NOT NULL AND reparaciones.precio > 0
-        ORDER BY reparaciones.id DESC
-        LIMIT 5
-    """).fetchall()
-    reparaciones_sin_pagar_list = [dict(r) for r in reparaciones_sin_pagar] if reparaciones_sin_pagar else []
-    
-    # ========== DISPOSITIVOS MÁS REPARADOS ==========
-    dispositivos_top = conn.execute("""
-        SELECT dispositivo, COUNT(*) as cantidad
-        FROM reparaciones
-        WHERE dispositivo IS NOT NULL AND dispositivo != ''
-        GROUP BY dispositivo
-        ORDER BY cantidad DESC
-        LIMIT 5
-    """).fetchall()
-    
-    # ========== ESTADOS MÁS COMUNES ==========
-    estados_distribucion = conn.execute("""
-        SELECT estado, COUNT(*) as cantidad
-        FROM reparaciones
-        GROUP BY estado
-        ORDER BY cantidad DESC
-    """).fetchall()
-    
-    # Convertir a dict para template
-    dispositivos_dict = [{"nombre": d[0], "cantidad": d[1]} for d in dispositivos_top] if dispositivos_top else []
-    estados_dict = [{"nombre": e[0], "cantidad": e[1]} for e in estados_distribucion] if estados_distribucion else []
-    
-    # Calcular porcentajes
-    total_rep = reparaciones_activas + reparaciones_terminadas
-    porcentaje_activas = round((reparaciones_activas / total_rep * 100), 1) if total_rep > 0 else 0
-    porcentaje_terminadas = round((reparaciones_terminadas / total_rep * 100), 1) if total_rep > 0 else 0
-    
-    # Últimas 5 reparaciones
-    ultimas_reparaciones = conn.execute("""
-        SELECT reparaciones.*, clientes.nombre AS cliente
-        FROM reparaciones
-        LEFT JOIN clientes ON clientes.id = reparaciones.cliente_id
-        ORDER BY reparaciones.id DESC
-        LIMIT 5
-    """).fetchall()
-    
-    # ========== REPARACIONES ATRASADAS (sin actualización hace > 7 días) ==========
-    hace_7_dias = (hoy - __import__('datetime').timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
-    
-    reparaciones_atrasadas = conn.execute("""
-        SELECT reparaciones.*, clientes.nombre AS cliente,
-               (SELECT fecha_cambio FROM reparaciones_historial 
-                WHERE reparacion_id = reparaciones.id 
-                ORDER BY fecha_cambio DESC LIMIT 1) AS ultima_actualizacion
-        FROM reparaciones
-        LEFT JOIN clientes ON clientes.id = reparaciones.cliente_id
-        WHERE reparaciones.estado IN ('En proceso', 'Pendiente')
-        AND (
-            SELECT fecha_cambio FROM reparaciones_historial 
-            WHERE reparacion_id = reparaciones.id 
-            ORDER BY fecha_cambio DESC LIMIT 1
-        ) < ? 
-        OR (
-            SELECT COUNT(*) FROM reparaciones_historial 
-            WHERE reparacion_id = reparaciones.id
-        ) = 0
-        ORDER BY reparaciones.id DESC
-    """, (hace_7_dias,)).fetchall()
-    
-    reparaciones_atrasadas_list = [dict(r) for r in reparaciones_atrasadas] if reparaciones_atrasadas else []
-    
-    # Enriquecer con alertas
-    for rep in reparaciones_sin_pagar_list:
-        rep['alertas_info'] = calcular_alertas_reparacion(rep, rep.get('ultima_actualizacion'))
-    
-    for rep in reparaciones_atrasadas_list:
-        rep['alertas_info'] = calcular_alertas_reparacion(rep, rep.get('ultima_actualizacion'))
-
-    # ========== MÉTRICA 1: INGRESOS POR MES (últimos 6 meses) ==========
-    ingresos_por_mes = []
-    for i in range(5, -1, -1):  # Últimos 6 meses
-        fecha = hoy - __import__('datetime').timedelta(days=30*i)
-        inicio = datetime(fecha.year, fecha.month, 1)
-        if i == 0:
-            fin = hoy
-        else:
-            # Primer día del mes siguiente
-            if fecha.month == 12:
-                fin = datetime(fecha.year + 1, 1, 1) - __import__('datetime').timedelta(seconds=1)
-            else:
-                fin = datetime(fecha.year, fecha.month + 1, 1) - __import__('datetime').timedelta(seconds=1)
-        
-        ingreso_mes_i = conn.execute("""
-            SELECT IFNULL(SUM(precio), 0) FROM reparaciones
-            WHERE fecha_entrada >= ? AND fecha_entrada <= ? AND precio IS NOT NULL
-        """, (inicio.strftime("%Y-%m-%d"), fin.strftime("%Y-%m-%d"))).fetchone()[0]
-        
-        ingresos_por_mes.append({
-            "mes": inicio.strftime("%b %Y"),
-            "valor": round(ingreso_mes_i, 2)
-        })
-    
-    # ========== MÉTRICA 2: TIEMPO MEDIO DE REPARACIÓN ==========
-    tiempo_medio_dias = 0
-    reparaciones_completadas = conn.execute("""
-        SELECT COUNT(*) FROM reparaciones
-        WHERE estado = 'Terminado' OR estado = 'Entregado'
-    """).fetchone()[0]
-    
-    if reparaciones_completadas > 0:
-        # Calcular promedio de días entre entrada y última actualización
-        tiempo_promedio = conn.execute("""
-            SELECT AVG(
-                CAST((julianday(COALESCE(
-                    (SELECT fecha_cambio FROM reparaciones_historial 
-                     WHERE reparacion_id = reparaciones.id 
-                     ORDER BY fecha_cambio DESC LIMIT 1),
-                    reparaciones.fecha_entrada
-                )) - julianday(reparaciones.fecha_entrada)) AS REAL)
-            )
-            FROM reparaciones
-            WHERE estado = 'Terminado' OR estado = 'Entregado'
-        """).fetchone()[0]
-        
-        if tiempo_promedio:
-            tiempo_medio_dias = round(float(tiempo_promedio), 1)
-    
-    # ========== MÉTRICA 3: REPARACIONES POR TÉCNICO ==========
-    reparaciones_por_tecnico = conn.execute("""
-        SELECT usuario, COUNT(*) as cantidad
-        FROM reparaciones_historial
-        WHERE usuario IS NOT NULL AND usuario != ''
-        GROUP BY usuario
-        ORDER BY cantidad DESC
-    """).fetchall()
-    
-    tecnico_dict = [{"nombre": t[0], "cantidad": t[1]} for t in reparaciones_por_tecnico] if reparaciones_por_tecnico else []
-    
-    # ========== AUDITORÍA RECIENTE (últimos 10 eventos) ==========
-    eventos_auditoria = obtener_auditoria_reciente(conn, limite=10)
-    
+    # Cache compartida entre workers; se invalida con cada escritura en
+    # reparaciones, historial o auditoria (ver cache.py)
+    datos = en_cache(conn, f"dashboard:{session.get('rol')}",
+                     lambda: datos_dashboard(conn, hoy))
     conn.close()
-    
-    # Calcular IVA en ingresos
-    iva_total = round(ingresos_total * 0.21, 2)
-    iva_mes = round(ingresos_mes * 0.21, 2)
 
     _dias = ['lunes','martes','miércoles','jueves','viernes','sábado','domingo']
     _meses = ['enero','febrero','marzo','abril','mayo','junio','julio','agosto','septiembre','octubre','noviembre','diciembre']
@@ -842,33 +443,64 @@ def dashboard():
     return render_template(
         "dashboard.html",
         now=now,
-        total_clientes=total_clientes,
-        total_reparaciones=total_reparaciones,
-        reparaciones_activas=reparaciones_activas,
-        reparaciones_terminadas=reparaciones_terminadas,
-        porcentaje_activas=porcentaje_activas,
-        porcentaje_terminadas=porcentaje_terminadas,
-        ingresos_total=round(ingresos_total, 2),
-        iva_total=iva_total,
-        ingresos_mes=round(ingresos_mes, 2),
-        iva_mes=iva_mes,
-        reparaciones_mes=reparaciones_mes,
-        reparaciones_completadas_mes=reparaciones_completadas_mes,
-        ultimas_reparaciones=ultimas_reparaciones,
-        dispositivos_top=dispositivos_dict,
-        estados_distribucion=estados_dict,
-        dinero_cobrado=round(dinero_cobrado, 2),
-        dinero_por_cobrar=round(dinero_por_cobrar, 2),
-        reparaciones_pendiente_pago=reparaciones_pendiente_pago,
-        reparaciones_pagadas=reparaciones_pagadas,
-        tasa_cobro=tasa_cobro,
-        reparaciones_sin_pagar=reparaciones_sin_pagar_list,
-        reparaciones_atrasadas=reparaciones_atrasadas_list,
-        ingresos_por_mes=ingresos_por_mes,
-        tiempo_medio_dias=tiempo_medio_dias,
-        reparaciones_por_tecnico=tecnico_dict,
-        eventos_auditoria=eventos_auditoria,
-        user_role=session.get('rol')
+        user_role=session.get('rol'),
+        **datos
+    )
+
+
+# Datos de los graficos del dashboard, pedidos en paralelo desde la pagina.
+# ETag fuerte = version de datos + metrica + mes (el grafico de ingresos
+# cambia de ventana al cambiar de mes); si coincide se responde 304 sin
+# calcular nada.
+@app.route("/api/dashboard/<metrica>")
+@login_required
+def api_dashboard(metrica):
+    if metrica not in METRICAS_API:
+        return jsonify({"error": "Metrica desconocida"}), 404
+
+    conn = get_db()
+    hoy = datetime.now()
+    etag = hashlib.sha256(
+        f"{version_datos(conn)}:{metrica}:{hoy:%Y-%m}".encode()
+    ).hexdigest()[:32]
+
+    if etag in request.if_none_match:
+        conn.close()
+        resp = app.response_class(status=304)
+    else:
+        filas = en_cache(conn, f"api_dashboard:{metrica}",
+                         lambda: METRICAS_API[metrica](conn, hoy))
+        conn.close()
+        etiqueta, valor = ('mes', 'valor') if metrica == 'ingresos_por_mes' else ('nombre', 'cantidad')
+        resp = jsonify({
+            "labels": [f[etiqueta] for f in filas],
+            "data": [f[valor] for f in filas],
+        })
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
+# Feed incremental para el almacen de informes (ver cambios.py).  Se
+# autentica con ``Authorization: Bearer $EXPORT_API_TOKEN``; sin token
+# configurado la ruta no existe.
+@app.route("/api/export/changes")
+def api_export_changes():
+    token = os.environ.get('EXPORT_API_TOKEN', '')
+    if not token:
+        return jsonify({"error": "No encontrado"}), 404
+    recibido = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(recibido.encode(), f"Bearer {token}".encode()):
+        return jsonify({"error": "No autorizado"}), 401
+
+    since = request.args.get('since', '0')
+    # Validado antes de responder: dentro del generador un error ya no
+    # puede ser un 400 (las cabeceras han salido)
+    if not (since.isascii() and since.isdigit()) or int(since) >= 2 ** 63:
+        return jsonify({"error": "Cursor invalido"}), 400
+    return app.response_class(
+        generar_cambios(open_db, int(since)), mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'},
     )
 
 #  SECCIÓN CLIENTES
@@ -909,7 +541,7 @@ def nuevo_cliente():
                     to_email=email,
                     cliente_nombre=nombre
                 )
-                logger.info(f"Email de bienvenida enviado a {email} para cliente {nombre}")
+                logger.info(f"Email de bienvenida encolado para {email} (cliente {nombre})")
             except Exception as e:
                 logger.error(f"Error enviando email de bienvenida: {type(e).__name__}: {str(e)}")
 
@@ -937,6 +569,7 @@ def editar_cliente(id):
             WHERE id=?
         """, (nombre, telefono, email, direccion, id))
         conn.commit()
+        pdf_cache.invalidar_cliente(conn, id)
         conn.close()
 
         return redirect(url_for("clientes"))
@@ -954,27 +587,16 @@ def editar_cliente(id):
 def historial_cliente():
     conn = get_db()
 
-    # Estadísticas generales
-    total_reparaciones = conn.execute("SELECT COUNT(*) FROM reparaciones").fetchone()[0]
-    pagadas = conn.execute("SELECT COUNT(*) FROM reparaciones WHERE estado_pago = 'Pagado'").fetchone()[0]
-    pendientes = conn.execute("SELECT COUNT(*) FROM reparaciones WHERE estado_pago != 'Pagado'").fetchone()[0]
-    total_invertido = conn.execute("SELECT IFNULL(SUM(precio), 0) FROM reparaciones WHERE precio IS NOT NULL").fetchone()[0]
-    promedio_precio = conn.execute("SELECT IFNULL(AVG(precio), 0) FROM reparaciones WHERE precio IS NOT NULL").fetchone()[0]
-    total_completadas = conn.execute("SELECT COUNT(*) FROM reparaciones WHERE estado = 'Terminado' OR estado = 'Entregado'").fetchone()[0]
+    # Estadísticas generales (kpi_counters)
+    kpis = obtener_kpis(conn)
 
     # Filtro por estado y cliente
     estado_filtro = request.args.get('estado', '').strip()
     cliente_filtro = request.args.get('cliente_id', '').strip()
 
-    # Paginación
-    try:
-        page = int(request.args.get('page', 1))
-        if page < 1:
-            page = 1
-    except ValueError:
-        page = 1
+    # Paginación por cursor sobre el id (paginacion.py)
+    cursor = request.args.get('cursor', '').strip()
     per_page = 10
-    offset = (page - 1) * per_page
 
     base_sql = "SELECT reparaciones.*, clientes.nombre AS cliente FROM reparaciones LEFT JOIN clientes ON clientes.id = reparaciones.cliente_id"
     where = []
@@ -986,13 +608,9 @@ def historial_cliente():
         where.append("reparaciones.cliente_id = ?")
         params.append(cliente_filtro)
 
-    where_clause = (" WHERE " + " AND ".join(where)) if where else ""
-
-    total_count = conn.execute("SELECT COUNT(*) FROM reparaciones" + where_clause, params).fetchone()[0]
-    total_pages = (total_count + per_page - 1) // per_page if total_count > 0 else 1
-
-    reparaciones_rows = conn.execute(base_sql + where_clause + " ORDER BY reparaciones.id DESC LIMIT ? OFFSET ?", params + [per_page, offset]).fetchall()
-    reparaciones = [dict(r) for r in reparaciones_rows]
+    total_count = _contar_reparaciones(conn, "FROM reparaciones", where, params, estado_filtro)
+    pagina = pagina_keyset(conn, base_sql, where, params, (("reparaciones.id", "id"),), per_page, cursor)
+    reparaciones = pagina['filas']
 
     # Enriquecer datos con última actualización de cada reparación
     reparaciones_enriquecidas = []
@@ -1011,29 +629,21 @@ def historial_cliente():
     conn.close()
 
     stats = {
-        'total_reparaciones': total_reparaciones,
-        'pagadas': pagadas,
-        'pendientes': pendientes,
-        'total_invertido': total_invertido or 0,
-        'promedio_precio': promedio_precio or 0,
-        'total_completadas': total_completadas,
+        'total_reparaciones': kpis['total_reparaciones'],
+        'pagadas': kpis['pagadas'],
+        'pendientes': kpis['no_pagadas'],
+        'total_invertido': kpis['ingresos_total'],
+        'promedio_precio': kpis['promedio_precio'],
+        'total_completadas': kpis['terminadas'],
     }
 
-    return render_template('historial_cliente.html', reparaciones=reparaciones_enriquecidas, stats=stats, estados=estados, clientes=clientes, estado_filtro=estado_filtro, cliente_filtro=cliente_filtro, page=page, total_pages=total_pages)
+    return render_template('historial_cliente.html', reparaciones=reparaciones_enriquecidas, stats=stats, estados=estados, clientes=clientes, estado_filtro=estado_filtro, cliente_filtro=cliente_filtro, cursor_siguiente=pagina['siguiente'], cursor_anterior=pagina['anterior'], total_count=total_count)
 
 
 # EXPORTAR PDF HISTORIAL CLIENTE
 @app.route("/cliente/<int:id>/historial-pdf")
 @login_required
 def exportar_historial_cliente_pdf(id):
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import cm
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from io import BytesIO
-
     conn = get_db()
     cliente = conn.execute("SELECT * FROM clientes WHERE id=?", (id,)).fetchone()
     if not cliente:
@@ -1041,111 +651,28 @@ def exportar_historial_cliente_pdf(id):
         flash('Cliente no encontrado.', 'danger')
         return redirect(url_for('clientes'))
 
-    reparaciones = conn.execute("""
-        SELECT * FROM reparaciones WHERE cliente_id=? ORDER BY fecha_entrada DESC
-    """, (id,)).fetchall()
+    # Totales en SQL; el detalle como tuplas con solo las columnas del PDF
+    # (nada de SELECT *, que arrastra la firma de cada reparacion).  El
+    # detalle se lee entero y viaja por pickle al pool: ReportLab monta el
+    # documento completo en memoria, asi que pasarlo por trozos no ahorraria
+    # nada en el proceso hijo
+    resumen = conn.execute("""
+        SELECT COUNT(*) AS total,
+               COALESCE(SUM(estado IN ('Terminado', 'Entregado')), 0) AS completadas,
+               COALESCE(SUM(CASE WHEN estado_pago = 'Pagado' THEN precio END), 0) AS total_pagado
+        FROM reparaciones WHERE cliente_id = ?
+    """, (id,)).fetchone()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(f"""
+        SELECT {', '.join(COLUMNAS_HISTORIAL)}
+        FROM reparaciones WHERE cliente_id = ? ORDER BY fecha_entrada DESC
+    """, (id,))
+    reparaciones = cursor.fetchall()
     conn.close()
 
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm,
-                            topMargin=2*cm, bottomMargin=2*cm)
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name='ATTitle', parent=styles['Heading1'], fontSize=22,
-                               textColor=colors.HexColor('#2B8AC4'), alignment=TA_CENTER, spaceAfter=5))
-    styles.add(ParagraphStyle(name='ATSub', parent=styles['Normal'], fontSize=10,
-                               textColor=colors.HexColor('#6c757d'), alignment=TA_CENTER, spaceAfter=20))
-    styles.add(ParagraphStyle(name='ATSection', parent=styles['Heading2'], fontSize=13,
-                               textColor=colors.HexColor('#0F1923'), spaceAfter=10))
-
-    elements = []
-
-    # Header
-    elements.append(Paragraph("AndroTech", styles['ATTitle']))
-    elements.append(Paragraph("Historial de Reparaciones del Cliente", styles['ATSub']))
-
-    # Client info
-    elements.append(Paragraph("Datos del Cliente", styles['ATSection']))
-    info_data = [
-        ['Nombre:', cliente['nombre']],
-        ['Email:', cliente['email'] or '—'],
-        ['Teléfono:', cliente['telefono'] or '—'],
-        ['Dirección:', cliente['direccion'] or '—'],
-    ]
-    info_table = Table(info_data, colWidths=[3.5*cm, 13*cm])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#2B8AC4')),
-        ('LINEBELOW', (0, -1), (-1, -1), 1, colors.HexColor('#dee2e6')),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 15))
-
-    # Stats
-    total = len(reparaciones)
-    total_pagado = sum(r['precio'] or 0 for r in reparaciones if r['estado_pago'] == 'Pagado')
-    completadas = sum(1 for r in reparaciones if r['estado'] in ('Terminado', 'Entregado'))
-    elements.append(Paragraph("Resumen", styles['ATSection']))
-    stats_data = [
-        ['Total Reparaciones', 'Completadas', 'Total Pagado'],
-        [str(total), str(completadas), f"{total_pagado:.2f} €"]
-    ]
-    stats_table = Table(stats_data, colWidths=[5.5*cm, 5.5*cm, 5.5*cm])
-    stats_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2B8AC4')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dee2e6')),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#EBF5FB')),
-    ]))
-    elements.append(stats_table)
-    elements.append(Spacer(1, 15))
-
-    # Repairs table
-    if reparaciones:
-        elements.append(Paragraph("Detalle de Reparaciones", styles['ATSection']))
-        headers = ['#', 'Dispositivo', 'Estado', 'Precio', 'Pago', 'Fecha']
-        table_data = [headers]
-        for r in reparaciones:
-            table_data.append([
-                str(r['id']),
-                str(r['dispositivo'])[:30],
-                r['estado'],
-                f"{r['precio']:.2f} €" if r['precio'] else '—',
-                r['estado_pago'] or 'Pendiente',
-                r['fecha_entrada'] or '—'
-            ])
-
-        rep_table = Table(table_data, colWidths=[1.2*cm, 5.5*cm, 2.5*cm, 2.5*cm, 2.5*cm, 2.5*cm])
-        rep_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2B8AC4')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 7),
-            ('TOPPADDING', (0, 0), (-1, -1), 7),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dee2e6')),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-        ]))
-        elements.append(rep_table)
-
-    elements.append(Spacer(1, 25))
-    elements.append(Paragraph(
-        f'<para alignment="center"><font size="8" color="#9ba5b0">'
-        f'Generado el {datetime.now().strftime("%d/%m/%Y %H:%M")} — AndroTech, Huelva | +34 633 234 395'
-        f'</font></para>', styles['Normal']
-    ))
-
-    doc.build(elements)
-    buffer.seek(0)
-
+    buffer = pdf_pool.renderizar('generar_historial_cliente_pdf',
+                                 dict(cliente), dict(resumen), reparaciones)
     return send_file(buffer, mimetype='application/pdf', as_attachment=True,
                      download_name=f'historial_{cliente["nombre"].replace(" ", "_")}_{datetime.now().strftime("%Y%m%d")}.pdf')
 
@@ -1158,6 +685,7 @@ def borrar_cliente(id):
     conn = get_db()
     conn.execute("DELETE FROM clientes WHERE id=?", (id,))
     conn.commit()
+    pdf_cache.invalidar_cliente(conn, id)
     conn.close()
     return redirect(url_for("clientes"))
 
@@ -1175,247 +703,119 @@ def buscar():
         return redirect(url_for('dashboard'))
 
     conn = get_db()
-    like = f'%{q}%'
-
-    clientes_result = conn.execute('''
-        SELECT id, nombre, email, telefono
-        FROM clientes
-        WHERE nombre LIKE ? OR email LIKE ? OR telefono LIKE ?
-        LIMIT 20
-    ''', (like, like, like)).fetchall()
-
-    reparaciones_result = conn.execute('''
-        SELECT r.id, r.dispositivo, r.estado, r.estado_pago, r.precio,
-               r.fecha_entrada, c.nombre as cliente
-        FROM reparaciones r
-        JOIN clientes c ON r.cliente_id = c.id
-        WHERE r.dispositivo LIKE ? OR r.descripcion LIKE ?
-              OR c.nombre LIKE ? OR CAST(r.id AS TEXT) = ?
-        ORDER BY r.id DESC
-        LIMIT 20
-    ''', (like, like, like, q)).fetchall()
-
+    resultados = buscar_texto(conn, q, incluir_piezas=tiene_permiso('inventario_ver'))
     conn.close()
 
-    return render_template("buscar.html",
-        q=q,
-        clientes=clientes_result,
-        reparaciones=reparaciones_result
-    )
+    return render_template("buscar.html", q=q, **resultados)
 
 
 # =========================================
 #  🔸 EXPORTAR CSV
 # =========================================
 
-import csv
-from io import StringIO, BytesIO
-
-# ── Helpers compartidos para exportacion CSV ──────────────────────────────────
-
-_SEP_CSV = '=' * 62   # separador visual de sección
-
-def _fmt_fecha_csv(fecha_str):
-    """Convierte '2026-04-15 20:35:44' o '2026-04-15' a '15/04/2026'."""
-    if not fecha_str:
-        return ''
-    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
-        try:
-            return datetime.strptime(str(fecha_str), fmt).strftime('%d/%m/%Y')
-        except ValueError:
-            continue
-    return str(fecha_str)
-
-def _fmt_precio_csv(valor):
-    """Formatea un precio como '89,99 €' (coma decimal, sin notacion cientifica)."""
-    if valor is None:
-        return '0,00 €'
-    return f'{float(valor):.2f}'.replace('.', ',') + ' €'
-
-def _csv_empresa_header(writer, titulo):
-    """Escribe el bloque de cabecera corporativa en el CSV."""
-    writer.writerow([_SEP_CSV])
-    writer.writerow(['ANDROTECH — Taller de Reparacion de Dispositivos'])
-    writer.writerow(['Huelva, España  |  Tel: +34 633 234 395  |  manuelcortescontreras11@gmail.com'])
-    writer.writerow([_SEP_CSV])
-    writer.writerow([])
-    writer.writerow([titulo])
-    writer.writerow([f'Generado: {datetime.now().strftime("%d/%m/%Y a las %H:%M")}'])
-    writer.writerow([f'Exportado por: {session.get("usuario", "sistema")}'])
-    writer.writerow([])
-
-# ─────────────────────────────────────────────────────────────────────────────
+# Los informes (exportaciones.py) se envian en streaming desde el cursor;
+# para historiales grandes la interfaz usa los trabajos en segundo plano.
 
 @app.route("/exportar/reparaciones.csv")
 @login_required
 @permiso_requerido('reparaciones_exportar')
 def exportar_reparaciones_csv():
-    conn = get_db()
-    rows = conn.execute('''
-        SELECT r.id, c.nombre as cliente, c.email, c.telefono, c.direccion,
-               r.dispositivo, r.descripcion, r.estado, r.estado_pago,
-               r.precio, r.fecha_entrada, r.fecha_salida, r.fecha_pago, r.metodo_pago,
-               r.tipo_documento,
-               (SELECT COUNT(*) FROM fotos_reparacion WHERE reparacion_id = r.id) as num_fotos,
-               (SELECT COUNT(*) FROM notas_reparacion WHERE reparacion_id = r.id) as num_notas,
-               CASE WHEN r.firma IS NOT NULL AND r.firma != '' THEN 'Si' ELSE 'No' END as firmado
-        FROM reparaciones r
-        LEFT JOIN clientes c ON r.cliente_id = c.id
-        ORDER BY r.id DESC
-    ''').fetchall()
-
-    total = len(rows)
-    total_facturado  = sum(r['precio'] or 0 for r in rows)
-    total_pagado     = sum(r['precio'] or 0 for r in rows if r['estado_pago'] == 'Pagado')
-    total_pendiente  = total_facturado - total_pagado
-    n_pendiente      = sum(1 for r in rows if r['estado'] == 'Pendiente')
-    n_en_proceso     = sum(1 for r in rows if r['estado'] == 'En proceso')
-    n_terminado      = sum(1 for r in rows if r['estado'] == 'Terminado')
-    n_entregado      = sum(1 for r in rows if r['estado'] == 'Entregado')
-    conn.close()
-
-    si = StringIO()
-    w  = csv.writer(si, delimiter=';')
-
-    # ── Cabecera corporativa ──────────────────────────────────────────────────
-    _csv_empresa_header(w, 'INFORME COMPLETO DE REPARACIONES')
-
-    # ── Resumen ejecutivo ─────────────────────────────────────────────────────
-    w.writerow(['--- RESUMEN ---'])
-    w.writerow(['Total reparaciones', total])
-    w.writerow(['Total facturado',    _fmt_precio_csv(total_facturado)])
-    w.writerow(['Total cobrado',      _fmt_precio_csv(total_pagado)])
-    w.writerow(['Pendiente de cobro', _fmt_precio_csv(total_pendiente)])
-    w.writerow([])
-    w.writerow(['Estado', 'Cantidad'])
-    w.writerow(['Pendiente',   n_pendiente])
-    w.writerow(['En proceso',  n_en_proceso])
-    w.writerow(['Terminado',   n_terminado])
-    w.writerow(['Entregado',   n_entregado])
-    w.writerow([])
-
-    # ── Datos ─────────────────────────────────────────────────────────────────
-    w.writerow(['--- DETALLE DE REPARACIONES ---'])
-    w.writerow([
-        'N. Reparacion', 'Cliente', 'Email', 'Telefono', 'Direccion',
-        'Dispositivo', 'Descripcion', 'Estado', 'Estado Pago',
-        'Precio', 'Tipo Documento', 'Fecha Entrada', 'Fecha Salida',
-        'Fecha Pago', 'Metodo Pago', 'Fotos', 'Notas', 'Firmado',
-    ])
-
-    for r in rows:
-        w.writerow([
-            r['id'],
-            r['cliente']       or 'Sin asignar',
-            r['email']         or '',
-            r['telefono']      or '',
-            r['direccion']     or '',
-            r['dispositivo'],
-            r['descripcion']   or '',
-            r['estado'],
-            r['estado_pago'],
-            _fmt_precio_csv(r['precio']),
-            r['tipo_documento'] or '',
-            _fmt_fecha_csv(r['fecha_entrada']),
-            _fmt_fecha_csv(r['fecha_salida']),
-            _fmt_fecha_csv(r['fecha_pago']),
-            r['metodo_pago']   or '',
-            r['num_fotos'],
-            r['num_notas'],
-            r['firmado'],
-        ])
-
-    # ── Pie ───────────────────────────────────────────────────────────────────
-    w.writerow([])
-    w.writerow([_SEP_CSV])
-    w.writerow([f'Fin del informe  |  AndroTech  |  {datetime.now().strftime("%d/%m/%Y %H:%M")}'])
-    w.writerow([_SEP_CSV])
-
-    output = BytesIO()
-    output.write(si.getvalue().encode('utf-8-sig'))
-    output.seek(0)
-    return send_file(output, mimetype='text/csv', as_attachment=True,
-                     download_name=f'AndroTech_Reparaciones_{datetime.now().strftime("%Y%m%d_%H%M")}.csv')
+    informe, nombre = informe_csv('reparaciones', {}, session.get('usuario', 'sistema'))
+    return respuesta_csv(informe, nombre)
 
 
 @app.route("/exportar/clientes.csv")
 @login_required
 @permiso_requerido('clientes_exportar')
 def exportar_clientes_csv():
+    informe, nombre = informe_csv('clientes', {}, session.get('usuario', 'sistema'))
+    return respuesta_csv(informe, nombre)
+
+
+# =========================================
+#  🔸 EXPORTACIONES EN SEGUNDO PLANO
+# =========================================
+
+def _puede_exportar(informe):
+    """Mismos permisos que las rutas de descarga directa de cada informe."""
+    if informe == 'reparaciones':
+        return tiene_permiso('reparaciones_exportar')
+    if informe == 'clientes':
+        return tiene_permiso('clientes_exportar')
+    if informe == 'reparaciones_filtrado':
+        return session.get('rol') in ('admin', 'recepcionista')
+    return False
+
+
+def _trabajo_visible(conn, trabajo_id):
+    """El trabajo si existe y es del usuario actual (o el usuario es admin)."""
+    trabajo = obtener_trabajo(conn, trabajo_id)
+    if trabajo is None:
+        return None
+    if trabajo['usuario'] != session.get('usuario') and session.get('rol') != 'admin':
+        return None
+    return trabajo
+
+
+@app.route("/exportaciones", methods=["GET", "POST"])
+@login_required
+@csrf_protect
+def exportaciones():
     conn = get_db()
-    rows = conn.execute('''
-        SELECT c.id, c.nombre, c.email, c.telefono, c.direccion,
-               COUNT(r.id) as total_reparaciones,
-               SUM(CASE WHEN r.estado IN ('Pendiente', 'En proceso') THEN 1 ELSE 0 END) as reparaciones_activas,
-               SUM(CASE WHEN r.estado IN ('Terminado', 'Entregado') THEN 1 ELSE 0 END) as reparaciones_completadas,
-               COALESCE(SUM(r.precio), 0) as total_facturado,
-               COALESCE(SUM(CASE WHEN r.estado_pago = 'Pagado' THEN r.precio ELSE 0 END), 0) as total_pagado,
-               COALESCE(SUM(CASE WHEN r.estado_pago = 'Pendiente' THEN r.precio ELSE 0 END), 0) as total_pendiente,
-               MAX(r.fecha_entrada) as ultima_visita
-        FROM clientes c
-        LEFT JOIN reparaciones r ON r.cliente_id = c.id
-        GROUP BY c.id
-        ORDER BY c.nombre
-    ''').fetchall()
-
-    total_clientes   = len(rows)
-    total_facturado  = sum(r['total_facturado'] or 0 for r in rows)
-    total_cobrado    = sum(r['total_pagado']    or 0 for r in rows)
-    total_pendiente  = total_facturado - total_cobrado
-    clientes_activos = sum(1 for r in rows if (r['reparaciones_activas'] or 0) > 0)
-    conn.close()
+    if request.method == "POST":
+        informe = request.form.get('informe', '')
+        if informe not in INFORMES or not _puede_exportar(informe):
+            flash('No tienes permisos para exportar datos.', 'danger')
+            return redirect(url_for('exportaciones'))
+        parametros = {}
+        if informe == 'reparaciones_filtrado':
+            parametros = {k: request.form[k] for k in FILTROS_REPARACIONES if request.form.get(k)}
+        trabajo_id = crear_trabajo(conn, informe, parametros, session.get('usuario'))
+        if trabajo_id is None:
+            flash('Ya tienes varias exportaciones en curso. Espera a que terminen.', 'warning')
+        else:
+            registrar_auditoria(conn, 'exportacion_creada', session.get('usuario'), {
+                'trabajo_id': trabajo_id, 'informe': informe, 'filtros': parametros,
+            }, ip_address=request.remote_addr)
+            flash('Exportacion en marcha. El fichero aparecera aqui cuando este listo.', 'info')
+        return redirect(url_for('exportaciones'))
 
-    si = StringIO()
-    w  = csv.writer(si, delimiter=';')
-
-    # ── Cabecera corporativa ──────────────────────────────────────────────────
-    _csv_empresa_header(w, 'INFORME COMPLETO DE CLIENTES')
-
-    # ── Resumen ejecutivo ─────────────────────────────────────────────────────
-    w.writerow(['--- RESUMEN ---'])
-    w.writerow(['Total clientes',          total_clientes])
-    w.writerow(['Clientes con rep. activa', clientes_activos])
-    w.writerow(['Total facturado',          _fmt_precio_csv(total_facturado)])
-    w.writerow(['Total cobrado',            _fmt_precio_csv(total_cobrado)])
-    w.writerow(['Pendiente de cobro',       _fmt_precio_csv(total_pendiente)])
-    w.writerow([])
-
-    # ── Datos ─────────────────────────────────────────────────────────────────
-    w.writerow(['--- DETALLE DE CLIENTES ---'])
-    w.writerow([
-        'N. Cliente', 'Nombre', 'Email', 'Telefono', 'Direccion',
-        'Total Reparaciones', 'Reparaciones Activas', 'Reparaciones Completadas',
-        'Total Facturado', 'Total Pagado', 'Pendiente',
-        'Ultima Visita',
-    ])
+    usuario = None if session.get('rol') == 'admin' else session.get('usuario')
+    trabajos = listar_trabajos(conn, usuario)
+    # Facturas en lote: por defecto el mes anterior
+    fin_mes_anterior = date.today().replace(day=1) - timedelta(days=1)
+    return render_template('exportaciones.html', trabajos=trabajos, informes=INFORMES,
+                           ttl_horas=EXPORT_TTL_HORAS, max_lote=MAX_DOCUMENTOS_LOTE,
+                           lote_desde=fin_mes_anterior.replace(day=1).isoformat(),
+                           lote_hasta=fin_mes_anterior.isoformat())
 
-    for r in rows:
-        w.writerow([
-            r['id'],
-            r['nombre'],
-            r['email']         or '',
-            r['telefono']      or '',
-            r['direccion']     or '',
-            r['total_reparaciones'],
-            r['reparaciones_activas']    or 0,
-            r['reparaciones_completadas'] or 0,
-            _fmt_precio_csv(r['total_facturado']),
-            _fmt_precio_csv(r['total_pagado']),
-            _fmt_precio_csv(r['total_pendiente']),
-            _fmt_fecha_csv(r['ultima_visita']) or 'Sin visitas',
-        ])
-
-    # ── Pie ───────────────────────────────────────────────────────────────────
-    w.writerow([])
-    w.writerow([_SEP_CSV])
-    w.writerow([f'Fin del informe  |  AndroTech  |  {datetime.now().strftime("%d/%m/%Y %H:%M")}'])
-    w.writerow([_SEP_CSV])
-
-    output = BytesIO()
-    output.write(si.getvalue().encode('utf-8-sig'))
-    output.seek(0)
-    return send_file(output, mimetype='text/csv', as_attachment=True,
-                     download_name=f'AndroTech_Clientes_{datetime.now().strftime("%Y%m%d_%H%M")}.csv')
+
+@app.route("/exportaciones/<int:trabajo_id>/estado")
+@login_required
+def exportacion_estado(trabajo_id):
+    conn = get_db()
+    trabajo = _trabajo_visible(conn, trabajo_id)
+    if trabajo is None:
+        return jsonify({'error': 'no encontrado'}), 404
+    if trabajo['estado'] == 'pendiente':
+        # Por si el worker que lo encolo ya no existe
+        despertar_worker()
+    return jsonify(estado_publico(trabajo))
+
+
+@app.route("/exportaciones/<int:trabajo_id>/descargar")
+@login_required
+def exportacion_descargar(trabajo_id):
+    conn = get_db()
+    trabajo = _trabajo_visible(conn, trabajo_id)
+    # expira_en se mira aqui: el fichero sigue en disco hasta la siguiente purga
+    if (trabajo is None or trabajo['estado'] != 'terminado'
+            or (trabajo['expira_en'] or 0) < time.time()
+            or not os.path.exists(trabajo['fichero'] or '')):
+        flash('La exportacion no esta disponible (puede haber caducado).', 'warning')
+        return redirect(url_for('exportaciones'))
+    return send_file(os.path.abspath(trabajo['fichero']), mimetype='text/csv', as_attachment=True,
+                     download_name=trabajo['nombre_descarga'])
 
 
 # =========================================
@@ -1423,6 +823,26 @@ def exportar_clientes_csv():
 # =========================================
 
 # LISTAR REPARACIONES
+# Clave de orden del listado; los indices de la migracion v016 usan la misma expresion
+ORDEN_FECHA = "COALESCE(reparaciones.fecha_entrada, '')"
+
+
+def _contar_reparaciones(conn, sql_from, where_clauses, params, estado=''):
+    """Total de un listado filtrado sin recorrer la tabla en cada pagina.
+
+    Sin filtros, o filtrando solo por un estado conocido, sale de
+    kpi_counters; el resto de combinaciones se cuenta una vez y queda en la
+    cache compartida hasta la siguiente escritura.
+    """
+    if not where_clauses:
+        return obtener_kpis(conn)['total_reparaciones']
+    por_estado = obtener_kpis(conn)['por_estado'] if len(where_clauses) == 1 and estado else {}
+    if estado in por_estado and estado != 'Otros':
+        return por_estado[estado]
+    where_sql = " WHERE " + " AND ".join(where_clauses)
+    return total_cacheado(conn, "SELECT COUNT(*) " + sql_from + where_sql, params)
+
+
 @app.route("/reparaciones")
 @login_required
 def reparaciones():
@@ -1438,15 +858,9 @@ def reparaciones():
     # búsqueda global
     q = request.args.get('q', '').strip()
 
-    # Paginación
-    try:
-        page = int(request.args.get('page', 1))
-        if page < 1:
-            page = 1
-    except ValueError:
-        page = 1
+    # Paginación por cursor (paginacion.py)
+    cursor = request.args.get('cursor', '').strip()
     per_page = 10
-    offset = (page - 1) * per_page
 
     sql_base = "FROM reparaciones LEFT JOIN clientes ON clientes.id = reparaciones.cliente_id"
 
@@ -1498,21 +912,20 @@ def reparaciones():
         except ValueError:
             pass
 
-    where_sql = (" WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
-
-    # Total para paginación
-    total_sql = "SELECT COUNT(*) " + sql_base + where_sql
-    total = conn.execute(total_sql, tuple(params)).fetchone()[0]
-
-    # Consulta principal con orden y límite
-    select_sql = "SELECT reparaciones.*, clientes.nombre AS cliente " + sql_base + where_sql + " ORDER BY fecha_entrada DESC LIMIT ? OFFSET ?"
-    final_params = params + [per_page, offset]
-    datos = conn.execute(select_sql, tuple(final_params)).fetchall()
+    # Total (contadores o cache compartida) y pagina por (fecha_entrada, id).
+    # fecha_entrada admite NULL y (NULL, id) < (?, ?) nunca es cierto: se
+    # ordena por ORDEN_FECHA para que esas filas tambien tengan pagina
+    total = _contar_reparaciones(conn, sql_base, where_clauses, params, estado)
+    pagina = pagina_keyset(
+        conn, f"SELECT reparaciones.*, clientes.nombre AS cliente, {ORDEN_FECHA} AS orden_fecha " + sql_base,
+        where_clauses, params,
+        ((ORDEN_FECHA, "orden_fecha"), ("reparaciones.id", "id")),
+        per_page, cursor,
+    )
 
     # Enriquecer datos con última actualización de cada reparación
     datos_enriquecidos = []
-    for r in datos:
-        r_dict = dict(r)
+    for r_dict in pagina['filas']:
         # Obtener última actualización del historial
         ultima_actualizacion = conn.execute(
             "SELECT fecha_cambio FROM reparaciones_historial WHERE reparacion_id = ? ORDER BY fecha_cambio DESC LIMIT 1",
@@ -1549,12 +962,10 @@ def reparaciones():
 
     filters_query = urllib.parse.urlencode(filters)
 
-    total_pages = max(1, (total + per_page - 1) // per_page)
-
     # Determinar si mostrar precios según rol
     mostrar_precios = session.get('rol') in ['admin', 'tecnico']
 
-    return render_template("reparaciones.html", reparaciones=datos_enriquecidos, clientes=clientes, filters=filters, filters_query=filters_query, page=page, total_pages=total_pages, per_page=per_page, total=total, mostrar_precios=mostrar_precios, user_role=session.get('rol'))
+    return render_template("reparaciones.html", reparaciones=datos_enriquecidos, clientes=clientes, filters=filters, filters_query=filters_query, cursor_siguiente=pagina['siguiente'], cursor_anterior=pagina['anterior'], per_page=per_page, total=total, mostrar_precios=mostrar_precios, user_role=session.get('rol'))
 
 
 # NUEVA REPARACIÓN
@@ -1629,7 +1040,7 @@ def nueva_reparacion():
                     descripcion=descripcion,
                     fecha_entrada=fecha_entrada
                 )
-                logger.info(f"Email de nueva reparacion enviado para reparacion {new_id}")
+                logger.info(f"Email de nueva reparacion encolado para reparacion {new_id}")
         except Exception as e:
             logger.error(f"Error enviando email de nueva reparacion: {type(e).__name__}: {str(e)}")
 
@@ -1692,6 +1103,7 @@ def editar_reparacion(id):
         """, (cliente_id, dispositivo, descripcion, estado, precio, id))
 
         conn.commit()
+        pdf_cache.invalidar([id])
 
         # Enviar email de actualización de estado si cambió
         if estado_anterior != estado:
@@ -1705,7 +1117,8 @@ def editar_reparacion(id):
                 ''', (id,)).fetchone()
 
                 if cliente_data and cliente_data['email']:
-                    # Enviar email de actualización de estado
+                    # Si ya hay un email de estado esperando en la cola, este
+                    # cambio va en el mismo con todos los cambios desde entonces
                     email_service.send_repair_status_update(
                         to_email=cliente_data['email'],
                         cliente_nombre=cliente_data['nombre'],
@@ -1713,9 +1126,10 @@ def editar_reparacion(id):
                         estado_anterior=estado_anterior,
                         estado_nuevo=estado,
                         dispositivo=dispositivo,
-                        descripcion=descripcion
+                        descripcion=descripcion,
+                        leer_cambios=lambda desde: cambios_desde(conn, id, desde)
                     )
-                    logger.info(f'[EMAIL] Email de actualizacion de estado enviado a {cliente_data["email"]} para reparacion {id}')
+                    logger.info(f'[EMAIL] Email de actualizacion de estado encolado para {cliente_data["email"]} (reparacion {id})')
                 else:
                     logger.warning(f'[EMAIL] ⚠️ No se pudo enviar email de actualización: cliente sin email para reparación {id}')
 
@@ -1806,7 +1220,8 @@ def editar_reparacion(id):
         estados_disponibles=estados_disponibles,
         fotos=fotos,
         notas=notas,
-        piezas_usadas=piezas_usadas
+        piezas_usadas=piezas_usadas,
+        impresora_ticket=ticket_termico.impresora_configurada() is not None
     )
 
 
@@ -1834,6 +1249,7 @@ def borrar_reparacion(id):
 
     conn.execute("DELETE FROM reparaciones WHERE id=?", (id,))
     conn.commit()
+    pdf_cache.invalidar([id])
     try:
         logger.info(json.dumps({
             "event": "reparacion_deleted",
@@ -2117,6 +1533,7 @@ def editar_pieza(id):
             id
         ))
         conn.commit()
+        pdf_cache.invalidar_pieza(conn, id)
         conn.close()
         flash('Pieza actualizada.', 'success')
         return redirect(url_for('inventario'))
@@ -2188,6 +1605,7 @@ def agregar_pieza_reparacion(id):
                  (cantidad, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), pieza_id))
     conn.commit()
     conn.close()
+    pdf_cache.invalidar([id])
     flash(f'Pieza "{pieza["nombre"]}" x{cantidad} añadida a la reparación.', 'success')
     return redirect(url_for('editar_reparacion', id=id))
 
@@ -2210,6 +1628,7 @@ def eliminar_pieza_reparacion(uso_id):
     conn.execute("DELETE FROM piezas_reparacion WHERE id=?", (uso_id,))
     conn.commit()
     conn.close()
+    pdf_cache.invalidar([reparacion_id])
     flash('Pieza devuelta al inventario.', 'success')
     return redirect(url_for('editar_reparacion', id=reparacion_id))
 
@@ -2260,19 +1679,7 @@ def api_calendario_eventos():
 
 # ── TICKET DE RECOGIDA CON QR ──────────────────────────────────────
 
-@app.route("/reparaciones/<int:id>/ticket")
-@login_required
-def ticket_recogida(id):
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import cm, mm
-    from reportlab.lib.enums import TA_CENTER
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from reportlab.graphics.shapes import Drawing
-    from reportlab.graphics.barcode.qr import QrCodeWidget
-    from io import BytesIO
-
+def _reparacion_ticket(id):
     conn = get_db()
     reparacion = conn.execute("""
         SELECT r.*, c.nombre as cliente_nombre, c.telefono as cliente_telefono, c.email as cliente_email
@@ -2281,96 +1688,59 @@ def ticket_recogida(id):
         WHERE r.id = ?
     """, (id,)).fetchone()
     conn.close()
+    return reparacion
+
+
+def _ancho_ticket():
+    ancho = request.args.get('ancho', type=int) or ticket_termico.TICKET_ANCHO_MM
+    return ancho if ancho in ticket_termico.COLUMNAS else ticket_termico.TICKET_ANCHO_MM
 
+
+# ?formato=pdf (media hoja A4), escpos (impresora termica) o texto
+@app.route("/reparaciones/<int:id>/ticket")
+@login_required
+def ticket_recogida(id):
+    reparacion = _reparacion_ticket(id)
     if not reparacion:
         flash('Reparación no encontrada.', 'danger')
         return redirect(url_for('reparaciones'))
 
-    buffer = BytesIO()
-    # Half-page ticket size
-    page_w = A4[0]
-    page_h = A4[1] / 2
-    doc = SimpleDocTemplate(buffer, pagesize=(page_w, page_h),
-                            rightMargin=1.5*cm, leftMargin=1.5*cm,
-                            topMargin=1*cm, bottomMargin=1*cm)
-
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name='TKTitle', parent=styles['Heading1'], fontSize=20,
-                               textColor=colors.HexColor('#2B8AC4'), alignment=TA_CENTER, spaceAfter=2))
-    styles.add(ParagraphStyle(name='TKSub', parent=styles['Normal'], fontSize=9,
-                               textColor=colors.HexColor('#6c757d'), alignment=TA_CENTER, spaceAfter=10))
-    styles.add(ParagraphStyle(name='TKCenter', parent=styles['Normal'], fontSize=9,
-                               alignment=TA_CENTER))
-
-    elements = []
-
-    # Header
-    elements.append(Paragraph("AndroTech", styles['TKTitle']))
-    elements.append(Paragraph("TICKET DE RECOGIDA", styles['TKSub']))
-
-    # QR code: URL directa a la consulta de esta reparacion
     # request.host_url ya incluye esquema y host correctos (https en Railway via ProxyFix)
     base_url = request.host_url.rstrip('/')
-    qr_data = f"{base_url}/consulta?id={id}"
-    qr = QrCodeWidget(qr_data)
-    qr.barWidth = 100
-    qr.barHeight = 100
-    d = Drawing(110, 110)
-    d.add(qr)
-
-    # Info table with QR
-    info_rows = [
-        ['Reparación:', f'#{id}'],
-        ['Cliente:', reparacion['cliente_nombre']],
-        ['Dispositivo:', reparacion['dispositivo']],
-        ['Estado:', reparacion['estado']],
-        ['Fecha entrada:', reparacion['fecha_entrada'] or '—'],
-        ['Precio:', f"{reparacion['precio']:.2f} €" if reparacion['precio'] else 'Pendiente'],
-    ]
-
-    info_table = Table(info_rows, colWidths=[3*cm, 7*cm])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#2B8AC4')),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-
-    # Layout: info left, QR right
-    layout = Table([[info_table, d]], colWidths=[10.5*cm, 4*cm])
-    layout.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-    ]))
-    elements.append(layout)
-    elements.append(Spacer(1, 8))
-
-    # Divider line
-    divider = Table([['']],colWidths=[page_w - 3*cm])
-    divider.setStyle(TableStyle([
-        ('LINEABOVE', (0, 0), (-1, 0), 1, colors.HexColor('#dee2e6')),
-    ]))
-    elements.append(divider)
-    elements.append(Spacer(1, 5))
-
-    # Footer note
-    elements.append(Paragraph(
-        '<font size="8" color="#6c757d">'
-        'Presente este ticket al recoger su dispositivo. '
-        'Escanee el código QR para consultar el estado de su reparación en línea.<br/>'
-        f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")} — AndroTech, Huelva — +34 633 234 395'
-        '</font>', styles['TKCenter']
-    ))
-
-    doc.build(elements)
-    buffer.seek(0)
-
+    formato = request.args.get('formato', 'pdf')
+    if formato == 'escpos':
+        return send_file(io.BytesIO(ticket_termico.ticket_escpos(reparacion, base_url, _ancho_ticket())),
+                         mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f'ticket_recogida_{id}.bin')
+    if formato == 'texto':
+        return app.response_class(ticket_termico.ticket_texto(reparacion, base_url, _ancho_ticket()),
+                                  mimetype='text/plain')
+
+    buffer = pdf_pool.renderizar('generar_ticket_recogida_pdf',
+                                 dict(reparacion), base_url)
     return send_file(buffer, mimetype='application/pdf', as_attachment=True,
                      download_name=f'ticket_recogida_{id}.pdf')
 
 
+@app.route("/reparaciones/<int:id>/ticket/imprimir", methods=["POST"])
+@login_required
+@csrf_protect
+def imprimir_ticket(id):
+    impresora = ticket_termico.impresora_configurada()
+    reparacion = _reparacion_ticket(id)
+    if impresora is None or not reparacion:
+        flash('No hay impresora de tickets configurada.' if reparacion else 'Reparación no encontrada.', 'danger')
+        return redirect(url_for('reparaciones'))
+    try:
+        impresora.imprimir(ticket_termico.ticket_escpos(reparacion, request.host_url.rstrip('/')))
+    except OSError as e:
+        logger.warning(f"No se pudo imprimir el ticket de la reparacion {id}: {e}")
+        flash('No se pudo conectar con la impresora de tickets.', 'danger')
+    else:
+        flash('Ticket enviado a la impresora.', 'success')
+    return redirect(url_for('editar_reparacion', id=id))
+
+
 @app.route("/reparaciones/<int:id>/marcar-pagado", methods=["POST"])
 @login_required
 def marcar_reparacion_pagada(id):
@@ -2431,6 +1801,12 @@ def marcar_reparacion_pagada(id):
     return redirect(url_for("editar_reparacion", id=id))
 
 
+def _datos_documento_reparacion(conn, id):
+    """Datos de la reparacion para el PDF de presupuesto/factura (o None)."""
+    docs = documentos_facturacion(conn, "r.id = ?", (id,))
+    return docs[0] if docs else None
+
+
 # GENERAR PDF PRESUPUESTO
 @app.route("/reparaciones/pdf/<int:id>")
 @login_required
@@ -2445,51 +1821,18 @@ def generar_pdf_presupuesto(id):
         tipo_documento = "presupuesto"
     
     conn = get_db()
-    
-    # Obtener reparación y cliente
-    reparacion = conn.execute("""
-        SELECT r.*, c.nombre AS cliente_nombre, c.telefono AS cliente_telefono,
-               c.email AS cliente_email, c.direccion AS cliente_direccion
-        FROM reparaciones r
-        LEFT JOIN clientes c ON c.id = r.cliente_id
-        WHERE r.id = ?
-    """, (id,)).fetchone()
+    reparacion_data = _datos_documento_reparacion(conn, id)
+    conn.close()
 
-    if not reparacion:
-        conn.close()
+    if not reparacion_data:
         flash('Reparación no encontrada.', 'danger')
         return redirect(url_for('reparaciones'))
 
-    # Obtener piezas utilizadas
-    piezas = conn.execute("""
-        SELECT pr.cantidad, ip.nombre, ip.precio_venta
-        FROM piezas_reparacion pr
-        JOIN inventario_piezas ip ON ip.id = pr.pieza_id
-        WHERE pr.reparacion_id = ?
-    """, (id,)).fetchall()
-    conn.close()
-
-    # Convertir Row de sqlite3 a dict
-    reparacion_data = {
-        'id': reparacion['id'],
-        'dispositivo': reparacion['dispositivo'],
-        'estado': reparacion['estado'],
-        'fecha_entrada': reparacion['fecha_entrada'],
-        'precio': reparacion['precio'],
-        'descripcion': reparacion['descripcion'],
-        'cliente_nombre': reparacion['cliente_nombre'],
-        'cliente_telefono': reparacion['cliente_telefono'],
-        'cliente_email': reparacion['cliente_email'],
-        'cliente_direccion': reparacion['cliente_direccion'],
-        'piezas': [{'nombre': p['nombre'], 'cantidad': p['cantidad'],
-                    'precio_venta': p['precio_venta']} for p in piezas],
-    }
-
     # Generar PDF con tipo de documento
     # Pasamos base_url para que el QR apunte al servidor correcto (local o Railway)
     base_url = request.host_url.rstrip('/')
-    pdf_buffer = generar_presupuesto_pdf(reparacion_data, tipo_documento=tipo_documento,
-                                         base_url=base_url)
+    pdf_buffer = pdf_cache.obtener_pdf(reparacion_data, tipo_documento=tipo_documento,
+                                       base_url=base_url)
     
     # Retornar como descarga
     nombre_archivo = f"{tipo_documento}_reparacion_{id}.pdf"
@@ -2500,6 +1843,56 @@ def generar_pdf_presupuesto(id):
         download_name=nombre_archivo
     )
 
+
+# FACTURAS EN LOTE (cierre de mes, ver facturacion.py)
+@app.route("/reparaciones/facturas-lote")
+@login_required
+@permiso_requerido('reparaciones_pdf')
+def facturas_lote():
+    tipo_documento = request.args.get('tipo', 'factura')
+    formato = request.args.get('formato', 'zip')
+    if tipo_documento not in TIPOS_DOCUMENTO or formato not in FORMATOS_LOTE:
+        flash('Parametros no validos.', 'danger')
+        return redirect(url_for('exportaciones'))
+
+    conn = get_db()
+    try:
+        docs = documentos_lote(conn, request.args)
+    except ValueError as e:
+        conn.close()
+        flash(str(e), 'warning')
+        return redirect(url_for('exportaciones'))
+    conn.close()
+    if not docs:
+        flash('No hay reparaciones que cumplan el filtro.', 'info')
+        return redirect(url_for('exportaciones'))
+
+    base_url = request.host_url.rstrip('/')
+    nombre = f"{tipo_documento}s_{request.args['desde']}_{request.args['hasta']}"
+    logger.info(json.dumps({
+        "event": "facturas_lote", "usuario": session.get('usuario'), "documentos": len(docs),
+        "formato": formato, "tipo": tipo_documento,
+    }))
+    if formato == 'pdf':
+        return send_file(pdf_combinado(docs, tipo_documento, base_url), mimetype='application/pdf',
+                         as_attachment=True, download_name=f"{nombre}.pdf")
+
+    trozos = zip_documentos(docs, tipo_documento, base_url)
+    # El primer trozo se pide aqui para que un 503 (otro lote en curso)
+    # llegue antes de enviar las cabeceras
+    primero = next(trozos)
+
+    def enviar():
+        yield primero
+        # yield from cierra tambien el generador si se corta la descarga
+        yield from trozos
+
+    return app.response_class(
+        enviar(), mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{nombre}.zip"',
+                 'X-Accel-Buffering': 'no'},
+    )
+
 # =========================================
 # 🔸 ADMINISTRACIÓN DE USUARIOS
 # =========================================
@@ -3446,9 +2839,8 @@ def admin_sistema():
     total_rutas = len(app.url_map._rules)
 
     # Tamano BD en KB
-    db_path = "database/andro_tech.db"
     try:
-        db_size_kb = round(os.path.getsize(db_path) / 1024, 2)
+        db_size_kb = round(os.path.getsize(DB_PATH) / 1024, 2)
     except OSError:
         db_size_kb = 0
 
@@ -3475,6 +2867,7 @@ def admin_sistema():
             }
     except Exception:
         ultimo_evento = None
+    cola_email = email_outbox.estadisticas(conn)
     conn.close()
 
     # Fecha y hora actual del servidor
@@ -3504,9 +2897,28 @@ def admin_sistema():
         psutil_disponible=psutil_disponible,
         mail_configured=MAIL_CONFIGURED,
         mail_username=app.config.get('MAIL_USERNAME') or '(no configurado)',
+        db_pool=pool_stats(),
+        pdf_cache=pdf_cache.estadisticas(),
+        pdf_pool=pdf_pool.estadisticas(),
+        cola_email=cola_email,
     )
 
 
+@app.route('/admin/email-outbox/reintentar', methods=['POST'])
+@login_required
+@csrf_protect
+def admin_reintentar_emails():
+    """Devuelve a la cola los emails que agotaron sus reintentos."""
+    if session.get('rol') != 'admin':
+        flash('Acceso restringido al administrador.', 'danger')
+        return redirect(url_for('dashboard'))
+    conn = get_db()
+    n = email_outbox.reintentar_fallidos(conn)
+    conn.close()
+    flash(f'{n} email(s) devueltos a la cola de envio.', 'success' if n else 'info')
+    return redirect(url_for('admin_sistema'))
+
+
 # =========================================
 # ADMIN: PROBAR ENVIO DE EMAIL
 # =========================================
@@ -3589,6 +3001,63 @@ def admin_test_email():
     return render_template('admin_test_email.html', diagnostico=diagnostico)
 
 
+# =========================================
+# ADMIN: IMPORTACION MASIVA DESDE CSV
+# =========================================
+
+# Filas rechazadas que se listan en la pagina (el total se muestra siempre)
+MAX_RECHAZOS_VISIBLES = 200
+
+
+@app.route('/admin/importar', methods=['GET', 'POST'])
+@login_required
+@csrf_protect
+def admin_importar():
+    """Alta masiva de clientes, reparaciones o piezas desde un CSV (solo admin)."""
+    if session.get('rol') != 'admin':
+        flash('Acceso restringido al administrador.', 'danger')
+        return redirect(url_for('dashboard'))
+
+    resultado = None
+    if request.method == 'POST':
+        tipo = request.form.get('tipo', '')
+        fichero = request.files.get('fichero')
+        simular = bool(request.form.get('simular'))
+        if tipo not in TIPOS_IMPORTACION:
+            flash('Tipo de importacion no valido.', 'danger')
+        elif not fichero or not fichero.filename:
+            flash('Selecciona un fichero CSV.', 'warning')
+        else:
+            # Conexion propia: la importacion abre su transaccion BEGIN IMMEDIATE
+            conn = open_db()
+            try:
+                texto = io.TextIOWrapper(fichero.stream, encoding='utf-8-sig', newline='')
+                resultado = importar_csv(conn, tipo, texto, simular=simular)
+                if not simular:
+                    registrar_auditoria(conn, 'importacion_csv', session.get('usuario'), {
+                        'tipo': tipo, 'fichero': secure_filename(fichero.filename),
+                        'insertadas': resultado['insertadas'],
+                        'rechazadas': len(resultado['rechazadas']),
+                    }, ip_address=request.remote_addr)
+            except UnicodeDecodeError:
+                flash('El fichero no esta en UTF-8. Guardalo como "CSV UTF-8" y vuelve a intentarlo.', 'danger')
+            except ValueError as e:
+                flash(f'No se pudo importar el fichero: {e}', 'danger')
+            finally:
+                conn.close()
+
+            if resultado is not None:
+                logger.info(json.dumps({
+                    "event": "importacion_csv", "tipo": tipo, "simulacion": simular,
+                    "leidas": resultado['leidas'], "insertadas": resultado['insertadas'],
+                    "rechazadas": len(resultado['rechazadas']), "segundos": resultado['segundos'],
+                    "usuario": session.get('usuario'),
+                }, ensure_ascii=False))
+
+    return render_template('admin_importar.html', tipos=TIPOS_IMPORTACION,
+                           resultado=resultado, max_rechazos=MAX_RECHAZOS_VISIBLES)
+
+
 # =========================================
 # ADMIN: GESTIONAR SOLICITUDES
 # =========================================
@@ -4023,20 +3492,16 @@ def stripe_webhook():
                     # Generar factura PDF para adjuntar al email
                     pdf_buffer = None
                     try:
-                        pdf_reparacion = {
-                            'id': reparacion_id,
-                            'dispositivo': reparacion_data['dispositivo'],
-                            'estado': reparacion_data['estado'],
-                            'fecha_entrada': reparacion_data['fecha_entrada'],
-                            'precio': reparacion_data['precio'],
-                            'descripcion': reparacion_data['descripcion'],
-                            'cliente_nombre': reparacion_data['nombre'],
-                            'cliente_telefono': reparacion_data['telefono'],
-                        }
-                        pdf_buffer = generar_presupuesto_pdf(
-                            pdf_reparacion, tipo_documento="factura",
-                            base_url=request.host_url.rstrip('/')
+                        # Mismos datos que la descarga: si ya se genero la
+                        # factura, el adjunto sale de la cache.  Sin esperar
+                        # hueco en el pool: Stripe reintenta el webhook si
+                        # tarda, y el email sale igual sin la factura
+                        pdf_buffer = pdf_cache.obtener_pdf(
+                            _datos_documento_reparacion(conn, reparacion_id), tipo_documento="factura",
+                            base_url=request.host_url.rstrip('/'), esperar=0
                         )
+                    except pdf_pool.PdfNoDisponible as e:
+                        logger.warning(f'[WEBHOOK] PDF de la reparacion {reparacion_id} no disponible ({e}), se enviara email sin adjunto')
                     except Exception:
                         logger.exception(f'[WEBHOOK] Error generando PDF para reparacion {reparacion_id}, se enviara email sin adjunto')
 
@@ -4049,7 +3514,7 @@ def stripe_webhook():
                         descripcion=reparacion_data['descripcion'],
                         pdf_data=pdf_buffer
                     )
-                    logger.info(f'[WEBHOOK] Email de confirmacion enviado a {reparacion_data["email"]} (PDF adjunto: {pdf_buffer is not None})')
+                    logger.info(f'[WEBHOOK] Email de confirmacion encolado para {reparacion_data["email"]} (PDF adjunto: {pdf_buffer is not None})')
                 else:
                     logger.warning(f'[WEBHOOK] ⚠️ No se pudieron obtener datos para email de reparación {reparacion_id}')
 
@@ -4102,6 +3567,21 @@ def not_found_error(error):
     return render_template('error.html', code=404, message='Página no encontrada'), 404
 
 
+@app.errorhandler(pdf_pool.PdfNoDisponible)
+def pdf_no_disponible(error):
+    # Cola de PDF llena o generacion demasiado lenta: mejor un 503 rapido
+    # que bloquear el worker
+    logger.warning(json.dumps({
+        "event": "pdf_no_disponible",
+        "path": request.path,
+        "motivo": str(error),
+    }, ensure_ascii=False))
+    return render_template(
+        'error.html', code=503,
+        message='Hay muchos documentos generandose ahora mismo. Vuelve a intentarlo en unos segundos.'
+    ), 503, {'Retry-After': str(error.retry_after)}
+
+
 @app.errorhandler(500)
 def internal_error(error):
     try:
@@ -4138,5 +3618,11 @@ def internal_error(error):
 
 #  EJECUCIÓN
 if __name__ == '__main__':
+    # En desarrollo local aplicamos las migraciones pendientes al arrancar
+    _conn_migr = get_db()
+    try:
+        aplicar_migraciones(_conn_migr)
+    finally:
+        _conn_migr.close()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,169 @@
+"""Busqueda de texto completo con FTS5 para ``/buscar``.
+
+Cada tabla buscable tiene un indice FTS5 de contenido externo
+(``content=<tabla>``): el indice solo guarda los terminos y la fila sigue
+viviendo en la tabla original.  Los triggers ``fts_<tabla>_*`` lo
+mantienen al dia dentro de la misma transaccion que cada escritura.
+
+El tokenizador ``unicode61 remove_diacritics 2`` pliega mayusculas y
+tildes ("Jose" encuentra "José", "nunez" encuentra "Núñez") y los
+indices de prefijo de 2 y 3 caracteres hacen baratas las busquedas
+mientras se escribe.  Los resultados se ordenan por ``bm25``.
+"""
+
+import re
+
+# Indice FTS -> (tabla, {columna: expresion indexada}, pesos bm25).
+# ``{r}`` se sustituye por la tabla al reconstruir; los triggers de la
+# migracion v009 tienen copiadas estas expresiones con NEW/OLD.  El telefono se indexa tambien sin espacios ni guiones para
+# que "633234395" encuentre "633 234 395".
+_TELEFONO = "IFNULL({r}.telefono, '') || ' ' || REPLACE(REPLACE(IFNULL({r}.telefono, ''), ' ', ''), '-', '')"
+INDICES = {
+    'fts_clientes': ('clientes', {
+        'nombre': "{r}.nombre",
+        'email': "{r}.email",
+        'telefono': _TELEFONO,
+    }, (10.0, 4.0, 4.0)),
+    'fts_reparaciones': ('reparaciones', {
+        'dispositivo': "{r}.dispositivo",
+        'descripcion': "{r}.descripcion",
+    }, (8.0, 2.0)),
+    'fts_notas': ('notas_reparacion', {
+        'contenido': "{r}.contenido",
+    }, (1.0,)),
+    'fts_piezas': ('inventario_piezas', {
+        'nombre': "{r}.nombre",
+        'categoria': "{r}.categoria",
+        'descripcion': "{r}.descripcion",
+        'proveedor': "{r}.proveedor",
+    }, (10.0, 3.0, 1.0, 2.0)),
+}
+
+TOKENIZADOR = "unicode61 remove_diacritics 2"
+LIMITE = 20
+
+
+def _valores(columnas, fila):
+    return ", ".join(expr.format(r=fila) for expr in columnas.values())
+
+
+def reconstruir_indices(conn):
+    """Vacia y vuelve a llenar los indices con los datos actuales.
+
+    No se usa el comando ``rebuild`` de FTS5 porque leeria las columnas
+    tal cual de la tabla y algunas se indexan transformadas (telefono).
+    """
+    for indice, (tabla, columnas, _) in INDICES.items():
+        conn.execute(f"INSERT INTO {indice} ({indice}) VALUES ('delete-all')")
+        conn.execute(f"""
+            INSERT INTO {indice} (rowid, {", ".join(columnas)})
+            SELECT id, {_valores(columnas, tabla)} FROM {tabla}
+        """)
+
+
+def indexar_nuevas(conn, tabla, desde_id):
+    """Indexa de golpe las filas de ``tabla`` con ``id > desde_id``.
+
+    Para cargas masivas hechas sin los triggers ``fts_<tabla>_*``.
+    """
+    for indice, (tabla_indice, columnas, _) in INDICES.items():
+        if tabla_indice != tabla:
+            continue
+        conn.execute(f"""
+            INSERT INTO {indice} (rowid, {", ".join(columnas)})
+            SELECT id, {_valores(columnas, tabla)} FROM {tabla} WHERE id > ?
+        """, (desde_id,))
+
+
+def consulta_fts(texto):
+    """Convierte lo que escribe el usuario en una expresion MATCH segura.
+
+    Cada palabra se busca como prefijo y todas deben aparecer (AND).  Los
+    signos de puntuacion se descartan, asi que la entrada nunca produce un
+    error de sintaxis de FTS5.  Devuelve None si no queda ninguna palabra.
+    """
+    palabras = re.findall(r"\w+", texto)
+    if not palabras:
+        return None
+    return " ".join(f'"{p}"*' for p in palabras)
+
+
+def _bm25(indice):
+    pesos = ", ".join(str(p) for p in INDICES[indice][2])
+    return f"bm25({indice}, {pesos})"
+
+
+def buscar(conn, q, limite=LIMITE, incluir_piezas=True):
+    """Resultados de ``/buscar`` ordenados por relevancia.
+
+    Devuelve un dict con las listas ``clientes``, ``reparaciones``,
+    ``notas`` y ``piezas`` (vacia si no ``incluir_piezas``).  Una
+    reparacion coincide por su dispositivo o descripcion, por el
+    nombre/telefono de su cliente o por su id exacto.
+    """
+    resultado = {'clientes': [], 'reparaciones': [], 'notas': [], 'piezas': []}
+    match = consulta_fts(q)
+    if match is None:
+        return resultado
+
+    resultado['clientes'] = conn.execute(f"""
+        SELECT c.id, c.nombre, c.email, c.telefono
+        FROM fts_clientes
+        JOIN clientes c ON c.id = fts_clientes.rowid
+        WHERE fts_clientes MATCH ?
+        ORDER BY {_bm25('fts_clientes')}
+        LIMIT ?
+    """, (match, limite)).fetchall()
+
+    # bm25 es negativo: el id exacto va siempre primero
+    # isascii: isdigit() tambien acepta "²" o "①", que int() no convierte; y
+    # con mas de 18 cifras no cabe en un INTEGER de SQLite (ni es un id)
+    id_exacto = int(q) if q.isascii() and q.isdigit() and len(q) <= 18 else None
+    resultado['reparaciones'] = conn.execute(f"""
+        WITH coincidencias (id, rango) AS (
+            SELECT rowid, {_bm25('fts_reparaciones')}
+            FROM fts_reparaciones WHERE fts_reparaciones MATCH ?
+            UNION ALL
+            SELECT r.id, {_bm25('fts_clientes')}
+            FROM fts_clientes
+            JOIN reparaciones r ON r.cliente_id = fts_clientes.rowid
+            WHERE fts_clientes MATCH ?
+            UNION ALL
+            SELECT id, -1e9 FROM reparaciones WHERE id = ?
+        ),
+        mejores AS (
+            SELECT id, MIN(rango) AS rango FROM coincidencias
+            GROUP BY id ORDER BY rango LIMIT ?
+        )
+        SELECT r.id, r.dispositivo, r.estado, r.estado_pago, r.precio,
+               r.fecha_entrada, c.nombre AS cliente
+        FROM mejores m
+        JOIN reparaciones r ON r.id = m.id
+        LEFT JOIN clientes c ON c.id = r.cliente_id
+        ORDER BY m.rango, r.id DESC
+    """, (match, match, id_exacto, limite)).fetchall()
+
+    resultado['notas'] = conn.execute(f"""
+        SELECT n.id, n.reparacion_id, n.usuario, n.contenido, n.fecha_creacion,
+               n.es_importante, r.dispositivo, c.nombre AS cliente
+        FROM fts_notas
+        JOIN notas_reparacion n ON n.id = fts_notas.rowid
+        JOIN reparaciones r ON r.id = n.reparacion_id
+        LEFT JOIN clientes c ON c.id = r.cliente_id
+        WHERE fts_notas MATCH ?
+        ORDER BY {_bm25('fts_notas')}
+        LIMIT ?
+    """, (match, limite)).fetchall()
+
+    if not incluir_piezas:
+        return resultado
+    resultado['piezas'] = conn.execute(f"""
+        SELECT p.id, p.nombre, p.categoria, p.cantidad, p.cantidad_minima,
+               p.precio_venta, p.ubicacion
+        FROM fts_piezas
+        JOIN inventario_piezas p ON p.id = fts_piezas.rowid
+        WHERE fts_piezas MATCH ?
+        ORDER BY {_bm25('fts_piezas')}
+        LIMIT ?
+    """, (match, limite)).fetchall()
+    return resultado
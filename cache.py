@@ -0,0 +1,78 @@
+"""Cache de resultados compartida entre workers, invalidada por version de datos.
+
+Los resultados se guardan en la tabla ``cache_respuestas`` de la propia
+BD SQLite, asi que los dos workers de gunicorn ven las mismas entradas.
+``version_datos`` es un contador monotono que los triggers incrementan en
+cada INSERT/UPDATE/DELETE sobre ``clientes``, ``reparaciones``,
+``reparaciones_historial`` y ``audit_log``: una entrada solo es valida si se calculo con la version
+actual y no ha superado el TTL (para que las metricas dependientes de la
+hora, como "atrasadas" o el mes en curso, roten aunque no haya escrituras).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger("androtech")
+
+# Segundos de validez de una entrada aunque no cambie la version de datos
+CACHE_TTL = int(os.environ.get("DASHBOARD_CACHE_TTL", "60"))
+
+# Tablas cuyas escrituras invalidan la cache.  Los triggers los crean las
+# migraciones v007 y v015: anadir una tabla aqui exige una migracion nueva.
+TABLAS_VERSIONADAS = ('clientes', 'reparaciones', 'reparaciones_historial', 'audit_log')
+
+
+def version_datos(conn):
+    """Version actual de los datos (0 si la tabla aun no existe)."""
+    try:
+        fila = conn.execute("SELECT version FROM version_datos WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return fila[0] if fila else 0
+
+
+def en_cache(conn, clave, calcular, ttl=None):
+    """Devuelve el valor cacheado para ``clave`` o lo calcula y lo guarda.
+
+    ``calcular`` es un callable sin argumentos cuyo resultado debe ser
+    serializable a JSON.  Si la cache no esta disponible (migracion
+    pendiente, BD bloqueada) se devuelve el valor calculado sin guardarlo.
+    """
+    ttl = CACHE_TTL if ttl is None else ttl
+    if ttl <= 0:
+        return calcular()
+
+    ahora = time.time()
+    try:
+        fila = conn.execute("""
+            SELECT v.version, c.version AS version_cache, c.creado_en, c.valor
+            FROM version_datos v
+            LEFT JOIN cache_respuestas c ON c.clave = ?
+            WHERE v.id = 1
+        """, (clave,)).fetchone()
+    except sqlite3.OperationalError as e:
+        logger.warning(json.dumps({"event": "cache_no_disponible", "clave": clave, "error": str(e)}))
+        return calcular()
+
+    version = fila[0] if fila else 0
+    if fila and fila[3] is not None and fila[1] == version and ahora - fila[2] < ttl:
+        return json.loads(fila[3])
+
+    # La version se lee antes de calcular: si otra peticion escribe mientras
+    # tanto, la entrada queda con una version antigua y la siguiente lectura falla.
+    valor = calcular()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_respuestas (clave, version, creado_en, valor) VALUES (?, ?, ?, ?)",
+            (clave, version, ahora, json.dumps(valor, default=str)),
+        )
+        # Las claves de conteos dependen de los filtros: purgar las caducadas
+        conn.execute("DELETE FROM cache_respuestas WHERE creado_en < ?", (ahora - max(ttl, 3600),))
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        conn.rollback()
+        logger.warning(json.dumps({"event": "cache_escritura_fallida", "clave": clave, "error": str(e)}))
+    return valor
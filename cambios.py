@@ -0,0 +1,99 @@
+"""Feed incremental de cambios (NDJSON) para el almacen de informes.
+
+Cada tabla de :data:`TABLAS_CAMBIOS` tiene una columna ``rowversion``
+que los triggers ``cambios_<tabla>_*`` rellenan en cada INSERT/UPDATE
+con el siguiente valor de un contador global (``cambios_secuencia``).
+Los DELETE dejan una lapida en ``cambios_borrados`` con su propio
+``rowversion``.  Como las escrituras en SQLite son serializadas, el
+contador nunca retrocede: quien ya ha leido hasta ``N`` solo tiene que
+pedir las filas con ``rowversion > N``.
+
+Los pagos no tienen tabla propia (son columnas de ``reparaciones``), asi
+que un cobro llega como cambio de la reparacion.
+"""
+
+import json
+
+# Tabla -> columnas que no se envian (p. ej. la firma, una imagen en base64).
+# La columna y los triggers de cada tabla los crea la migracion v011.
+TABLAS_CAMBIOS = {
+    'clientes': (),
+    'reparaciones': ('firma',),
+    'reparaciones_historial': (),
+    'inventario_piezas': (),
+    'piezas_reparacion': (),
+}
+
+# Filas emitidas entre vaciados del buffer de la respuesta
+FILAS_POR_BLOQUE = 500
+
+
+def marcar_nuevas(conn, tabla, desde_id):
+    """Da un mismo ``rowversion`` nuevo a las filas de ``tabla`` con ``id > desde_id``.
+
+    Para cargas masivas hechas sin los triggers ``cambios_<tabla>_*``: como
+    entran en una sola transaccion, basta un valor del contador para todas.
+    """
+    conn.execute("UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1")
+    conn.execute(f"""
+        UPDATE {tabla} SET rowversion = (SELECT valor FROM cambios_secuencia WHERE id = 1)
+        WHERE id > ?
+    """, (desde_id,))
+
+
+def cursor_actual(conn):
+    fila = conn.execute("SELECT valor FROM cambios_secuencia WHERE id = 1").fetchone()
+    return fila[0] if fila else 0
+
+
+def _linea(objeto):
+    return json.dumps(objeto, ensure_ascii=False, separators=(',', ':'), default=str) + "\n"
+
+
+def generar_cambios(abrir_conexion, desde):
+    """Generador de bytes NDJSON con los cambios posteriores a ``desde``.
+
+    La primera linea es ``{"tipo": "inicio", "desde": .., "hasta": ..}``.
+    Despues, por tabla y en orden de ``rowversion``, una linea
+    ``{"tipo": "fila", "tabla", "rowversion", "fila": {...}}`` por cada
+    fila nueva o modificada; a continuacion las lapidas
+    ``{"tipo": "borrado", "tabla", "rowversion", "id"}``.  La ultima linea,
+    ``{"tipo": "fin", "cursor": hasta, "filas": n}``, da el cursor para la
+    siguiente llamada; si no llega, la descarga se corto y hay que repetirla
+    con el mismo ``desde``.
+
+    Todo se lee en una sola transaccion, asi que ``hasta`` es exacto.
+    """
+    conn = abrir_conexion()
+    try:
+        conn.execute("BEGIN")
+        hasta = cursor_actual(conn)
+        yield _linea({'tipo': 'inicio', 'desde': desde, 'hasta': hasta}).encode('utf-8')
+
+        partes = []
+        emitidas = 0
+        for tabla, excluidas in TABLAS_CAMBIOS.items():
+            cursor = conn.execute(
+                f"SELECT * FROM {tabla} WHERE rowversion > ? ORDER BY rowversion", (desde,))
+            nombres = [d[0] for d in cursor.description]
+            for fila in cursor:
+                datos = {k: v for k, v in zip(nombres, fila) if k not in excluidas}
+                partes.append(_linea({
+                    'tipo': 'fila', 'tabla': tabla, 'rowversion': datos['rowversion'], 'fila': datos,
+                }))
+                emitidas += 1
+                if len(partes) >= FILAS_POR_BLOQUE:
+                    yield ''.join(partes).encode('utf-8')
+                    partes.clear()
+
+        for rowversion, tabla, fila_id in conn.execute(
+                "SELECT rowversion, tabla, fila_id FROM cambios_borrados WHERE rowversion > ? ORDER BY rowversion",
+                (desde,)):
+            partes.append(_linea({'tipo': 'borrado', 'tabla': tabla, 'rowversion': rowversion, 'id': fila_id}))
+            emitidas += 1
+
+        partes.append(_linea({'tipo': 'fin', 'cursor': hasta, 'filas': emitidas}))
+        yield ''.join(partes).encode('utf-8')
+    finally:
+        conn.rollback()
+        conn.close()
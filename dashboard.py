@@ -0,0 +1,246 @@
+"""Metricas del dashboard en un numero fijo de consultas.
+
+:func:`dashboard_metrics` sustituye la quincena de ``COUNT``/``SUM`` y el
+bucle de seis consultas por rango del grafico de ingresos por, como
+maximo, tres consultas:
+
+1. la fila de ``kpi_counters`` junto con una pasada de agregados
+   condicionales (mes en curso y tiempo medio de reparacion);
+2. un ``GROUP BY strftime('%Y-%m', fecha_entrada)`` para los seis meses
+   naturales del grafico;
+3. los dispositivos mas reparados.
+
+La distribucion por estado sale de los contadores de la consulta 1.
+:func:`datos_dashboard` anade los listados y devuelve el contexto de la
+plantilla, que ``/dashboard`` guarda en la cache de :mod:`cache`; los
+graficos se sirven por separado con :data:`METRICAS_API`.
+"""
+
+from datetime import datetime, timedelta
+
+from alerts import calcular_alertas_reparacion
+from audit import obtener_auditoria_reciente
+from kpis import ESTADOS_TERMINADOS, kpis_desde_fila, obtener_kpis
+
+MESES_GRAFICO = 6
+TOP_DISPOSITIVOS = 5
+
+
+def _meses_atras(fecha, n):
+    """Primer dia del mes natural ``n`` meses antes de ``fecha``."""
+    total = fecha.year * 12 + (fecha.month - 1) - n
+    return datetime(total // 12, total % 12 + 1, 1)
+
+
+def ingresos_por_mes(conn, now):
+    """Ingresos de los ultimos ``MESES_GRAFICO`` meses naturales (un GROUP BY)."""
+    inicio_grafico = _meses_atras(now, MESES_GRAFICO - 1)
+    por_mes = dict(conn.execute("""
+        SELECT strftime('%Y-%m', fecha_entrada) AS mes, SUM(precio)
+        FROM reparaciones
+        WHERE fecha_entrada >= ? AND fecha_entrada <= ? AND precio IS NOT NULL
+        GROUP BY mes
+    """, (inicio_grafico.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d %H:%M:%S"))).fetchall())
+    resultado = []
+    for i in range(MESES_GRAFICO - 1, -1, -1):
+        inicio = _meses_atras(now, i)
+        resultado.append({
+            "mes": inicio.strftime("%b %Y"),
+            "valor": round(por_mes.get(inicio.strftime("%Y-%m")) or 0, 2),
+        })
+    return resultado
+
+
+def dispositivos_top(conn, limite=TOP_DISPOSITIVOS):
+    """Dispositivos mas reparados."""
+    filas = conn.execute("""
+        SELECT dispositivo, COUNT(*) AS cantidad
+        FROM reparaciones
+        WHERE dispositivo IS NOT NULL AND dispositivo != ''
+        GROUP BY dispositivo
+        ORDER BY cantidad DESC
+        LIMIT ?
+    """, (limite,)).fetchall()
+    return [{"nombre": d[0], "cantidad": d[1]} for d in filas]
+
+
+def estados_distribucion(kpis):
+    """Reparaciones por estado, de mayor a menor, a partir de los contadores."""
+    estados = sorted(
+        ((e, c) for e, c in kpis['por_estado'].items() if c),
+        key=lambda ec: ec[1], reverse=True
+    )
+    return [{"nombre": e, "cantidad": c} for e, c in estados]
+
+
+def reparaciones_por_tecnico(conn):
+    """Intervenciones registradas en el historial por cada usuario."""
+    filas = conn.execute("""
+        SELECT usuario, COUNT(*) as cantidad
+        FROM reparaciones_historial
+        WHERE usuario IS NOT NULL AND usuario != ''
+        GROUP BY usuario
+        ORDER BY cantidad DESC
+    """).fetchall()
+    return [{"nombre": t[0], "cantidad": t[1]} for t in filas]
+
+
+def dashboard_metrics(conn, now=None, graficos=True):
+    """Devuelve un dict con las metricas del dashboard.
+
+    Claves: ``kpis`` (ver :func:`kpis.kpis_desde_fila`), ``ingresos_mes``,
+    ``reparaciones_mes``, ``completadas_mes``, ``tiempo_medio_dias``,
+    ``estados_distribucion`` y, si ``graficos``, ``ingresos_por_mes`` (del
+    mes mas antiguo al actual) y ``dispositivos_top``.  Con
+    ``graficos=False`` es una sola consulta.
+    """
+    now = now or datetime.now()
+    inicio_mes = datetime(now.year, now.month, 1).strftime("%Y-%m-%d")
+    terminados = ", ".join(f"'{e}'" for e in ESTADOS_TERMINADOS)
+
+    # 1) Contadores + agregados condicionales.  El tramo del mes usa el
+    #    indice de fecha_entrada; el tiempo medio recorre solo las terminadas
+    #    (indice por estado) con el ultimo cambio del historial por indice.
+    fila = conn.execute(f"""
+        SELECT k.*,
+               mes.ingresos_mes, mes.reparaciones_mes, mes.completadas_mes,
+               (SELECT AVG(julianday(COALESCE(
+                           (SELECT MAX(h.fecha_cambio) FROM reparaciones_historial h
+                            WHERE h.reparacion_id = t.id),
+                           t.fecha_entrada)) - julianday(t.fecha_entrada))
+                FROM reparaciones t
+                WHERE t.estado IN ({terminados})) AS tiempo_medio
+        FROM kpi_counters k,
+             (SELECT IFNULL(SUM(precio), 0) AS ingresos_mes,
+                     COUNT(*) AS reparaciones_mes,
+                     IFNULL(SUM(CASE WHEN estado IN ({terminados}) THEN 1 ELSE 0 END), 0) AS completadas_mes
+              FROM reparaciones
+              WHERE fecha_entrada >= ?) AS mes
+        WHERE k.id = 1
+    """, (inicio_mes,)).fetchone()
+    kpis = kpis_desde_fila(fila)
+
+    tiempo_medio = fila['tiempo_medio'] if fila is not None else None
+    metricas = {
+        'kpis': kpis,
+        'ingresos_mes': round(fila['ingresos_mes'], 2) if fila is not None else 0,
+        'reparaciones_mes': fila['reparaciones_mes'] if fila is not None else 0,
+        'completadas_mes': fila['completadas_mes'] if fila is not None else 0,
+        'tiempo_medio_dias': round(float(tiempo_medio), 1) if tiempo_medio else 0,
+        'estados_distribucion': estados_distribucion(kpis),
+    }
+    if graficos:
+        # 2) y 3)
+        metricas['ingresos_por_mes'] = ingresos_por_mes(conn, now)
+        metricas['dispositivos_top'] = dispositivos_top(conn)
+    return metricas
+
+
+def _estados_api(conn, now):
+    return estados_distribucion(obtener_kpis(conn))
+
+
+# Datos de cada grafico servidos por /api/dashboard/<metrica>: callable(conn, now)
+METRICAS_API = {
+    'ingresos_por_mes': ingresos_por_mes,
+    'dispositivos_top': lambda conn, now: dispositivos_top(conn),
+    'estados_distribucion': _estados_api,
+    'reparaciones_por_tecnico': lambda conn, now: reparaciones_por_tecnico(conn),
+}
+
+
+def datos_dashboard(conn, now=None):
+    """Contexto completo de la plantilla ``dashboard.html``.
+
+    Incluye las cifras de :func:`dashboard_metrics` y los listados
+    (pendientes de pago, ultimas, atrasadas, auditoria).  Los graficos se
+    cargan aparte desde ``/api/dashboard/<metrica>`` (:data:`METRICAS_API`).
+    Todo es serializable a JSON para la cache compartida (:mod:`cache`).
+    """
+    now = now or datetime.now()
+    metricas = dashboard_metrics(conn, now, graficos=False)
+    kpis = metricas['kpis']
+    ingresos_total = kpis['ingresos_total']
+    ingresos_mes = metricas['ingresos_mes']
+    activas, terminadas = kpis['activas'], kpis['terminadas']
+
+    # Tasa de cobro (porcentaje)
+    tasa_cobro = 0
+    if ingresos_total > 0:
+        tasa_cobro = round((kpis['cobrado'] / ingresos_total * 100), 1)
+
+    # Reparaciones pendientes de pago (ultimas 5)
+    reparaciones_sin_pagar = [dict(r) for r in conn.execute("""
+        SELECT reparaciones.*, clientes.nombre AS cliente
+        FROM reparaciones
+        LEFT JOIN clientes ON clientes.id = reparaciones.cliente_id
+        WHERE reparaciones.estado_pago = 'Pendiente'
+        AND reparaciones.precio IS NOT NULL AND reparaciones.precio > 0
+        ORDER BY reparaciones.id DESC
+        LIMIT 5
+    """).fetchall()]
+
+    # Porcentajes
+    total_rep = activas + terminadas
+    porcentaje_activas = round((activas / total_rep * 100), 1) if total_rep > 0 else 0
+    porcentaje_terminadas = round((terminadas / total_rep * 100), 1) if total_rep > 0 else 0
+
+    # Ultimas 5 reparaciones
+    ultimas_reparaciones = [dict(r) for r in conn.execute("""
+        SELECT reparaciones.*, clientes.nombre AS cliente
+        FROM reparaciones
+        LEFT JOIN clientes ON clientes.id = reparaciones.cliente_id
+        ORDER BY reparaciones.id DESC
+        LIMIT 5
+    """).fetchall()]
+
+    # Reparaciones atrasadas (sin actualizacion hace > 7 dias)
+    hace_7_dias = (now - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+    reparaciones_atrasadas = [dict(r) for r in conn.execute("""
+        SELECT reparaciones.*, clientes.nombre AS cliente,
+               (SELECT fecha_cambio FROM reparaciones_historial
+                WHERE reparacion_id = reparaciones.id
+                ORDER BY fecha_cambio DESC LIMIT 1) AS ultima_actualizacion
+        FROM reparaciones
+        LEFT JOIN clientes ON clientes.id = reparaciones.cliente_id
+        WHERE reparaciones.estado IN ('En proceso', 'Pendiente')
+        AND (
+            SELECT fecha_cambio FROM reparaciones_historial
+            WHERE reparacion_id = reparaciones.id
+            ORDER BY fecha_cambio DESC LIMIT 1
+        ) < ?
+        OR (
+            SELECT COUNT(*) FROM reparaciones_historial
+            WHERE reparacion_id = reparaciones.id
+        ) = 0
+        ORDER BY reparaciones.id DESC
+    """, (hace_7_dias,)).fetchall()]
+
+    # Enriquecer con alertas
+    for rep in reparaciones_sin_pagar + reparaciones_atrasadas:
+        rep['alertas_info'] = calcular_alertas_reparacion(rep, rep.get('ultima_actualizacion'))
+
+    return {
+        'total_clientes': kpis['total_clientes'],
+        'total_reparaciones': kpis['total_reparaciones'],
+        'reparaciones_activas': activas,
+        'reparaciones_terminadas': terminadas,
+        'porcentaje_activas': porcentaje_activas,
+        'porcentaje_terminadas': porcentaje_terminadas,
+        'ingresos_total': round(ingresos_total, 2),
+        'iva_total': round(ingresos_total * 0.21, 2),
+        'ingresos_mes': round(ingresos_mes, 2),
+        'iva_mes': round(ingresos_mes * 0.21, 2),
+        'reparaciones_mes': metricas['reparaciones_mes'],
+        'reparaciones_completadas_mes': metricas['completadas_mes'],
+        'ultimas_reparaciones': ultimas_reparaciones,
+        'dinero_cobrado': round(kpis['cobrado'], 2),
+        'dinero_por_cobrar': round(kpis['por_cobrar'], 2),
+        'reparaciones_pendiente_pago': kpis['pendientes_cobro'],
+        'reparaciones_pagadas': kpis['pagadas'],
+        'tasa_cobro': tasa_cobro,
+        'reparaciones_sin_pagar': reparaciones_sin_pagar,
+        'reparaciones_atrasadas': reparaciones_atrasadas,
+        'tiempo_medio_dias': metricas['tiempo_medio_dias'],
+        'eventos_auditoria': obtener_auditoria_reciente(conn, limite=10),
+    }
@@ -1,14 +1,195 @@
-"""Database connection helpers."""
+"""Database connection helpers.
 
+Each worker process keeps a small pool of SQLite connections.  Inside a
+Flask request ``get_db()`` hands out a single pooled connection bound to
+``flask.g``; every call during that request reuses it and the connection
+goes back to the pool on teardown (see :func:`release_db`).  Outside a
+request (scripts, CLI) a fresh, already-configured connection is returned.
+
+All connections are opened in WAL mode with tuned pragmas so readers do
+not block behind writers across gunicorn workers.
+"""
+
+import os
 import sqlite3
+import threading
+import time
 
+from flask import g, has_app_context
 
-def get_db():
-    """Return a new SQLite connection with row factory set.
+# Ruta de la BD: configurable via entorno (ver .env.example)
+DB_PATH = os.environ.get("DATABASE_PATH", "database/andro_tech.db")
+
+# Tamano maximo del pool por proceso y espera maxima para obtener conexion
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+
+# Pragmas aplicados a cada conexion nueva
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 8192          # cache de paginas (~8 MB por conexion)
+MMAP_SIZE = 64 * 1024 * 1024  # 64 MB de memoria mapeada
+
+_trace_callback = None
 
-    The path is hardcoded to the project's database; change it if you
-    relocate the file or want to make it configurable.
+
+def set_trace_callback(callback):
+    """Install an SQL trace callback on every connection opened afterwards.
+
+    Used by the diagnostic scripts to collect the statements issued by the
+    routes; pass ``None`` to disable it.
     """
-    conn = sqlite3.connect("database/andro_tech.db")
+    global _trace_callback
+    _trace_callback = callback
+
+
+def _connect():
+    """Open a new SQLite connection with row factory and pragmas set."""
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000,
+                           check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    if _trace_callback is not None:
+        conn.set_trace_callback(_trace_callback)
     return conn
+
+
+class PooledConnection:
+    """Thin proxy around a pooled ``sqlite3.Connection``.
+
+    Routes still call ``conn.close()`` when they are done; for a pooled
+    connection that is a no-op because the connection belongs to the
+    request and is released on teardown.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name == "_conn":
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+
+class ConnectionPool:
+    """Per-process pool of SQLite connections with usage counters."""
+
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {"checkouts": 0, "waits": 0, "timeouts": 0, "wait_ms": 0.0}
+
+    def acquire(self):
+        with self._cond:
+            self._stats["checkouts"] += 1
+            if not self._idle and self._open >= self.size:
+                self._stats["waits"] += 1
+                inicio = time.monotonic()
+                ok = self._cond.wait_for(
+                    lambda: self._idle or self._open < self.size, self.timeout
+                )
+                self._stats["wait_ms"] += (time.monotonic() - inicio) * 1000
+                if not ok:
+                    self._stats["timeouts"] += 1
+                    raise TimeoutError("No hay conexiones libres en el pool de BD")
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+        try:
+            return _connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Conexion inutilizable: se descarta y se libera su hueco
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "checkouts": self._stats["checkouts"],
+                "waits": self._stats["waits"],
+                "timeouts": self._stats["timeouts"],
+                "wait_ms": round(self._stats["wait_ms"], 2),
+            }
+
+
+_pool = ConnectionPool()
+
+
+def get_db():
+    """Return a SQLite connection with row factory set.
+
+    Within an application context the same pooled connection is returned
+    for the whole request; otherwise a new standalone connection is opened
+    and the caller is responsible for closing it.
+    """
+    if not has_app_context():
+        return _connect()
+    if "_db_conn" not in g:
+        g._db_conn = _pool.acquire()
+    return PooledConnection(g._db_conn)
+
+
+def open_db():
+    """Open a standalone (non-pooled) connection; the caller closes it.
+
+    For readers that outlive the request handler, such as streamed
+    responses, so they do not hold one of the pool's connections.
+    """
+    return _connect()
+
+
+def release_db(exc=None):
+    """Teardown hook: return the request connection to the pool."""
+    conn = g.pop("_db_conn", None)
+    if conn is not None:
+        _pool.release(conn)
+
+
+def pool_stats():
+    """Counters of the current worker's pool, for monitoring."""
+    stats = _pool.stats()
+    stats["pid"] = os.getpid()
+    return stats
@@ -0,0 +1,521 @@
+"""Informes CSV y trabajos de exportacion en segundo plano.
+
+Cada informe (:data:`INFORMES`) describe su resumen, su consulta de
+detalle y el formato de fila; las rutas ``/exportar/*.csv`` los envian en
+streaming (:mod:`utils.csv_export`) y los trabajos los escriben a disco.
+
+Un trabajo es una fila de ``export_jobs``: la peticion POST la crea como
+``pendiente`` y vuelve enseguida; un hilo de fondo del worker la reclama,
+escribe el CSV por bloques en ``EXPORT_DIR`` (primero ``.part`` y al
+final se renombra) y va anotando las filas escritas.  La interfaz
+consulta el estado hasta que el fichero esta listo, y los ficheros se
+borran pasadas ``EXPORT_TTL_HORAS`` (los pendientes que nadie ha
+reclamado en ese plazo, tambien).  Como el estado vive en la BD,
+cualquiera de los workers de gunicorn puede servir la consulta o la
+descarga.
+"""
+
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import date, datetime
+from functools import lru_cache
+
+from alerts import calcular_alertas_reparacion
+from db import open_db
+from kpis import obtener_kpis
+from utils.csv_export import Columna, fmt_precio, generar_informe
+
+logger = logging.getLogger("androtech")
+
+EXPORT_DIR = os.environ.get("EXPORT_DIR", "exports")
+EXPORT_TTL_HORAS = float(os.environ.get("EXPORT_TTL_HORAS", "24"))
+
+# Trabajos activos (pendientes o en curso) permitidos por usuario
+MAX_ACTIVOS_POR_USUARIO = 3
+# Un trabajo en curso sin latido en este tiempo se da por interrumpido
+# (p. ej. gunicorn reinicio el worker que lo ejecutaba)
+SEGUNDOS_HUERFANO = 300
+# Frecuencia maxima con la que se anota el progreso en la BD
+SEGUNDOS_PROGRESO = 1.0
+SEGUNDOS_ESPERA = 30
+
+# Filtros de /export/reparaciones que se guardan con el trabajo
+FILTROS_REPARACIONES = ('cliente', 'estado', 'pago', 'fecha_desde', 'fecha_hasta')
+
+
+# =========================================
+#  Informes
+# =========================================
+
+def build_reparaciones_filters(args):
+    """Construye cláusula WHERE y parámetros a partir de query params.
+
+    args: objeto parecido a dict (p. ej. request.args)
+    Devuelve (where_clause, params_list)
+    """
+    clauses = []
+    params = []
+
+    cliente = args.get('cliente')
+    if cliente:
+        clauses.append("clientes.nombre LIKE ?")
+        params.append(f"%{cliente}%")
+
+    estado = args.get('estado')
+    if estado:
+        clauses.append("reparaciones.estado = ?")
+        params.append(estado)
+
+    pago = args.get('pago')
+    if pago:
+        clauses.append("reparaciones.estado_pago = ?")
+        params.append(pago)
+
+    fecha_desde = args.get('fecha_desde')
+    if fecha_desde:
+        clauses.append("reparaciones.fecha_entrada >= ?")
+        params.append(fecha_desde)
+
+    fecha_hasta = args.get('fecha_hasta')
+    if fecha_hasta:
+        clauses.append("reparaciones.fecha_entrada <= ?")
+        params.append(fecha_hasta)
+
+    where = " AND ".join(clauses) if clauses else "1=1"
+    return where, params
+
+
+def _resumen_reparaciones_csv(total, facturado, cobrado, por_estado):
+    """Bloque de resumen comun a los informes de reparaciones."""
+    return [
+        ['--- RESUMEN ---'],
+        ['Total reparaciones', total],
+        ['Total facturado',    fmt_precio(facturado)],
+        ['Total cobrado',      fmt_precio(cobrado)],
+        ['Pendiente de cobro', fmt_precio(facturado - cobrado)],
+        [],
+        ['Estado', 'Cantidad'],
+        ['Pendiente',   por_estado.get('Pendiente', 0)],
+        ['En proceso',  por_estado.get('En proceso', 0)],
+        ['Terminado',   por_estado.get('Terminado', 0)],
+        ['Entregado',   por_estado.get('Entregado', 0)],
+        [],
+    ]
+
+
+COLUMNAS_REPARACIONES = [
+    Columna('N. Reparacion',  'id'),
+    Columna('Cliente',        'cliente', 'texto', 'Sin asignar'),
+    Columna('Email',          'email', 'texto'),
+    Columna('Telefono',       'telefono', 'texto'),
+    Columna('Direccion',      'direccion', 'texto'),
+    Columna('Dispositivo',    'dispositivo'),
+    Columna('Descripcion',    'descripcion', 'texto'),
+    Columna('Estado',         'estado'),
+    Columna('Estado Pago',    'estado_pago'),
+    Columna('Precio',         'precio', 'precio'),
+    Columna('Tipo Documento', 'tipo_documento', 'texto'),
+    Columna('Fecha Entrada',  'fecha_entrada', 'fecha'),
+    Columna('Fecha Salida',   'fecha_salida', 'fecha'),
+    Columna('Fecha Pago',     'fecha_pago', 'fecha'),
+    Columna('Metodo Pago',    'metodo_pago', 'texto'),
+    Columna('Fotos',          'num_fotos'),
+    Columna('Notas',          'num_notas'),
+    Columna('Firmado',        'firmado'),
+]
+
+
+def _informe_reparaciones(parametros):
+    def resumen(conn):
+        # Sin filtros los totales ya estan en kpi_counters
+        kpis = obtener_kpis(conn)
+        return _resumen_reparaciones_csv(
+            kpis['total_reparaciones'], kpis['ingresos_total'], kpis['cobrado'], kpis['por_estado'])
+
+    return {
+        'titulo': 'INFORME COMPLETO DE REPARACIONES',
+        'fichero': 'AndroTech_Reparaciones',
+        'resumen': resumen,
+        'contar': lambda conn: obtener_kpis(conn)['total_reparaciones'],
+        'titulo_detalle': '--- DETALLE DE REPARACIONES ---',
+        'columnas': COLUMNAS_REPARACIONES,
+        'consulta': '''
+            SELECT r.id, c.nombre as cliente, c.email, c.telefono, c.direccion,
+                   r.dispositivo, r.descripcion, r.estado, r.estado_pago,
+                   r.precio, r.fecha_entrada, r.fecha_salida, r.fecha_pago, r.metodo_pago,
+                   r.tipo_documento,
+                   (SELECT COUNT(*) FROM fotos_reparacion WHERE reparacion_id = r.id) as num_fotos,
+                   (SELECT COUNT(*) FROM notas_reparacion WHERE reparacion_id = r.id) as num_notas,
+                   CASE WHEN r.firma IS NOT NULL AND r.firma != '' THEN 'Si' ELSE 'No' END as firmado
+            FROM reparaciones r
+            LEFT JOIN clientes c ON r.cliente_id = c.id
+            ORDER BY r.id DESC
+        ''',
+        'params': (),
+    }
+
+
+def _dias_en_taller(fecha_entrada, fecha_fin):
+    """Dias entre la entrada y la finalizacion (o hoy), con las fechas crudas."""
+    if not fecha_entrada:
+        return ''
+    try:
+        d_ent = date.fromisoformat(str(fecha_entrada)[:10])
+        d_fin = date.fromisoformat(str(fecha_fin)[:10]) if fecha_fin else date.today()
+        return (d_fin - d_ent).days
+    except Exception:
+        return ''
+
+
+@lru_cache(maxsize=64)
+def _texto_alertas(tiene_precio, estado_pago, estado):
+    # Sin fecha de actualizacion las alertas solo dependen de estos tres
+    # valores, asi que se calculan una vez por combinacion
+    info = calcular_alertas_reparacion({
+        'precio': 1 if tiene_precio else 0, 'estado_pago': estado_pago, 'estado': estado,
+    })
+    if info and info.get('tiene_alertas'):
+        return ' | '.join(a['mensaje'] for a in info['alertas'])
+    return ''
+
+
+def _alertas_reparacion(precio, estado_pago, estado):
+    """Alertas de la reparacion en texto plano."""
+    try:
+        return _texto_alertas(bool(precio) and precio > 0, estado_pago, estado)
+    except Exception:
+        return ''
+
+
+COLUMNAS_REPARACIONES_FILTRADO = [
+    Columna('N. Reparacion',      'id'),
+    Columna('Cliente',            'cliente', 'texto', 'Sin asignar'),
+    Columna('Telefono',           'telefono', 'texto'),
+    Columna('Dispositivo',        'dispositivo'),
+    Columna('Estado',             'estado'),
+    Columna('Estado Pago',        'estado_pago'),
+    Columna('Precio',             'precio', 'precio'),
+    Columna('Fecha Entrada',      'fecha_entrada', 'fecha'),
+    Columna('Fecha Finalizacion', 'fecha_finalizacion', 'fecha'),
+    Columna('Dias en Taller',     ('fecha_entrada', 'fecha_finalizacion'), _dias_en_taller),
+    Columna('Alertas',            ('precio', 'estado_pago', 'estado'), _alertas_reparacion),
+]
+
+
+def _informe_reparaciones_filtrado(parametros):
+    where, params = build_reparaciones_filters(parametros)
+    desde = "FROM reparaciones JOIN clientes ON clientes.id = reparaciones.cliente_id "
+
+    def resumen(conn):
+        fila = conn.execute(f"""
+            SELECT COUNT(*), SUM(reparaciones.precio),
+                   SUM(CASE WHEN reparaciones.estado_pago = 'Pagado' THEN reparaciones.precio END),
+                   SUM(reparaciones.estado = 'Pendiente'), SUM(reparaciones.estado = 'En proceso'),
+                   SUM(reparaciones.estado = 'Terminado'), SUM(reparaciones.estado = 'Entregado')
+            {desde} WHERE {where}
+        """, params).fetchone()
+        return _resumen_reparaciones_csv(fila[0], fila[1] or 0, fila[2] or 0, {
+            'Pendiente': fila[3] or 0, 'En proceso': fila[4] or 0,
+            'Terminado': fila[5] or 0, 'Entregado': fila[6] or 0,
+        })
+
+    return {
+        'titulo': 'INFORME FILTRADO DE REPARACIONES',
+        'fichero': 'AndroTech_Reparaciones_Filtro',
+        'resumen': resumen,
+        'contar': lambda conn: conn.execute(f"SELECT COUNT(*) {desde} WHERE {where}", params).fetchone()[0],
+        'titulo_detalle': '--- DETALLE DE REPARACIONES ---',
+        'columnas': COLUMNAS_REPARACIONES_FILTRADO,
+        'consulta': (
+            "SELECT reparaciones.id, clientes.nombre as cliente, clientes.telefono, "
+            "reparaciones.dispositivo, reparaciones.estado, reparaciones.estado_pago, "
+            "reparaciones.precio, reparaciones.fecha_entrada, reparaciones.fecha_pago as fecha_finalizacion "
+            f"{desde} WHERE {where} ORDER BY reparaciones.id DESC"
+        ),
+        'params': params,
+    }
+
+
+COLUMNAS_CLIENTES = [
+    Columna('N. Cliente',               'id'),
+    Columna('Nombre',                   'nombre'),
+    Columna('Email',                    'email', 'texto'),
+    Columna('Telefono',                 'telefono', 'texto'),
+    Columna('Direccion',                'direccion', 'texto'),
+    Columna('Total Reparaciones',       'total_reparaciones'),
+    Columna('Reparaciones Activas',     'reparaciones_activas', 'texto', 0),
+    Columna('Reparaciones Completadas', 'reparaciones_completadas', 'texto', 0),
+    Columna('Total Facturado',          'total_facturado', 'precio'),
+    Columna('Total Pagado',             'total_pagado', 'precio'),
+    Columna('Pendiente',                'total_pendiente', 'precio'),
+    Columna('Ultima Visita',            'ultima_visita', 'fecha', 'Sin visitas'),
+]
+
+
+def _informe_clientes(parametros):
+    def resumen(conn):
+        fila = conn.execute('''
+            SELECT COUNT(DISTINCT c.id),
+                   COUNT(DISTINCT CASE WHEN r.estado IN ('Pendiente', 'En proceso') THEN c.id END),
+                   COALESCE(SUM(r.precio), 0),
+                   COALESCE(SUM(CASE WHEN r.estado_pago = 'Pagado' THEN r.precio END), 0)
+            FROM clientes c
+            LEFT JOIN reparaciones r ON r.cliente_id = c.id
+        ''').fetchone()
+        total_clientes, clientes_activos, total_facturado, total_cobrado = fila
+        return [
+            ['--- RESUMEN ---'],
+            ['Total clientes',          total_clientes],
+            ['Clientes con rep. activa', clientes_activos],
+            ['Total facturado',          fmt_precio(total_facturado)],
+            ['Total cobrado',            fmt_precio(total_cobrado)],
+            ['Pendiente de cobro',       fmt_precio(total_facturado - total_cobrado)],
+            [],
+        ]
+
+    return {
+        'titulo': 'INFORME COMPLETO DE CLIENTES',
+        'fichero': 'AndroTech_Clientes',
+        'resumen': resumen,
+        'contar': lambda conn: obtener_kpis(conn)['total_clientes'],
+        'titulo_detalle': '--- DETALLE DE CLIENTES ---',
+        'columnas': COLUMNAS_CLIENTES,
+        # Agrupar por (nombre, id) deja recorrer idx_clientes_nombre en orden y
+        # emitir cada cliente en cuanto se agrega, sin ordenar todo al final
+        'consulta': '''
+            SELECT c.id, c.nombre, c.email, c.telefono, c.direccion,
+                   COUNT(r.id) as total_reparaciones,
+                   SUM(CASE WHEN r.estado IN ('Pendiente', 'En proceso') THEN 1 ELSE 0 END) as reparaciones_activas,
+                   SUM(CASE WHEN r.estado IN ('Terminado', 'Entregado') THEN 1 ELSE 0 END) as reparaciones_completadas,
+                   COALESCE(SUM(r.precio), 0) as total_facturado,
+                   COALESCE(SUM(CASE WHEN r.estado_pago = 'Pagado' THEN r.precio ELSE 0 END), 0) as total_pagado,
+                   COALESCE(SUM(CASE WHEN r.estado_pago = 'Pendiente' THEN r.precio ELSE 0 END), 0) as total_pendiente,
+                   MAX(r.fecha_entrada) as ultima_visita
+            FROM clientes c
+            LEFT JOIN reparaciones r ON r.cliente_id = c.id
+            GROUP BY c.nombre, c.id
+            ORDER BY c.nombre, c.id
+        ''',
+        'params': (),
+    }
+
+
+# Nombre -> (constructor(parametros) -> definicion, etiqueta para la interfaz)
+INFORMES = {
+    'reparaciones': (_informe_reparaciones, 'Reparaciones (completo)'),
+    'reparaciones_filtrado': (_informe_reparaciones_filtrado, 'Reparaciones (filtrado)'),
+    'clientes': (_informe_clientes, 'Clientes'),
+}
+
+
+def informe_csv(nombre, parametros, usuario, progreso=None):
+    """Generador de bytes del informe ``nombre`` (ver :data:`INFORMES`).
+
+    Devuelve ``(generador, nombre_fichero)``.
+    """
+    definicion = INFORMES[nombre][0](parametros)
+    generador = generar_informe(
+        open_db, definicion['titulo'], usuario, definicion['resumen'],
+        definicion['titulo_detalle'], definicion['columnas'],
+        definicion['consulta'], definicion['params'],
+        progreso=progreso,
+    )
+    return generador, f'{definicion["fichero"]}_{datetime.now().strftime("%Y%m%d_%H%M")}.csv'
+
+
+# =========================================
+#  Trabajos en segundo plano
+# =========================================
+
+def crear_trabajo(conn, informe, parametros, usuario):
+    """Encola un trabajo y despierta al hilo de fondo.
+
+    Devuelve el id del trabajo, o None si el usuario ya tiene
+    ``MAX_ACTIVOS_POR_USUARIO`` trabajos sin terminar.
+    """
+    activos = conn.execute(
+        "SELECT COUNT(*) FROM export_jobs WHERE usuario = ? AND estado IN ('pendiente', 'en_curso')",
+        (usuario,)
+    ).fetchone()[0]
+    if activos >= MAX_ACTIVOS_POR_USUARIO:
+        return None
+    cur = conn.execute(
+        "INSERT INTO export_jobs (informe, parametros, usuario, creado_en) VALUES (?, ?, ?, ?)",
+        (informe, json.dumps(parametros), usuario, time.time()),
+    )
+    conn.commit()
+    despertar_worker()
+    return cur.lastrowid
+
+
+def obtener_trabajo(conn, trabajo_id):
+    fila = conn.execute("SELECT * FROM export_jobs WHERE id = ?", (trabajo_id,)).fetchone()
+    return dict(fila) if fila else None
+
+
+def listar_trabajos(conn, usuario=None, limite=50):
+    """Trabajos mas recientes (de ``usuario`` o de todos si es None)."""
+    purgar_caducados(conn)
+    if usuario is None:
+        filas = conn.execute("SELECT * FROM export_jobs ORDER BY id DESC LIMIT ?", (limite,))
+    else:
+        filas = conn.execute(
+            "SELECT * FROM export_jobs WHERE usuario = ? ORDER BY id DESC LIMIT ?", (usuario, limite))
+    return [dict(f) for f in filas]
+
+
+def estado_publico(trabajo):
+    """Campos que consulta la interfaz mientras espera."""
+    total = trabajo['filas_total']
+    porcentaje = None
+    if total:
+        porcentaje = min(100, round(trabajo['filas_escritas'] * 100 / total))
+    elif trabajo['estado'] == 'terminado':
+        porcentaje = 100
+    return {
+        'id': trabajo['id'],
+        'informe': trabajo['informe'],
+        'estado': trabajo['estado'],
+        'filas_total': total,
+        'filas_escritas': trabajo['filas_escritas'],
+        'porcentaje': porcentaje,
+        'bytes': trabajo['bytes'],
+        'error': trabajo['error'],
+        'expira_en': trabajo['expira_en'],
+    }
+
+
+def purgar_caducados(conn):
+    """Borra los trabajos caducados y sus ficheros y da por interrumpidos los huerfanos."""
+    ahora = time.time()
+    conn.execute(
+        "UPDATE export_jobs SET estado = 'error', error = 'Exportacion interrumpida', terminado_en = ? "
+        "WHERE estado = 'en_curso' AND actualizado_en < ?",
+        (ahora, ahora - SEGUNDOS_HUERFANO),
+    )
+    limite = ahora - EXPORT_TTL_HORAS * 3600
+    # Pendientes que ningun hilo ha reclamado en todo el plazo (sin fichero)
+    conn.execute("DELETE FROM export_jobs WHERE estado = 'pendiente' AND creado_en < ?", (limite,))
+    caducados = conn.execute(
+        "SELECT id, fichero FROM export_jobs "
+        "WHERE (estado = 'terminado' AND expira_en < ?) OR (estado = 'error' AND creado_en < ?)",
+        (ahora, limite),
+    ).fetchall()
+    for trabajo_id, fichero in caducados:
+        if fichero:
+            try:
+                os.remove(fichero)
+            except FileNotFoundError:
+                pass
+        conn.execute("DELETE FROM export_jobs WHERE id = ?", (trabajo_id,))
+    conn.commit()
+
+
+def _reclamar(conn):
+    """Marca como en curso el trabajo pendiente mas antiguo y lo devuelve."""
+    ahora = time.time()
+    fila = conn.execute("""
+        UPDATE export_jobs
+        SET estado = 'en_curso', iniciado_en = ?, actualizado_en = ?
+        WHERE id = (SELECT id FROM export_jobs WHERE estado = 'pendiente' ORDER BY id LIMIT 1)
+        RETURNING *
+    """, (ahora, ahora)).fetchone()
+    conn.commit()
+    return dict(fila) if fila else None
+
+
+def ejecutar_trabajo(conn, trabajo):
+    """Escribe el fichero del trabajo y deja su estado final en la BD."""
+    trabajo_id = trabajo['id']
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    # Nombre no adivinable: la descarga se sirve siempre via la ruta con permisos
+    fichero = os.path.join(EXPORT_DIR, f"{trabajo_id}_{secrets.token_hex(8)}.csv")
+    parcial = fichero + ".part"
+    try:
+        definicion = INFORMES[trabajo['informe']][0](json.loads(trabajo['parametros']))
+        conn.execute("UPDATE export_jobs SET filas_total = ? WHERE id = ?",
+                     (definicion['contar'](conn), trabajo_id))
+        conn.commit()
+
+        ultimo = [0.0]
+
+        def progreso(filas):
+            ahora = time.time()
+            if ahora - ultimo[0] >= SEGUNDOS_PROGRESO:
+                ultimo[0] = ahora
+                conn.execute("UPDATE export_jobs SET filas_escritas = ?, actualizado_en = ? WHERE id = ?",
+                             (filas, ahora, trabajo_id))
+                conn.commit()
+
+        generador, nombre_descarga = informe_csv(
+            trabajo['informe'], json.loads(trabajo['parametros']), trabajo['usuario'], progreso)
+        with open(parcial, 'wb') as f:
+            for bloque in generador:
+                f.write(bloque)
+        os.replace(parcial, fichero)
+    except Exception as e:
+        logger.exception("Fallo en la exportacion %s", trabajo_id)
+        try:
+            os.remove(parcial)
+        except FileNotFoundError:
+            pass
+        conn.rollback()
+        conn.execute(
+            "UPDATE export_jobs SET estado = 'error', error = ?, terminado_en = ? WHERE id = ?",
+            (str(e), time.time(), trabajo_id))
+        conn.commit()
+        return
+
+    ahora = time.time()
+    conn.execute("""
+        UPDATE export_jobs
+        SET estado = 'terminado', fichero = ?, nombre_descarga = ?, bytes = ?,
+            filas_escritas = COALESCE(filas_total, filas_escritas),
+            actualizado_en = ?, terminado_en = ?, expira_en = ?
+        WHERE id = ?
+    """, (fichero, nombre_descarga, os.path.getsize(fichero), ahora, ahora,
+          ahora + EXPORT_TTL_HORAS * 3600, trabajo_id))
+    conn.commit()
+    logger.info(json.dumps({
+        "event": "exportacion_terminada", "id": trabajo_id, "informe": trabajo['informe'],
+        "segundos": round(ahora - trabajo['iniciado_en'], 2),
+    }))
+
+
+# Un hilo por proceso; se despierta al crear un trabajo y revisa la cola
+# cada SEGUNDOS_ESPERA por si otro worker encolo algo
+_aviso = threading.Event()
+_hilo = None
+_cerrojo = threading.Lock()
+
+
+def _bucle():
+    while True:
+        _aviso.wait(SEGUNDOS_ESPERA)
+        _aviso.clear()
+        try:
+            conn = open_db()
+            try:
+                while True:
+                    trabajo = _reclamar(conn)
+                    if trabajo is None:
+                        break
+                    ejecutar_trabajo(conn, trabajo)
+            finally:
+                conn.close()
+        except Exception:
+            logger.exception("Error en el hilo de exportaciones")
+
+
+def despertar_worker():
+    """Arranca el hilo de fondo de este proceso si hace falta y lo avisa."""
+    global _hilo
+    with _cerrojo:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_bucle, name="exportaciones", daemon=True)
+            _hilo.start()
+    _aviso.set()
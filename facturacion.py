@@ -0,0 +1,177 @@
+"""Facturas en lote (cierre de mes).
+
+En vez de descargar las facturas una a una desde
+``/reparaciones/pdf/<id>?tipo=factura``, :func:`documentos_lote` saca con
+una sola consulta todas las reparaciones del filtro junto con sus piezas,
+y las facturas se devuelven:
+
+- en un ZIP que se envia mientras se generan (:func:`zip_documentos`):
+  las que ya estan en :mod:`utils.pdf_cache` se leen de disco y el resto
+  se reparte entre varios procesos (:func:`utils.pdf_pool.renderizar_lote`);
+- o en un unico PDF con una factura por pagina nueva
+  (``pdf_generator.generar_documentos_pdf``), que se genera en un solo
+  proceso porque ReportLab no sabe unir PDF ya hechos.
+"""
+
+import zipfile
+from datetime import date, timedelta
+from itertools import groupby
+
+from utils import pdf_cache, pdf_pool
+
+# Tope de documentos por lote; por encima hay que acotar mas el filtro
+MAX_DOCUMENTOS_LOTE = 500
+
+FORMATOS = ('zip', 'pdf')
+TIPOS_DOCUMENTO = ('factura', 'presupuesto')
+
+_SQL_DOCUMENTOS = """
+    SELECT r.id, r.dispositivo, r.estado, r.fecha_entrada, r.precio, r.descripcion,
+           c.nombre AS cliente_nombre, c.telefono AS cliente_telefono,
+           c.email AS cliente_email, c.direccion AS cliente_direccion,
+           ip.nombre AS pieza_nombre, pr.cantidad AS pieza_cantidad,
+           ip.precio_venta AS pieza_precio
+    FROM reparaciones r
+    LEFT JOIN clientes c ON c.id = r.cliente_id
+    LEFT JOIN piezas_reparacion pr ON pr.reparacion_id = r.id
+    LEFT JOIN inventario_piezas ip ON ip.id = pr.pieza_id
+    WHERE {where}
+    ORDER BY r.id, pr.fecha_uso, pr.id
+"""
+
+
+def documentos(conn, where, params):
+    """Datos de presupuesto/factura de las reparaciones que cumplen ``where``.
+
+    Una sola consulta para reparaciones, clientes y piezas; devuelve dicts
+    como los que espera ``pdf_generator.generar_presupuesto_pdf`` (y con
+    los que se calcula la clave de :mod:`utils.pdf_cache`).
+    """
+    filas = conn.execute(_SQL_DOCUMENTOS.format(where=where), params).fetchall()
+    resultado = []
+    for _, grupo in groupby(filas, key=lambda f: f['id']):
+        grupo = list(grupo)
+        r = grupo[0]
+        resultado.append({
+            'id': r['id'],
+            'dispositivo': r['dispositivo'],
+            'estado': r['estado'],
+            'fecha_entrada': r['fecha_entrada'],
+            'precio': r['precio'],
+            'descripcion': r['descripcion'],
+            'cliente_nombre': r['cliente_nombre'],
+            'cliente_telefono': r['cliente_telefono'],
+            'cliente_email': r['cliente_email'],
+            'cliente_direccion': r['cliente_direccion'],
+            # Las piezas borradas del inventario no salen, igual que antes
+            'piezas': [{'nombre': p['pieza_nombre'], 'cantidad': p['pieza_cantidad'],
+                        'precio_venta': p['pieza_precio']}
+                       for p in grupo if p['pieza_nombre'] is not None],
+        })
+    return resultado
+
+
+def filtro_lote(args):
+    """``(where, params)`` a partir de los parametros del formulario.
+
+    ``desde`` y ``hasta`` (AAAA-MM-DD, ambos incluidos) son obligatorios.
+    Con ``estado_pago=Pagado`` (por defecto) el rango se aplica a la fecha
+    de pago, que es la de la factura; si no, a la fecha de entrada.
+    Lanza ``ValueError`` con un mensaje para el usuario.
+    """
+    try:
+        desde = date.fromisoformat(args.get('desde', ''))
+        hasta = date.fromisoformat(args.get('hasta', ''))
+    except ValueError:
+        raise ValueError('Indica las fechas desde y hasta.')
+    if hasta < desde:
+        raise ValueError('La fecha hasta es anterior a la fecha desde.')
+
+    estado_pago = args.get('estado_pago', 'Pagado')
+    campo = 'r.fecha_pago' if estado_pago == 'Pagado' else 'r.fecha_entrada'
+    condiciones = [f'{campo} >= ?', f'{campo} < ?']
+    params = [desde.isoformat(), (hasta + timedelta(days=1)).isoformat()]
+    if estado_pago:
+        condiciones.append('r.estado_pago = ?')
+        params.append(estado_pago)
+    cliente_id = args.get('cliente_id', '')
+    if cliente_id:
+        # isascii: isdigit() acepta "²"; y el id tiene que caber en 64 bits
+        if not (cliente_id.isascii() and cliente_id.isdigit()) or int(cliente_id) >= 2 ** 63:
+            raise ValueError('Cliente no valido.')
+        condiciones.append('r.cliente_id = ?')
+        params.append(int(cliente_id))
+    return ' AND '.join(condiciones), params
+
+
+def documentos_lote(conn, args):
+    """Documentos del filtro; ``ValueError`` si el filtro no vale o hay demasiados."""
+    where, params = filtro_lote(args)
+    docs = documentos(conn, where, params)
+    if len(docs) > MAX_DOCUMENTOS_LOTE:
+        raise ValueError(f'El filtro devuelve {len(docs)} documentos; el maximo por lote '
+                         f'es {MAX_DOCUMENTOS_LOTE}. Acota las fechas o el cliente.')
+    return docs
+
+
+def nombre_documento(doc, tipo_documento):
+    return f"{tipo_documento}_reparacion_{doc['id']}.pdf"
+
+
+def pdfs(docs, tipo_documento, base_url):
+    """``(doc, bytes)`` en orden: de la cache si estan y, si no, generados en paralelo.
+
+    Si falta alguno, el hueco de lote se reserva antes del primer ``yield``
+    (aunque el primer documento este en cache), asi que un
+    :class:`~utils.pdf_pool.PdfNoDisponible` sale en el primer ``next``.
+    """
+    en_cache = [pdf_cache.leer(d, tipo_documento, base_url) for d in docs]
+    faltan = [d for d, pdf in zip(docs, en_cache) if pdf is None]
+    generados = pdf_pool.renderizar_lote('generar_presupuesto_pdf', [
+        ((d,), {'tipo_documento': tipo_documento, 'base_url': base_url}) for d in faltan])
+    try:
+        for d, pdf in zip(docs, en_cache):
+            if pdf is None:
+                pdf = next(generados)
+                pdf_cache.guardar(d, tipo_documento, base_url, pdf)
+            yield d, pdf
+    finally:
+        generados.close()
+
+
+class _Salida:
+    """Destino de ``zipfile`` que acumula lo escrito para enviarlo por trozos."""
+
+    def __init__(self):
+        self._trozos = []
+
+    def write(self, datos):
+        self._trozos.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._trozos)
+        self._trozos.clear()
+        return datos
+
+
+def zip_documentos(docs, tipo_documento, base_url):
+    """Genera el ZIP por trozos: un trozo por documento mas el indice final."""
+    salida = _Salida()
+    # Los PDF ya van comprimidos: se guardan tal cual
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for doc, pdf in pdfs(docs, tipo_documento, base_url):
+            zf.writestr(nombre_documento(doc, tipo_documento), pdf)
+            yield salida.vaciar()
+    yield salida.vaciar()
+
+
+def pdf_combinado(docs, tipo_documento, base_url):
+    """Un unico PDF con todos los documentos (``BytesIO``)."""
+    # Margen de tiempo proporcional al lote: es un solo proceso
+    return pdf_pool.renderizar(
+        'generar_documentos_pdf', docs, tipo_documento=tipo_documento, base_url=base_url,
+        timeout=pdf_pool.PDF_TIMEOUT + 0.5 * len(docs))
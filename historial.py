@@ -78,3 +78,18 @@ def registrar_cambio_estado(conn, reparacion_id, estado_nuevo, usuario=None):
     except Exception as e:
         logger.error(f"Error registrando cambio de estado: {e}")
         return False
+
+
+def cambios_desde(conn, reparacion_id, desde):
+    """State changes of a repair since ``desde`` (epoch seconds), oldest first.
+
+    ``fecha_cambio`` only has second precision, so the bound is lowered by
+    one second to keep a change recorded just before ``desde``.
+    """
+    limite = datetime.fromtimestamp(desde - 1).strftime("%Y-%m-%d %H:%M:%S")
+    return [dict(fila) for fila in conn.execute("""
+        SELECT estado_anterior, estado_nuevo, fecha_cambio
+        FROM reparaciones_historial
+        WHERE reparacion_id = ? AND fecha_cambio >= ?
+        ORDER BY fecha_cambio, id
+    """, (reparacion_id, limite))]
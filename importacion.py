@@ -0,0 +1,473 @@
+"""Importacion masiva de clientes, reparaciones y piezas desde CSV.
+
+Sustituye a dar de alta los datos de un taller existente formulario a
+formulario (``nuevo_cliente``/``nueva_pieza`` hacen un commit por fila).
+El fichero se lee en streaming, cada fila se valida y normaliza y las
+validas se insertan con ``executemany`` en lotes de :data:`LOTE`, todo
+dentro de una unica transaccion: o entra el fichero entero o no entra
+nada.  Las filas que no pasan la validacion no detienen la importacion;
+se devuelven con su numero de linea y el motivo.
+
+Los clientes se deduplican por telefono normalizado (solo digitos, sin
+prefijo 34) y por email en minusculas, tanto contra la BD como dentro
+del propio fichero; las piezas, por nombre.  No se envia ningun email:
+la bienvenida de ``nuevo_cliente`` es solo para las altas manuales.
+
+Se usa desde ``/admin/importar`` y desde ``scripts/importar_csv.py``.
+"""
+
+import csv
+import io
+import re
+import time
+import unicodedata
+from datetime import date, datetime
+
+from busqueda import indexar_nuevas
+from cambios import marcar_nuevas
+from historial import ESTADOS_VALIDOS
+from kpis import recalcular_kpis
+from utils.csv_export import SEPARADOR
+
+# Filas por executemany
+LOTE = 1000
+# Filas iniciales en las que se busca la cabecera (los CSV exportados por
+# la propia aplicacion llevan antes el bloque corporativo y el resumen)
+LINEAS_BUSQUEDA_CABECERA = 60
+TAMANO_MUESTRA = 64 * 1024
+
+ESTADOS_PAGO = ('Pendiente', 'Pagado')
+TIPOS_DOCUMENTO = ('presupuesto', 'factura')
+
+# Tipo -> (etiqueta, {columna: alias aceptados en la cabecera}, obligatorias).
+# Los alias se comparan normalizados (minusculas, sin tildes, ``_`` en lugar
+# de espacios y puntos); incluyen las cabeceras de los CSV exportados.
+TIPOS = {
+    'clientes': ('Clientes', {
+        'nombre': ('nombre', 'cliente', 'nombre_completo'),
+        'telefono': ('telefono', 'tel', 'movil', 'telefono_movil'),
+        'email': ('email', 'correo', 'e_mail', 'correo_electronico'),
+        'direccion': ('direccion', 'domicilio'),
+    }, ('nombre',)),
+    'reparaciones': ('Reparaciones', {
+        'cliente_id': ('cliente_id', 'n_cliente', 'id_cliente'),
+        'cliente': ('cliente', 'nombre_cliente'),
+        'telefono': ('telefono', 'tel', 'movil'),
+        'email': ('email', 'correo', 'e_mail'),
+        'dispositivo': ('dispositivo', 'equipo', 'modelo'),
+        'descripcion': ('descripcion', 'averia', 'problema'),
+        'estado': ('estado',),
+        'precio': ('precio', 'importe'),
+        'tipo_documento': ('tipo_documento',),
+        'estado_pago': ('estado_pago', 'pago'),
+        'fecha_entrada': ('fecha_entrada', 'entrada', 'fecha'),
+        'fecha_salida': ('fecha_salida', 'salida'),
+        'fecha_pago': ('fecha_pago',),
+        'metodo_pago': ('metodo_pago',),
+    }, ('dispositivo',)),
+    'piezas': ('Inventario de piezas', {
+        'nombre': ('nombre', 'pieza', 'articulo'),
+        'categoria': ('categoria',),
+        'descripcion': ('descripcion',),
+        'cantidad': ('cantidad', 'stock', 'unidades'),
+        'cantidad_minima': ('cantidad_minima', 'stock_minimo', 'minimo'),
+        'precio_coste': ('precio_coste', 'coste'),
+        'precio_venta': ('precio_venta', 'pvp', 'precio'),
+        'proveedor': ('proveedor',),
+        'ubicacion': ('ubicacion',),
+    }, ('nombre',)),
+}
+
+_TABLAS = {'clientes': 'clientes', 'reparaciones': 'reparaciones', 'piezas': 'inventario_piezas'}
+
+_SQL_INSERT = {
+    'clientes': "INSERT INTO clientes (nombre, telefono, email, direccion) VALUES (?, ?, ?, ?)",
+    'reparaciones': """
+        INSERT INTO reparaciones (cliente_id, dispositivo, descripcion, estado, fecha_entrada,
+                                  fecha_salida, precio, tipo_documento, estado_pago, fecha_pago,
+                                  metodo_pago)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    'piezas': """
+        INSERT INTO inventario_piezas (nombre, categoria, descripcion, cantidad, cantidad_minima,
+                                       precio_coste, precio_venta, proveedor, ubicacion,
+                                       fecha_actualizacion)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+}
+
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class FilaInvalida(ValueError):
+    """Una fila del CSV que no se puede importar (motivo en el mensaje)."""
+
+
+# =========================================
+#  Normalizacion de valores
+# =========================================
+
+def normalizar_cabecera(texto):
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '_', texto.strip().lower()).strip('_')
+
+
+def normalizar_telefono(telefono):
+    """Solo digitos y sin prefijo de pais: '+34 633-234-395' -> '633234395'."""
+    digitos = re.sub(r'\D', '', telefono or '')
+    if len(digitos) == 13 and digitos.startswith('0034'):
+        digitos = digitos[4:]
+    elif len(digitos) == 11 and digitos.startswith('34'):
+        digitos = digitos[2:]
+    return digitos or None
+
+
+def normalizar_email(email):
+    email = (email or '').strip().lower()
+    return email or None
+
+
+def _texto(valor):
+    valor = (valor or '').strip()
+    return valor or None
+
+
+def _entero(valor, campo, defecto):
+    valor = (valor or '').strip()
+    if not valor:
+        return defecto
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise FilaInvalida(f'{campo} no es un numero entero: "{valor}"')
+    if numero < 0:
+        raise FilaInvalida(f'{campo} no puede ser negativo')
+    return numero
+
+
+def _importe(valor, campo):
+    """Acepta '89.99', '89,99', '89,99 €' y '1.234,56'."""
+    valor = (valor or '').replace('€', '').replace(' ', '').strip()
+    if not valor:
+        return None
+    if ',' in valor:
+        valor = valor.replace('.', '').replace(',', '.')
+    try:
+        numero = float(valor)
+    except ValueError:
+        raise FilaInvalida(f'{campo} no es un importe valido: "{valor}"')
+    if numero < 0:
+        raise FilaInvalida(f'{campo} no puede ser negativo')
+    return round(numero, 2)
+
+
+def _fecha(valor, campo):
+    """'15/04/2026' o ISO ('2026-04-15', '2026-04-15 20:35:44') -> texto ISO."""
+    valor = (valor or '').strip()
+    if not valor:
+        return None
+    if len(valor) == 10 and valor[2] == '/' and valor[5] == '/':
+        valor = f'{valor[6:]}-{valor[3:5]}-{valor[:2]}'
+    try:
+        if len(valor) == 10:
+            return date.fromisoformat(valor).isoformat()
+        return datetime.fromisoformat(valor).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        raise FilaInvalida(f'{campo} no es una fecha valida: "{valor}"')
+
+
+def _opcion(valor, campo, opciones, defecto):
+    valor = (valor or '').strip()
+    if not valor:
+        return defecto
+    for opcion in opciones:
+        if valor.lower() == opcion.lower():
+            return opcion
+    raise FilaInvalida(f'{campo} "{valor}" no es valido ({", ".join(opciones)})')
+
+
+# =========================================
+#  Lectura del CSV
+# =========================================
+
+def _abrir_csv(fichero):
+    """Detecta el delimitador sobre una muestra sin perder el streaming."""
+    muestra = fichero.read(TAMANO_MUESTRA)
+    muestra += fichero.readline()
+    if muestra.startswith('\ufeff'):
+        muestra = muestra[1:]
+    try:
+        delimitador = csv.Sniffer().sniff(muestra, delimiters=';,\t').delimiter
+    except csv.Error:
+        delimitador = ';' if muestra.count(';') >= muestra.count(',') else ','
+
+    def lineas():
+        yield from io.StringIO(muestra, newline='')
+        yield from fichero
+
+    return csv.reader(lineas(), delimiter=delimitador)
+
+
+def _mapear_cabecera(fila, aliases):
+    """{columna: posicion} si la fila es una cabecera reconocible."""
+    normalizada = [normalizar_cabecera(c) for c in fila]
+    posiciones = {}
+    for columna, nombres in aliases.items():
+        for nombre in nombres:
+            if nombre in normalizada and normalizada.index(nombre) not in posiciones.values():
+                posiciones[columna] = normalizada.index(nombre)
+                break
+    return posiciones
+
+
+def _leer_filas(fichero, tipo):
+    """Genera ``(linea, {columna: valor})`` a partir de la cabecera."""
+    _, aliases, obligatorias = TIPOS[tipo]
+    lector = _abrir_csv(fichero)
+    posiciones = None
+    for fila in lector:
+        if lector.line_num > LINEAS_BUSQUEDA_CABECERA:
+            break
+        candidata = _mapear_cabecera(fila, aliases)
+        if all(c in candidata for c in obligatorias):
+            posiciones = candidata
+            break
+    if posiciones is None:
+        raise ValueError(
+            f'No se encuentra la cabecera del CSV; debe incluir al menos: {", ".join(obligatorias)}')
+
+    for fila in lector:
+        if not any(c.strip() for c in fila):
+            continue
+        if fila[0] == SEPARADOR:
+            break   # pie de un CSV exportado por la aplicacion
+        yield lector.line_num, {c: (fila[i] if i < len(fila) else '') for c, i in posiciones.items()}
+
+
+# =========================================
+#  Validacion por tipo
+# =========================================
+
+class _Clientes:
+    def __init__(self, conn):
+        self.telefonos = {}
+        self.emails = {}
+        for id_, telefono, email in conn.execute("SELECT id, telefono, email FROM clientes"):
+            telefono, email = normalizar_telefono(telefono), normalizar_email(email)
+            if telefono:
+                self.telefonos.setdefault(telefono, f'cliente #{id_}')
+            if email:
+                self.emails.setdefault(email, f'cliente #{id_}')
+
+    def fila(self, linea, v):
+        nombre = _texto(v.get('nombre'))
+        if not nombre:
+            raise FilaInvalida('Falta el nombre')
+        telefono = _texto(v.get('telefono'))
+        email = normalizar_email(v.get('email'))
+        if email and not _EMAIL.match(email):
+            raise FilaInvalida(f'Email no valido: "{email}"')
+
+        tel_norm = normalizar_telefono(telefono)
+        if tel_norm and tel_norm in self.telefonos:
+            return None, f'Duplicado por telefono de {self.telefonos[tel_norm]}'
+        if email and email in self.emails:
+            return None, f'Duplicado por email de {self.emails[email]}'
+        if tel_norm:
+            self.telefonos[tel_norm] = f'la linea {linea}'
+        if email:
+            self.emails[email] = f'la linea {linea}'
+        return (nombre, telefono, email, _texto(v.get('direccion'))), None
+
+
+class _Reparaciones:
+    def __init__(self, conn):
+        self.ids = set()
+        self.telefonos = {}
+        self.emails = {}
+        self.nombres = {}
+        for id_, nombre, telefono, email in conn.execute(
+                "SELECT id, nombre, telefono, email FROM clientes"):
+            self.ids.add(id_)
+            for indice, clave in ((self.telefonos, normalizar_telefono(telefono)),
+                                  (self.emails, normalizar_email(email)),
+                                  (self.nombres, (nombre or '').strip().lower() or None)):
+                if clave:
+                    # None marca una clave compartida por varios clientes
+                    indice[clave] = None if clave in indice else id_
+        self.hoy = date.today().isoformat()
+
+    def _cliente(self, v):
+        cliente_id = (v.get('cliente_id') or '').strip()
+        if cliente_id:
+            if not (cliente_id.isascii() and cliente_id.isdigit()) or int(cliente_id) not in self.ids:
+                raise FilaInvalida(f'No existe el cliente #{cliente_id}')
+            return int(cliente_id)
+        for indice, clave, campo in (
+                (self.telefonos, normalizar_telefono(v.get('telefono')), 'telefono'),
+                (self.emails, normalizar_email(v.get('email')), 'email'),
+                (self.nombres, (v.get('cliente') or '').strip().lower(), 'nombre')):
+            if clave and clave in indice:
+                if indice[clave] is None:
+                    raise FilaInvalida(f'Hay varios clientes con ese {campo}')
+                return indice[clave]
+        raise FilaInvalida('No se encuentra el cliente (por id, telefono, email o nombre)')
+
+    def fila(self, linea, v):
+        dispositivo = _texto(v.get('dispositivo'))
+        if not dispositivo:
+            raise FilaInvalida('Falta el dispositivo')
+        estado_pago = _opcion(v.get('estado_pago'), 'Estado de pago', ESTADOS_PAGO, 'Pendiente')
+        return (
+            self._cliente(v),
+            dispositivo,
+            _texto(v.get('descripcion')),
+            _opcion(v.get('estado'), 'Estado', ESTADOS_VALIDOS, 'Pendiente'),
+            _fecha(v.get('fecha_entrada'), 'Fecha de entrada') or self.hoy,
+            _fecha(v.get('fecha_salida'), 'Fecha de salida'),
+            _importe(v.get('precio'), 'Precio'),
+            _opcion(v.get('tipo_documento'), 'Tipo de documento', TIPOS_DOCUMENTO, 'presupuesto'),
+            estado_pago,
+            _fecha(v.get('fecha_pago'), 'Fecha de pago'),
+            _texto(v.get('metodo_pago')),
+        ), None
+
+
+class _Piezas:
+    def __init__(self, conn):
+        self.nombres = {
+            (nombre or '').strip().lower(): f'pieza #{id_}'
+            for id_, nombre in conn.execute("SELECT id, nombre FROM inventario_piezas")
+        }
+        self.ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def fila(self, linea, v):
+        nombre = _texto(v.get('nombre'))
+        if not nombre:
+            raise FilaInvalida('Falta el nombre')
+        clave = nombre.lower()
+        if clave in self.nombres:
+            return None, f'Duplicado por nombre de {self.nombres[clave]}'
+        fila = (
+            nombre,
+            _texto(v.get('categoria')) or 'General',
+            _texto(v.get('descripcion')) or '',
+            _entero(v.get('cantidad'), 'Cantidad', 0),
+            _entero(v.get('cantidad_minima'), 'Cantidad minima', 5),
+            _importe(v.get('precio_coste'), 'Precio de coste') or 0,
+            _importe(v.get('precio_venta'), 'Precio de venta') or 0,
+            _texto(v.get('proveedor')) or '',
+            _texto(v.get('ubicacion')) or '',
+            self.ahora,
+        )
+        self.nombres[clave] = f'la linea {linea}'
+        return fila, None
+
+
+_VALIDADORES = {'clientes': _Clientes, 'reparaciones': _Reparaciones, 'piezas': _Piezas}
+
+
+# =========================================
+#  Triggers durante la carga
+# =========================================
+
+# Familias de triggers que se saben rehacer en bloque tras la carga
+_FAMILIAS_TRIGGERS = ('fts_', 'kpi_', 'version_', 'cambios_')
+
+
+def _suspender_triggers(conn, tabla):
+    """Quita los triggers de ``tabla`` y devuelve sus definiciones.
+
+    Mantenerlos fila a fila (FTS, contadores, version de cache, rowversion)
+    cuesta varias veces mas que el propio INSERT.  Como todo ocurre en la
+    transaccion de la importacion, nadie ve la tabla sin ellos.  Si hay
+    algun trigger de una familia desconocida no se toca nada (None).
+    """
+    triggers = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (tabla,)
+    ).fetchall()
+    if not all(nombre.startswith(_FAMILIAS_TRIGGERS) for nombre, _ in triggers):
+        return None
+    for nombre, _ in triggers:
+        conn.execute(f"DROP TRIGGER {nombre}")
+    return triggers
+
+
+def _restaurar_triggers(conn, tabla, triggers, desde_id):
+    """Hace en bloque lo que los triggers habrian hecho y los vuelve a crear."""
+    familias = {f for f in _FAMILIAS_TRIGGERS for nombre, _ in triggers if nombre.startswith(f)}
+    if 'fts_' in familias:
+        indexar_nuevas(conn, tabla, desde_id)
+    if 'kpi_' in familias:
+        recalcular_kpis(conn)
+    if 'version_' in familias:
+        conn.execute("UPDATE version_datos SET version = version + 1 WHERE id = 1")
+    if 'cambios_' in familias:
+        marcar_nuevas(conn, tabla, desde_id)
+    for _, sql in triggers:
+        conn.execute(sql)
+
+
+# =========================================
+#  Importacion
+# =========================================
+
+def importar(conn, tipo, fichero, simular=False, lote=LOTE):
+    """Importa el CSV ``fichero`` (texto) de ``tipo`` (ver :data:`TIPOS`).
+
+    Todo ocurre en una transaccion ``BEGIN IMMEDIATE``; con ``simular`` se
+    valida e inserta igual pero se deshace al final.  Los triggers de la
+    tabla se sustituyen por su equivalente en bloque (ver
+    :func:`_suspender_triggers`).  Un error de lectura
+    del fichero (cabecera irreconocible, codificacion) lanza ``ValueError``
+    y no deja nada escrito.
+
+    Devuelve un dict con ``leidas``, ``insertadas``, ``duplicadas``,
+    ``rechazadas`` (lista de ``(linea, motivo)``, duplicados incluidos),
+    ``simulacion`` y ``segundos``.
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f'Tipo de importacion desconocido: {tipo}')
+    inicio = time.perf_counter()
+    resultado = {'tipo': tipo, 'leidas': 0, 'insertadas': 0, 'duplicadas': 0,
+                 'rechazadas': [], 'simulacion': simular}
+    tabla, sql = _TABLAS[tipo], _SQL_INSERT[tipo]
+    pendientes = []
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        validador = _VALIDADORES[tipo](conn)
+        desde_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}").fetchone()[0]
+        triggers = _suspender_triggers(conn, tabla)
+        for linea, valores in _leer_filas(fichero, tipo):
+            resultado['leidas'] += 1
+            try:
+                fila, duplicado = validador.fila(linea, valores)
+            except FilaInvalida as e:
+                resultado['rechazadas'].append((linea, str(e)))
+                continue
+            if duplicado:
+                resultado['duplicadas'] += 1
+                resultado['rechazadas'].append((linea, duplicado))
+                continue
+            pendientes.append(fila)
+            if len(pendientes) >= lote:
+                conn.executemany(sql, pendientes)
+                resultado['insertadas'] += len(pendientes)
+                pendientes.clear()
+        if pendientes:
+            conn.executemany(sql, pendientes)
+            resultado['insertadas'] += len(pendientes)
+        if triggers is not None:
+            _restaurar_triggers(conn, tabla, triggers, desde_id)
+
+        if simular:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    resultado['segundos'] = round(time.perf_counter() - inicio, 2)
+    return resultado
@@ -0,0 +1,107 @@
+"""Contadores de KPIs mantenidos de forma incremental.
+
+La tabla ``kpi_counters`` tiene una unica fila (``id = 1``) con los
+totales que muestran el dashboard, la portada y el historial de clientes.
+Los triggers sobre ``reparaciones`` y ``clientes`` la actualizan dentro de
+la misma transaccion que cada INSERT/UPDATE/DELETE, asi que leer las
+cifras es una busqueda por clave primaria en vez de recorrer la tabla.
+
+Los importes se acumulan en centimos (INTEGER) para que sumar y restar
+en cada cambio no arrastre errores de redondeo de REAL.
+"""
+
+import logging
+
+logger = logging.getLogger("androtech")
+
+ESTADOS_TERMINADOS = ('Terminado', 'Entregado')
+
+# Columna de kpi_counters -> aportacion de una fila de reparaciones.
+# ``{r}`` se sustituye por la tabla al recalcular.  Los triggers de la
+# migracion v005 tienen copiadas estas expresiones con NEW/OLD: si cambian,
+# hace falta una migracion nueva que rehaga los triggers.
+_CENTIMOS = "CAST(ROUND({r}.precio * 100) AS INTEGER)"
+CONTRIBUCIONES = {
+    'total_reparaciones': "1",
+    'n_pendiente': "CASE WHEN {r}.estado = 'Pendiente' THEN 1 ELSE 0 END",
+    'n_en_proceso': "CASE WHEN {r}.estado = 'En proceso' THEN 1 ELSE 0 END",
+    'n_terminado': "CASE WHEN {r}.estado = 'Terminado' THEN 1 ELSE 0 END",
+    'n_entregado': "CASE WHEN {r}.estado = 'Entregado' THEN 1 ELSE 0 END",
+    'n_otro_estado': "CASE WHEN {r}.estado NOT IN ('Pendiente', 'En proceso', 'Terminado', 'Entregado') THEN 1 ELSE 0 END",
+    'n_pagado': "CASE WHEN {r}.estado_pago = 'Pagado' THEN 1 ELSE 0 END",
+    'n_no_pagado': "CASE WHEN {r}.estado_pago != 'Pagado' THEN 1 ELSE 0 END",
+    'n_pendiente_cobro': "CASE WHEN {r}.estado_pago = 'Pendiente' AND {r}.precio > 0 THEN 1 ELSE 0 END",
+    'n_con_precio': "CASE WHEN {r}.precio IS NOT NULL THEN 1 ELSE 0 END",
+    'centimos_total': f"COALESCE({_CENTIMOS}, 0)",
+    'centimos_terminadas': f"CASE WHEN {{r}}.estado IN ('Terminado', 'Entregado') THEN COALESCE({_CENTIMOS}, 0) ELSE 0 END",
+    'centimos_cobrado': f"CASE WHEN {{r}}.estado_pago = 'Pagado' THEN COALESCE({_CENTIMOS}, 0) ELSE 0 END",
+}
+
+
+def recalcular_kpis(conn):
+    """Recalcula la fila de contadores recorriendo las tablas.
+
+    Se usa al crear la tabla (backfill) y como reparacion manual si alguna
+    vez se cargan datos saltandose los triggers.
+    """
+    agregados = ",\n               ".join(
+        f"COALESCE(SUM({expr.format(r='reparaciones')}), 0)" for expr in CONTRIBUCIONES.values()
+    )
+    valores = conn.execute(f"SELECT {agregados} FROM reparaciones").fetchone()
+    total_clientes = conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
+    asignaciones = ", ".join(f"{col} = ?" for col in CONTRIBUCIONES)
+    conn.execute(
+        f"UPDATE kpi_counters SET total_clientes = ?, {asignaciones} WHERE id = 1",
+        (total_clientes, *valores),
+    )
+
+
+def obtener_kpis(conn):
+    """Cifras de cabecera a partir de la fila de ``kpi_counters``.
+
+    Devuelve un dict con conteos por estado y por estado de pago y los
+    importes en euros (float redondeado a 2 decimales).
+    """
+    fila = conn.execute("SELECT * FROM kpi_counters WHERE id = 1").fetchone()
+    return kpis_desde_fila(fila)
+
+
+def kpis_desde_fila(fila):
+    """Convierte una fila de ``kpi_counters`` (o None) en el dict de KPIs.
+
+    Separado de :func:`obtener_kpis` para las consultas que leen la fila
+    junto con otros agregados (ver :mod:`dashboard`).
+    """
+    if fila is None:
+        logger.warning("kpi_counters vacia: ¿falta aplicar migraciones?")
+        k = dict.fromkeys(['total_clientes', *CONTRIBUCIONES], 0)
+    else:
+        k = {col: fila[col] for col in ['total_clientes', *CONTRIBUCIONES]}
+
+    terminadas = k['n_terminado'] + k['n_entregado']
+    ingresos_total = k['centimos_total'] / 100
+    cobrado = k['centimos_cobrado'] / 100
+    por_estado = {
+        'Pendiente': k['n_pendiente'],
+        'En proceso': k['n_en_proceso'],
+        'Terminado': k['n_terminado'],
+        'Entregado': k['n_entregado'],
+    }
+    if k['n_otro_estado']:
+        por_estado['Otros'] = k['n_otro_estado']
+
+    return {
+        'total_clientes': k['total_clientes'],
+        'total_reparaciones': k['total_reparaciones'],
+        'por_estado': por_estado,
+        'activas': k['n_pendiente'] + k['n_en_proceso'] + k['n_otro_estado'],
+        'terminadas': terminadas,
+        'pagadas': k['n_pagado'],
+        'no_pagadas': k['n_no_pagado'],
+        'pendientes_cobro': k['n_pendiente_cobro'],
+        'ingresos_total': round(ingresos_total, 2),
+        'ingresos_terminadas': round(k['centimos_terminadas'] / 100, 2),
+        'cobrado': round(cobrado, 2),
+        'por_cobrar': round(ingresos_total - cobrado, 2),
+        'promedio_precio': round(ingresos_total / k['n_con_precio'], 2) if k['n_con_precio'] else 0,
+    }
@@ -0,0 +1,102 @@
+"""Motor de migraciones versionadas del esquema SQLite.
+
+Cada fichero ``vNNN_descripcion.py`` de este paquete es una migracion con
+una funcion ``upgrade(conn)`` y una constante ``DESCRIPCION``.  Las
+migraciones se aplican en orden numerico y la version alcanzada queda
+registrada en la tabla ``schema_version``.
+
+Se ejecutan una sola vez por despliegue con ``python -m migrations`` (ver
+Procfile), de modo que los workers de gunicorn arrancan sin hacer DDL.
+"""
+
+import importlib
+import logging
+import pkgutil
+import re
+from datetime import datetime
+
+logger = logging.getLogger("androtech")
+
+_PATRON = re.compile(r"^v(\d{3,})_\w+$")
+
+
+def descubrir_migraciones():
+    """Devuelve la lista ordenada de ``(version, modulo)`` del paquete."""
+    encontradas = []
+    for info in pkgutil.iter_modules(__path__):
+        m = _PATRON.match(info.name)
+        if not m:
+            continue
+        modulo = importlib.import_module(f"{__name__}.{info.name}")
+        encontradas.append((int(m.group(1)), modulo))
+    encontradas.sort(key=lambda par: par[0])
+    versiones = [v for v, _ in encontradas]
+    if len(versiones) != len(set(versiones)):
+        raise RuntimeError("Hay dos migraciones con el mismo numero de version")
+    return encontradas
+
+
+def version_actual(conn):
+    """Ultima version aplicada (0 si la BD no tiene ``schema_version``)."""
+    existe = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_version'"
+    ).fetchone()
+    if not existe:
+        return 0
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migraciones_pendientes(conn):
+    """Versiones que aun no se han aplicado. Solo lectura, sin DDL."""
+    actual = version_actual(conn)
+    return [v for v, _ in descubrir_migraciones() if v > actual]
+
+
+def aplicar_migraciones(conn, hasta=None):
+    """Aplica en orden las migraciones pendientes.
+
+    Cada migracion corre en su propia transaccion ``BEGIN IMMEDIATE``: si
+    dos procesos lanzan el comando a la vez, el segundo espera al primero
+    y despues ve la version ya registrada.  Devuelve la lista de versiones
+    aplicadas.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            descripcion TEXT NOT NULL,
+            aplicada_en TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+
+    aplicadas = []
+    for version, modulo in descubrir_migraciones():
+        if hasta is not None and version > hasta:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ya = conn.execute(
+                "SELECT 1 FROM schema_version WHERE version = ?", (version,)
+            ).fetchone()
+            if ya:
+                conn.rollback()
+                continue
+            modulo.upgrade(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, descripcion, aplicada_en) VALUES (?, ?, ?)",
+                (version, modulo.DESCRIPCION, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"Error aplicando migracion {version:03d} ({modulo.DESCRIPCION})")
+            raise
+        logger.info(f"Migracion {version:03d} aplicada: {modulo.DESCRIPCION}")
+        aplicadas.append(version)
+    return aplicadas
+
+
+def columna_existe(conn, tabla, columna):
+    """Helper para migraciones que anaden columnas de forma idempotente."""
+    return any(r[1] == columna for r in conn.execute(f"PRAGMA table_info({tabla})"))
@@ -0,0 +1,48 @@
+"""CLI: ``python -m migrations [--estado] [--hasta N]``.
+
+Aplica las migraciones pendientes sobre la BD indicada en DATABASE_PATH.
+Pensado para ejecutarse una vez por despliegue, antes de arrancar gunicorn.
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from db import get_db, DB_PATH  # noqa: E402  (tras cargar .env)
+from migrations import aplicar_migraciones, migraciones_pendientes, version_actual  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migraciones del esquema de AndroTech")
+    parser.add_argument("--estado", action="store_true",
+                        help="muestra la version actual y las pendientes sin aplicar nada")
+    parser.add_argument("--hasta", type=int, default=None,
+                        help="aplica solo hasta esta version (incluida)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = get_db()
+    try:
+        if args.estado:
+            print(f"BD: {DB_PATH}")
+            print(f"Version actual: {version_actual(conn)}")
+            pendientes = migraciones_pendientes(conn)
+            print(f"Pendientes: {', '.join(str(v) for v in pendientes) or 'ninguna'}")
+            return 0
+        aplicadas = aplicar_migraciones(conn, hasta=args.hasta)
+        if aplicadas:
+            print(f"Migraciones aplicadas: {', '.join(str(v) for v in aplicadas)}")
+        else:
+            print("Esquema al dia, nada que aplicar.")
+        print(f"Version actual: {version_actual(conn)}")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
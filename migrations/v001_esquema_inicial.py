@@ -0,0 +1,186 @@
+"""Esquema base: todas las tablas que la aplicacion necesita.
+
+Reune el DDL que antes estaba repartido entre scripts/create_db.py, el
+arranque de app.py, audit.crear_tabla_auditoria y auth.init_permisos_db.
+Usa IF NOT EXISTS para poder aplicarse sobre BDs ya existentes.
+"""
+
+from auth import PERMISOS_ADMIN, PERMISOS_TECNICO
+
+DESCRIPCION = "Esquema inicial (clientes, reparaciones, auditoria, inventario, roles)"
+
+_TABLAS = [
+    """
+    CREATE TABLE IF NOT EXISTS clientes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        telefono TEXT,
+        email TEXT,
+        direccion TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reparaciones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cliente_id INTEGER,
+        dispositivo TEXT NOT NULL,
+        descripcion TEXT,
+        estado TEXT DEFAULT 'Pendiente',
+        fecha_entrada TEXT,
+        fecha_salida TEXT,
+        precio REAL,
+        tipo_documento TEXT DEFAULT 'presupuesto',
+        estado_pago TEXT DEFAULT 'Pendiente',
+        fecha_pago TEXT,
+        metodo_pago TEXT,
+        FOREIGN KEY (cliente_id) REFERENCES clientes(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario TEXT NOT NULL UNIQUE,
+        contraseña TEXT NOT NULL,
+        rol TEXT DEFAULT 'tecnico'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reparaciones_historial (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reparacion_id INTEGER NOT NULL,
+        estado_anterior TEXT,
+        estado_nuevo TEXT NOT NULL,
+        fecha_cambio TEXT NOT NULL,
+        usuario TEXT,
+        FOREIGN KEY (reparacion_id) REFERENCES reparaciones(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event_type TEXT NOT NULL,
+        usuario TEXT,
+        evento_datos TEXT,
+        ip_address TEXT,
+        timestamp TEXT NOT NULL,
+        UNIQUE(event_type, usuario, timestamp)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fotos_reparacion (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reparacion_id INTEGER NOT NULL,
+        filename TEXT NOT NULL,
+        descripcion TEXT,
+        fecha_subida TEXT NOT NULL,
+        subido_por TEXT,
+        FOREIGN KEY (reparacion_id) REFERENCES reparaciones(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS notas_reparacion (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reparacion_id INTEGER NOT NULL,
+        usuario TEXT NOT NULL,
+        contenido TEXT NOT NULL,
+        fecha_creacion TEXT NOT NULL,
+        es_importante INTEGER DEFAULT 0,
+        FOREIGN KEY (reparacion_id) REFERENCES reparaciones(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inventario_piezas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        categoria TEXT DEFAULT 'General',
+        descripcion TEXT,
+        cantidad INTEGER DEFAULT 0,
+        cantidad_minima INTEGER DEFAULT 5,
+        precio_coste REAL DEFAULT 0,
+        precio_venta REAL DEFAULT 0,
+        proveedor TEXT,
+        ubicacion TEXT,
+        fecha_actualizacion TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS piezas_reparacion (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reparacion_id INTEGER NOT NULL,
+        pieza_id INTEGER NOT NULL,
+        cantidad INTEGER DEFAULT 1,
+        fecha_uso TEXT NOT NULL,
+        usuario TEXT,
+        FOREIGN KEY (reparacion_id) REFERENCES reparaciones(id),
+        FOREIGN KEY (pieza_id) REFERENCES inventario_piezas(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS solicitudes_reparacion (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        telefono TEXT NOT NULL,
+        email TEXT,
+        dispositivo TEXT NOT NULL,
+        marca TEXT,
+        modelo TEXT,
+        descripcion TEXT NOT NULL,
+        urgencia TEXT DEFAULT 'normal',
+        fecha_preferida TEXT,
+        horario_preferido TEXT,
+        estado TEXT DEFAULT 'pendiente',
+        notas_admin TEXT,
+        fecha_solicitud TEXT NOT NULL,
+        fecha_gestion TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS roles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT UNIQUE NOT NULL,
+        descripcion TEXT,
+        es_sistema INTEGER DEFAULT 0,
+        color TEXT DEFAULT '#6c757d'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS permisos_rol (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        rol_nombre TEXT NOT NULL,
+        permiso TEXT NOT NULL,
+        UNIQUE(rol_nombre, permiso)
+    )
+    """,
+]
+
+_INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_historial_reparacion ON reparaciones_historial(reparacion_id, fecha_cambio DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON audit_log(timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_event_type ON audit_log(event_type)",
+]
+
+_ROLES_BASE = [
+    ('admin', 'Acceso completo al sistema. No se puede eliminar.', '#dc3545', PERMISOS_ADMIN),
+    ('tecnico', 'Acceso a reparaciones, clientes y herramientas basicas.', '#2B8AC4', PERMISOS_TECNICO),
+]
+
+
+def upgrade(conn):
+    for ddl in _TABLAS:
+        conn.execute(ddl)
+    for ddl in _INDICES:
+        conn.execute(ddl)
+
+    # Roles del sistema (solo si no existen: no pisamos permisos editados)
+    for nombre, descripcion, color, permisos in _ROLES_BASE:
+        existe = conn.execute("SELECT 1 FROM roles WHERE nombre = ?", (nombre,)).fetchone()
+        if existe:
+            continue
+        conn.execute(
+            "INSERT INTO roles (nombre, descripcion, es_sistema, color) VALUES (?, ?, 1, ?)",
+            (nombre, descripcion, color)
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO permisos_rol (rol_nombre, permiso) VALUES (?, ?)",
+            [(nombre, p) for p in permisos]
+        )
@@ -0,0 +1,14 @@
+"""Columna ``firma`` en reparaciones (firma digital del cliente).
+
+Sustituye al ``ALTER TABLE ... ADD COLUMN firma`` con try/except que se
+ejecutaba en cada arranque de app.py.
+"""
+
+from migrations import columna_existe
+
+DESCRIPCION = "Columna firma en reparaciones"
+
+
+def upgrade(conn):
+    if not columna_existe(conn, "reparaciones", "firma"):
+        conn.execute("ALTER TABLE reparaciones ADD COLUMN firma TEXT")
@@ -0,0 +1,21 @@
+"""Indices para los predicados de las consultas mas frecuentes.
+
+Listados y filtros de reparaciones (cliente, estado, fecha de entrada) y
+los detalles por reparacion (fotos, notas, piezas usadas).
+"""
+
+DESCRIPCION = "Indices de consultas frecuentes"
+
+_INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_reparaciones_cliente ON reparaciones(cliente_id)",
+    "CREATE INDEX IF NOT EXISTS idx_reparaciones_estado ON reparaciones(estado)",
+    "CREATE INDEX IF NOT EXISTS idx_reparaciones_fecha_entrada ON reparaciones(fecha_entrada)",
+    "CREATE INDEX IF NOT EXISTS idx_fotos_reparacion ON fotos_reparacion(reparacion_id)",
+    "CREATE INDEX IF NOT EXISTS idx_notas_reparacion ON notas_reparacion(reparacion_id)",
+    "CREATE INDEX IF NOT EXISTS idx_piezas_reparacion ON piezas_reparacion(reparacion_id)",
+]
+
+
+def upgrade(conn):
+    for ddl in _INDICES:
+        conn.execute(ddl)
@@ -0,0 +1,46 @@
+"""Indices detectados por scripts/index_advisor.py sobre una BD sintetica.
+
+Los indices simples de cliente, estado y detalles por reparacion se
+sustituyen por compuestos que tambien sirven el ORDER BY (el prefijo cubre
+las consultas que solo filtran).  Se anaden los de estado de pago, rango de
+precio, email normalizado, nombre de cliente y tecnico del historial.
+"""
+
+DESCRIPCION = "Indices compuestos segun EXPLAIN QUERY PLAN"
+
+_SUSTITUIDOS = [
+    "idx_reparaciones_cliente",
+    "idx_reparaciones_estado",
+    "idx_historial_reparacion",
+    "idx_fotos_reparacion",
+    "idx_notas_reparacion",
+    "idx_piezas_reparacion",
+]
+
+_INDICES = [
+    # Historial/listados por cliente y por estado, ordenados por fecha de entrada
+    "CREATE INDEX IF NOT EXISTS idx_reparaciones_cliente_fecha ON reparaciones(cliente_id, fecha_entrada)",
+    "CREATE INDEX IF NOT EXISTS idx_reparaciones_estado_fecha ON reparaciones(estado, fecha_entrada)",
+    # Filtro de pendientes de cobro y KPIs de facturacion
+    "CREATE INDEX IF NOT EXISTS idx_reparaciones_pago ON reparaciones(estado_pago, precio)",
+    "CREATE INDEX IF NOT EXISTS idx_reparaciones_precio ON reparaciones(precio)",
+    # Ultimo cambio de estado por reparacion y contador de intervenciones por tecnico
+    "CREATE INDEX IF NOT EXISTS idx_historial_reparacion_fecha ON reparaciones_historial(reparacion_id, fecha_cambio)",
+    "CREATE INDEX IF NOT EXISTS idx_historial_usuario ON reparaciones_historial(usuario)",
+    # Portal del cliente (busqueda por email sin distinguir mayusculas) y selectores
+    "CREATE INDEX IF NOT EXISTS idx_clientes_email_lower ON clientes(LOWER(email))",
+    "CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes(nombre)",
+    "CREATE INDEX IF NOT EXISTS idx_fotos_reparacion_fecha ON fotos_reparacion(reparacion_id, fecha_subida)",
+    "CREATE INDEX IF NOT EXISTS idx_notas_reparacion_fecha ON notas_reparacion(reparacion_id, fecha_creacion)",
+    "CREATE INDEX IF NOT EXISTS idx_piezas_reparacion_fecha ON piezas_reparacion(reparacion_id, fecha_uso)",
+    "CREATE INDEX IF NOT EXISTS idx_solicitudes_estado_fecha ON solicitudes_reparacion(estado, fecha_solicitud)",
+]
+
+
+def upgrade(conn):
+    for ddl in _INDICES:
+        conn.execute(ddl)
+    for nombre in _SUSTITUIDOS:
+        conn.execute(f"DROP INDEX IF EXISTS {nombre}")
+    # Estadisticas para que el planificador elija los indices nuevos
+    conn.execute("ANALYZE")
@@ -0,0 +1,145 @@
+"""Tabla ``kpi_counters`` con los totales del dashboard, mantenida por triggers.
+
+Crea la fila unica, los triggers sobre reparaciones y clientes y la
+rellena con los datos existentes (ver :mod:`kpis`).  El SQL es una copia
+fija del que generaba :mod:`kpis` al crear la migracion, para que cambiar
+ese modulo no cambie lo que hace esta migracion.
+"""
+
+DESCRIPCION = "Contadores de KPIs incrementales"
+
+_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS kpi_counters (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_clientes INTEGER NOT NULL DEFAULT 0,
+        total_reparaciones INTEGER NOT NULL DEFAULT 0,
+        n_pendiente INTEGER NOT NULL DEFAULT 0,
+        n_en_proceso INTEGER NOT NULL DEFAULT 0,
+        n_terminado INTEGER NOT NULL DEFAULT 0,
+        n_entregado INTEGER NOT NULL DEFAULT 0,
+        n_otro_estado INTEGER NOT NULL DEFAULT 0,
+        n_pagado INTEGER NOT NULL DEFAULT 0,
+        n_no_pagado INTEGER NOT NULL DEFAULT 0,
+        n_pendiente_cobro INTEGER NOT NULL DEFAULT 0,
+        n_con_precio INTEGER NOT NULL DEFAULT 0,
+        centimos_total INTEGER NOT NULL DEFAULT 0,
+        centimos_terminadas INTEGER NOT NULL DEFAULT 0,
+        centimos_cobrado INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT OR IGNORE INTO kpi_counters (id) VALUES (1)",
+    "DROP TRIGGER IF EXISTS kpi_reparaciones_insert",
+    """
+    CREATE TRIGGER kpi_reparaciones_insert AFTER INSERT ON reparaciones
+    BEGIN
+        UPDATE kpi_counters SET
+            total_reparaciones = total_reparaciones + (1),
+            n_pendiente = n_pendiente + (CASE WHEN NEW.estado = 'Pendiente' THEN 1 ELSE 0 END),
+            n_en_proceso = n_en_proceso + (CASE WHEN NEW.estado = 'En proceso' THEN 1 ELSE 0 END),
+            n_terminado = n_terminado + (CASE WHEN NEW.estado = 'Terminado' THEN 1 ELSE 0 END),
+            n_entregado = n_entregado + (CASE WHEN NEW.estado = 'Entregado' THEN 1 ELSE 0 END),
+            n_otro_estado = n_otro_estado + (CASE WHEN NEW.estado NOT IN ('Pendiente', 'En proceso', 'Terminado', 'Entregado') THEN 1 ELSE 0 END),
+            n_pagado = n_pagado + (CASE WHEN NEW.estado_pago = 'Pagado' THEN 1 ELSE 0 END),
+            n_no_pagado = n_no_pagado + (CASE WHEN NEW.estado_pago != 'Pagado' THEN 1 ELSE 0 END),
+            n_pendiente_cobro = n_pendiente_cobro + (CASE WHEN NEW.estado_pago = 'Pendiente' AND NEW.precio > 0 THEN 1 ELSE 0 END),
+            n_con_precio = n_con_precio + (CASE WHEN NEW.precio IS NOT NULL THEN 1 ELSE 0 END),
+            centimos_total = centimos_total + (COALESCE(CAST(ROUND(NEW.precio * 100) AS INTEGER), 0)),
+            centimos_terminadas = centimos_terminadas + (CASE WHEN NEW.estado IN ('Terminado', 'Entregado') THEN COALESCE(CAST(ROUND(NEW.precio * 100) AS INTEGER), 0) ELSE 0 END),
+            centimos_cobrado = centimos_cobrado + (CASE WHEN NEW.estado_pago = 'Pagado' THEN COALESCE(CAST(ROUND(NEW.precio * 100) AS INTEGER), 0) ELSE 0 END)
+        WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS kpi_reparaciones_delete",
+    """
+    CREATE TRIGGER kpi_reparaciones_delete AFTER DELETE ON reparaciones
+    BEGIN
+        UPDATE kpi_counters SET
+            total_reparaciones = total_reparaciones - (1),
+            n_pendiente = n_pendiente - (CASE WHEN OLD.estado = 'Pendiente' THEN 1 ELSE 0 END),
+            n_en_proceso = n_en_proceso - (CASE WHEN OLD.estado = 'En proceso' THEN 1 ELSE 0 END),
+            n_terminado = n_terminado - (CASE WHEN OLD.estado = 'Terminado' THEN 1 ELSE 0 END),
+            n_entregado = n_entregado - (CASE WHEN OLD.estado = 'Entregado' THEN 1 ELSE 0 END),
+            n_otro_estado = n_otro_estado - (CASE WHEN OLD.estado NOT IN ('Pendiente', 'En proceso', 'Terminado', 'Entregado') THEN 1 ELSE 0 END),
+            n_pagado = n_pagado - (CASE WHEN OLD.estado_pago = 'Pagado' THEN 1 ELSE 0 END),
+            n_no_pagado = n_no_pagado - (CASE WHEN OLD.estado_pago != 'Pagado' THEN 1 ELSE 0 END),
+            n_pendiente_cobro = n_pendiente_cobro - (CASE WHEN OLD.estado_pago = 'Pendiente' AND OLD.precio > 0 THEN 1 ELSE 0 END),
+            n_con_precio = n_con_precio - (CASE WHEN OLD.precio IS NOT NULL THEN 1 ELSE 0 END),
+            centimos_total = centimos_total - (COALESCE(CAST(ROUND(OLD.precio * 100) AS INTEGER), 0)),
+            centimos_terminadas = centimos_terminadas - (CASE WHEN OLD.estado IN ('Terminado', 'Entregado') THEN COALESCE(CAST(ROUND(OLD.precio * 100) AS INTEGER), 0) ELSE 0 END),
+            centimos_cobrado = centimos_cobrado - (CASE WHEN OLD.estado_pago = 'Pagado' THEN COALESCE(CAST(ROUND(OLD.precio * 100) AS INTEGER), 0) ELSE 0 END)
+        WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS kpi_reparaciones_update",
+    """
+    CREATE TRIGGER kpi_reparaciones_update AFTER UPDATE OF estado, estado_pago, precio ON reparaciones
+    BEGIN
+        UPDATE kpi_counters SET
+            total_reparaciones = total_reparaciones - (1) + (1),
+            n_pendiente = n_pendiente - (CASE WHEN OLD.estado = 'Pendiente' THEN 1 ELSE 0 END) + (CASE WHEN NEW.estado = 'Pendiente' THEN 1 ELSE 0 END),
+            n_en_proceso = n_en_proceso - (CASE WHEN OLD.estado = 'En proceso' THEN 1 ELSE 0 END) + (CASE WHEN NEW.estado = 'En proceso' THEN 1 ELSE 0 END),
+            n_terminado = n_terminado - (CASE WHEN OLD.estado = 'Terminado' THEN 1 ELSE 0 END) + (CASE WHEN NEW.estado = 'Terminado' THEN 1 ELSE 0 END),
+            n_entregado = n_entregado - (CASE WHEN OLD.estado = 'Entregado' THEN 1 ELSE 0 END) + (CASE WHEN NEW.estado = 'Entregado' THEN 1 ELSE 0 END),
+            n_otro_estado = n_otro_estado - (CASE WHEN OLD.estado NOT IN ('Pendiente', 'En proceso', 'Terminado', 'Entregado') THEN 1 ELSE 0 END) + (CASE WHEN NEW.estado NOT IN ('Pendiente', 'En proceso', 'Terminado', 'Entregado') THEN 1 ELSE 0 END),
+            n_pagado = n_pagado - (CASE WHEN OLD.estado_pago = 'Pagado' THEN 1 ELSE 0 END) + (CASE WHEN NEW.estado_pago = 'Pagado' THEN 1 ELSE 0 END),
+            n_no_pagado = n_no_pagado - (CASE WHEN OLD.estado_pago != 'Pagado' THEN 1 ELSE 0 END) + (CASE WHEN NEW.estado_pago != 'Pagado' THEN 1 ELSE 0 END),
+            n_pendiente_cobro = n_pendiente_cobro - (CASE WHEN OLD.estado_pago = 'Pendiente' AND OLD.precio > 0 THEN 1 ELSE 0 END) + (CASE WHEN NEW.estado_pago = 'Pendiente' AND NEW.precio > 0 THEN 1 ELSE 0 END),
+            n_con_precio = n_con_precio - (CASE WHEN OLD.precio IS NOT NULL THEN 1 ELSE 0 END) + (CASE WHEN NEW.precio IS NOT NULL THEN 1 ELSE 0 END),
+            centimos_total = centimos_total - (COALESCE(CAST(ROUND(OLD.precio * 100) AS INTEGER), 0)) + (COALESCE(CAST(ROUND(NEW.precio * 100) AS INTEGER), 0)),
+            centimos_terminadas = centimos_terminadas - (CASE WHEN OLD.estado IN ('Terminado', 'Entregado') THEN COALESCE(CAST(ROUND(OLD.precio * 100) AS INTEGER), 0) ELSE 0 END) + (CASE WHEN NEW.estado IN ('Terminado', 'Entregado') THEN COALESCE(CAST(ROUND(NEW.precio * 100) AS INTEGER), 0) ELSE 0 END),
+            centimos_cobrado = centimos_cobrado - (CASE WHEN OLD.estado_pago = 'Pagado' THEN COALESCE(CAST(ROUND(OLD.precio * 100) AS INTEGER), 0) ELSE 0 END) + (CASE WHEN NEW.estado_pago = 'Pagado' THEN COALESCE(CAST(ROUND(NEW.precio * 100) AS INTEGER), 0) ELSE 0 END)
+        WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS kpi_clientes_insert",
+    """
+    CREATE TRIGGER kpi_clientes_insert AFTER INSERT ON clientes
+    BEGIN
+        UPDATE kpi_counters SET
+            total_clientes = total_clientes + 1
+        WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS kpi_clientes_delete",
+    """
+    CREATE TRIGGER kpi_clientes_delete AFTER DELETE ON clientes
+    BEGIN
+        UPDATE kpi_counters SET
+            total_clientes = total_clientes - 1
+        WHERE id = 1;
+    END
+    """,
+]
+
+# Relleno con los datos existentes (lo que hacia kpis.recalcular_kpis)
+_RELLENO = """
+    UPDATE kpi_counters SET (
+        total_clientes, total_reparaciones, n_pendiente, n_en_proceso, n_terminado,
+        n_entregado, n_otro_estado, n_pagado, n_no_pagado, n_pendiente_cobro,
+        n_con_precio, centimos_total, centimos_terminadas, centimos_cobrado
+    ) = (
+        SELECT (SELECT COUNT(*) FROM clientes),
+               COALESCE(SUM(1), 0),
+               COALESCE(SUM(CASE WHEN reparaciones.estado = 'Pendiente' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN reparaciones.estado = 'En proceso' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN reparaciones.estado = 'Terminado' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN reparaciones.estado = 'Entregado' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN reparaciones.estado NOT IN ('Pendiente', 'En proceso', 'Terminado', 'Entregado') THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN reparaciones.estado_pago = 'Pagado' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN reparaciones.estado_pago != 'Pagado' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN reparaciones.estado_pago = 'Pendiente' AND reparaciones.precio > 0 THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN reparaciones.precio IS NOT NULL THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(COALESCE(CAST(ROUND(reparaciones.precio * 100) AS INTEGER), 0)), 0),
+               COALESCE(SUM(CASE WHEN reparaciones.estado IN ('Terminado', 'Entregado') THEN COALESCE(CAST(ROUND(reparaciones.precio * 100) AS INTEGER), 0) ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN reparaciones.estado_pago = 'Pagado' THEN COALESCE(CAST(ROUND(reparaciones.precio * 100) AS INTEGER), 0) ELSE 0 END), 0)
+        FROM reparaciones
+    )
+    WHERE id = 1
+"""
+
+
+def upgrade(conn):
+    for sql in _SQL:
+        conn.execute(sql)
+    conn.execute(_RELLENO)
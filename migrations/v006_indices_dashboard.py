@@ -0,0 +1,16 @@
+"""Indices cubrientes para las consultas de :mod:`dashboard`.
+
+``(fecha_entrada, precio)`` resuelve el grafico de ingresos por mes sin
+tocar la tabla y sustituye al indice simple de fecha_entrada (mismo
+prefijo).  ``dispositivo`` convierte el ranking de dispositivos en un
+recorrido del indice en lugar de la tabla completa.
+"""
+
+DESCRIPCION = "Indices cubrientes del dashboard"
+
+
+def upgrade(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reparaciones_fecha_precio ON reparaciones(fecha_entrada, precio)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reparaciones_dispositivo ON reparaciones(dispositivo)")
+    conn.execute("DROP INDEX IF EXISTS idx_reparaciones_fecha_entrada")
+    conn.execute("ANALYZE")
@@ -0,0 +1,95 @@
+"""Version de datos y tabla de cache compartida entre workers (ver :mod:`cache`).
+
+Cada INSERT/UPDATE/DELETE en reparaciones, historial y auditoria
+incrementa ``version_datos.version`` dentro de la misma transaccion.  Las
+tablas versionadas se fijan aqui; las que se anadan despues van en una
+migracion nueva.
+"""
+
+DESCRIPCION = "Version de datos y cache de respuestas"
+
+_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS version_datos (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT OR IGNORE INTO version_datos (id, version) VALUES (1, 0)",
+    """
+    CREATE TABLE IF NOT EXISTS cache_respuestas (
+        clave TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        creado_en REAL NOT NULL,
+        valor TEXT NOT NULL
+    )
+    """,
+    "DROP TRIGGER IF EXISTS version_reparaciones_insert",
+    """
+    CREATE TRIGGER version_reparaciones_insert AFTER INSERT ON reparaciones
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS version_reparaciones_update",
+    """
+    CREATE TRIGGER version_reparaciones_update AFTER UPDATE ON reparaciones
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS version_reparaciones_delete",
+    """
+    CREATE TRIGGER version_reparaciones_delete AFTER DELETE ON reparaciones
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS version_reparaciones_historial_insert",
+    """
+    CREATE TRIGGER version_reparaciones_historial_insert AFTER INSERT ON reparaciones_historial
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS version_reparaciones_historial_update",
+    """
+    CREATE TRIGGER version_reparaciones_historial_update AFTER UPDATE ON reparaciones_historial
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS version_reparaciones_historial_delete",
+    """
+    CREATE TRIGGER version_reparaciones_historial_delete AFTER DELETE ON reparaciones_historial
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS version_audit_log_insert",
+    """
+    CREATE TRIGGER version_audit_log_insert AFTER INSERT ON audit_log
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS version_audit_log_update",
+    """
+    CREATE TRIGGER version_audit_log_update AFTER UPDATE ON audit_log
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS version_audit_log_delete",
+    """
+    CREATE TRIGGER version_audit_log_delete AFTER DELETE ON audit_log
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+]
+
+
+def upgrade(conn):
+    for sql in _SQL:
+        conn.execute(sql)
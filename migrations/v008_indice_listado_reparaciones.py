@@ -0,0 +1,12 @@
+"""Indice para la paginacion por cursor de /reparaciones.
+
+``ORDER BY fecha_entrada DESC, id DESC`` sin filtros necesita un indice
+cuyo orden sea exactamente ``(fecha_entrada, id)``; el de v006 lleva
+``precio`` en medio y obliga a ordenar en memoria el desempate por id.
+"""
+
+DESCRIPCION = "Indice (fecha_entrada, id) para paginacion por cursor"
+
+
+def upgrade(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reparaciones_fecha_id ON reparaciones(fecha_entrada, id)")
@@ -0,0 +1,152 @@
+"""Indices FTS5 para ``/buscar`` sobre clientes, reparaciones, notas y piezas.
+
+Crea las tablas virtuales y sus triggers y las rellena con los datos
+existentes (ver :mod:`busqueda`).  El SQL es una copia fija del que
+generaba :mod:`busqueda` al crear la migracion.
+"""
+
+DESCRIPCION = "Busqueda de texto completo (FTS5)"
+
+_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS fts_clientes USING fts5(
+        nombre, email, telefono,
+        content='clientes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    "DROP TRIGGER IF EXISTS fts_clientes_insert",
+    "DROP TRIGGER IF EXISTS fts_clientes_delete",
+    "DROP TRIGGER IF EXISTS fts_clientes_update",
+    """
+    CREATE TRIGGER fts_clientes_insert AFTER INSERT ON clientes
+    BEGIN
+        INSERT INTO fts_clientes (rowid, nombre, email, telefono) VALUES (NEW.id, NEW.nombre, NEW.email, IFNULL(NEW.telefono, '') || ' ' || REPLACE(REPLACE(IFNULL(NEW.telefono, ''), ' ', ''), '-', ''));
+    END
+    """,
+    """
+    CREATE TRIGGER fts_clientes_delete AFTER DELETE ON clientes
+    BEGIN
+        INSERT INTO fts_clientes (fts_clientes, rowid, nombre, email, telefono) VALUES ('delete', OLD.id, OLD.nombre, OLD.email, IFNULL(OLD.telefono, '') || ' ' || REPLACE(REPLACE(IFNULL(OLD.telefono, ''), ' ', ''), '-', ''));
+    END
+    """,
+    """
+    CREATE TRIGGER fts_clientes_update AFTER UPDATE OF nombre, email, telefono ON clientes
+    BEGIN
+        INSERT INTO fts_clientes (fts_clientes, rowid, nombre, email, telefono) VALUES ('delete', OLD.id, OLD.nombre, OLD.email, IFNULL(OLD.telefono, '') || ' ' || REPLACE(REPLACE(IFNULL(OLD.telefono, ''), ' ', ''), '-', ''));
+        INSERT INTO fts_clientes (rowid, nombre, email, telefono) VALUES (NEW.id, NEW.nombre, NEW.email, IFNULL(NEW.telefono, '') || ' ' || REPLACE(REPLACE(IFNULL(NEW.telefono, ''), ' ', ''), '-', ''));
+    END
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS fts_reparaciones USING fts5(
+        dispositivo, descripcion,
+        content='reparaciones', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    "DROP TRIGGER IF EXISTS fts_reparaciones_insert",
+    "DROP TRIGGER IF EXISTS fts_reparaciones_delete",
+    "DROP TRIGGER IF EXISTS fts_reparaciones_update",
+    """
+    CREATE TRIGGER fts_reparaciones_insert AFTER INSERT ON reparaciones
+    BEGIN
+        INSERT INTO fts_reparaciones (rowid, dispositivo, descripcion) VALUES (NEW.id, NEW.dispositivo, NEW.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER fts_reparaciones_delete AFTER DELETE ON reparaciones
+    BEGIN
+        INSERT INTO fts_reparaciones (fts_reparaciones, rowid, dispositivo, descripcion) VALUES ('delete', OLD.id, OLD.dispositivo, OLD.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER fts_reparaciones_update AFTER UPDATE OF dispositivo, descripcion ON reparaciones
+    BEGIN
+        INSERT INTO fts_reparaciones (fts_reparaciones, rowid, dispositivo, descripcion) VALUES ('delete', OLD.id, OLD.dispositivo, OLD.descripcion);
+        INSERT INTO fts_reparaciones (rowid, dispositivo, descripcion) VALUES (NEW.id, NEW.dispositivo, NEW.descripcion);
+    END
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS fts_notas USING fts5(
+        contenido,
+        content='notas_reparacion', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    "DROP TRIGGER IF EXISTS fts_notas_reparacion_insert",
+    "DROP TRIGGER IF EXISTS fts_notas_reparacion_delete",
+    "DROP TRIGGER IF EXISTS fts_notas_reparacion_update",
+    """
+    CREATE TRIGGER fts_notas_reparacion_insert AFTER INSERT ON notas_reparacion
+    BEGIN
+        INSERT INTO fts_notas (rowid, contenido) VALUES (NEW.id, NEW.contenido);
+    END
+    """,
+    """
+    CREATE TRIGGER fts_notas_reparacion_delete AFTER DELETE ON notas_reparacion
+    BEGIN
+        INSERT INTO fts_notas (fts_notas, rowid, contenido) VALUES ('delete', OLD.id, OLD.contenido);
+    END
+    """,
+    """
+    CREATE TRIGGER fts_notas_reparacion_update AFTER UPDATE OF contenido ON notas_reparacion
+    BEGIN
+        INSERT INTO fts_notas (fts_notas, rowid, contenido) VALUES ('delete', OLD.id, OLD.contenido);
+        INSERT INTO fts_notas (rowid, contenido) VALUES (NEW.id, NEW.contenido);
+    END
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS fts_piezas USING fts5(
+        nombre, categoria, descripcion, proveedor,
+        content='inventario_piezas', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    "DROP TRIGGER IF EXISTS fts_inventario_piezas_insert",
+    "DROP TRIGGER IF EXISTS fts_inventario_piezas_delete",
+    "DROP TRIGGER IF EXISTS fts_inventario_piezas_update",
+    """
+    CREATE TRIGGER fts_inventario_piezas_insert AFTER INSERT ON inventario_piezas
+    BEGIN
+        INSERT INTO fts_piezas (rowid, nombre, categoria, descripcion, proveedor) VALUES (NEW.id, NEW.nombre, NEW.categoria, NEW.descripcion, NEW.proveedor);
+    END
+    """,
+    """
+    CREATE TRIGGER fts_inventario_piezas_delete AFTER DELETE ON inventario_piezas
+    BEGIN
+        INSERT INTO fts_piezas (fts_piezas, rowid, nombre, categoria, descripcion, proveedor) VALUES ('delete', OLD.id, OLD.nombre, OLD.categoria, OLD.descripcion, OLD.proveedor);
+    END
+    """,
+    """
+    CREATE TRIGGER fts_inventario_piezas_update AFTER UPDATE OF nombre, categoria, descripcion, proveedor ON inventario_piezas
+    BEGIN
+        INSERT INTO fts_piezas (fts_piezas, rowid, nombre, categoria, descripcion, proveedor) VALUES ('delete', OLD.id, OLD.nombre, OLD.categoria, OLD.descripcion, OLD.proveedor);
+        INSERT INTO fts_piezas (rowid, nombre, categoria, descripcion, proveedor) VALUES (NEW.id, NEW.nombre, NEW.categoria, NEW.descripcion, NEW.proveedor);
+    END
+    """,
+    "INSERT INTO fts_clientes (fts_clientes) VALUES ('delete-all')",
+    """
+    INSERT INTO fts_clientes (rowid, nombre, email, telefono)
+    SELECT id, clientes.nombre, clientes.email, IFNULL(clientes.telefono, '') || ' ' || REPLACE(REPLACE(IFNULL(clientes.telefono, ''), ' ', ''), '-', '') FROM clientes
+    """,
+    "INSERT INTO fts_reparaciones (fts_reparaciones) VALUES ('delete-all')",
+    """
+    INSERT INTO fts_reparaciones (rowid, dispositivo, descripcion)
+    SELECT id, reparaciones.dispositivo, reparaciones.descripcion FROM reparaciones
+    """,
+    "INSERT INTO fts_notas (fts_notas) VALUES ('delete-all')",
+    """
+    INSERT INTO fts_notas (rowid, contenido)
+    SELECT id, notas_reparacion.contenido FROM notas_reparacion
+    """,
+    "INSERT INTO fts_piezas (fts_piezas) VALUES ('delete-all')",
+    """
+    INSERT INTO fts_piezas (rowid, nombre, categoria, descripcion, proveedor)
+    SELECT id, inventario_piezas.nombre, inventario_piezas.categoria, inventario_piezas.descripcion, inventario_piezas.proveedor FROM inventario_piezas
+    """,
+]
+
+
+def upgrade(conn):
+    for sql in _SQL:
+        conn.execute(sql)
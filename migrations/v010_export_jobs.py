@@ -0,0 +1,33 @@
+"""Tabla ``export_jobs`` para las exportaciones en segundo plano (ver :mod:`exportaciones`)."""
+
+DESCRIPCION = "Trabajos de exportacion en segundo plano"
+
+_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS export_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        informe TEXT NOT NULL,
+        parametros TEXT NOT NULL DEFAULT '{}',
+        usuario TEXT NOT NULL,
+        estado TEXT NOT NULL DEFAULT 'pendiente',
+        filas_total INTEGER,
+        filas_escritas INTEGER NOT NULL DEFAULT 0,
+        bytes INTEGER,
+        fichero TEXT,
+        nombre_descarga TEXT,
+        error TEXT,
+        creado_en REAL NOT NULL,
+        iniciado_en REAL,
+        actualizado_en REAL,
+        terminado_en REAL,
+        expira_en REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_export_jobs_estado ON export_jobs(estado, id)",
+    "CREATE INDEX IF NOT EXISTS idx_export_jobs_usuario ON export_jobs(usuario, id)",
+]
+
+
+def upgrade(conn):
+    for sql in _SQL:
+        conn.execute(sql)
@@ -0,0 +1,168 @@
+"""Columna ``rowversion``, lapidas y triggers para el feed de cambios (ver :mod:`cambios`)."""
+
+from migrations import columna_existe
+
+DESCRIPCION = "rowversion y lapidas para /api/export/changes"
+
+_TABLAS = ('clientes', 'reparaciones', 'reparaciones_historial', 'inventario_piezas', 'piezas_reparacion')
+
+_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS cambios_secuencia (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        valor INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT OR IGNORE INTO cambios_secuencia (id, valor) VALUES (1, 1)",
+    """
+    CREATE TABLE IF NOT EXISTS cambios_borrados (
+        rowversion INTEGER PRIMARY KEY,
+        tabla TEXT NOT NULL,
+        fila_id INTEGER NOT NULL,
+        borrado_en TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_clientes_rowversion ON clientes(rowversion)",
+    "DROP TRIGGER IF EXISTS cambios_clientes_insert",
+    "DROP TRIGGER IF EXISTS cambios_clientes_update",
+    "DROP TRIGGER IF EXISTS cambios_clientes_delete",
+    """
+    CREATE TRIGGER cambios_clientes_insert AFTER INSERT ON clientes
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        UPDATE clientes SET rowversion = (SELECT valor FROM cambios_secuencia WHERE id = 1) WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER cambios_clientes_update AFTER UPDATE ON clientes
+    WHEN NEW.rowversion IS OLD.rowversion
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        UPDATE clientes SET rowversion = (SELECT valor FROM cambios_secuencia WHERE id = 1) WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER cambios_clientes_delete AFTER DELETE ON clientes
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        INSERT INTO cambios_borrados (rowversion, tabla, fila_id, borrado_en)
+        VALUES ((SELECT valor FROM cambios_secuencia WHERE id = 1), 'clientes', OLD.id, datetime('now', 'localtime'));
+    END
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_reparaciones_rowversion ON reparaciones(rowversion)",
+    "DROP TRIGGER IF EXISTS cambios_reparaciones_insert",
+    "DROP TRIGGER IF EXISTS cambios_reparaciones_update",
+    "DROP TRIGGER IF EXISTS cambios_reparaciones_delete",
+    """
+    CREATE TRIGGER cambios_reparaciones_insert AFTER INSERT ON reparaciones
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        UPDATE reparaciones SET rowversion = (SELECT valor FROM cambios_secuencia WHERE id = 1) WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER cambios_reparaciones_update AFTER UPDATE ON reparaciones
+    WHEN NEW.rowversion IS OLD.rowversion
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        UPDATE reparaciones SET rowversion = (SELECT valor FROM cambios_secuencia WHERE id = 1) WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER cambios_reparaciones_delete AFTER DELETE ON reparaciones
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        INSERT INTO cambios_borrados (rowversion, tabla, fila_id, borrado_en)
+        VALUES ((SELECT valor FROM cambios_secuencia WHERE id = 1), 'reparaciones', OLD.id, datetime('now', 'localtime'));
+    END
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_reparaciones_historial_rowversion ON reparaciones_historial(rowversion)",
+    "DROP TRIGGER IF EXISTS cambios_reparaciones_historial_insert",
+    "DROP TRIGGER IF EXISTS cambios_reparaciones_historial_update",
+    "DROP TRIGGER IF EXISTS cambios_reparaciones_historial_delete",
+    """
+    CREATE TRIGGER cambios_reparaciones_historial_insert AFTER INSERT ON reparaciones_historial
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        UPDATE reparaciones_historial SET rowversion = (SELECT valor FROM cambios_secuencia WHERE id = 1) WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER cambios_reparaciones_historial_update AFTER UPDATE ON reparaciones_historial
+    WHEN NEW.rowversion IS OLD.rowversion
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        UPDATE reparaciones_historial SET rowversion = (SELECT valor FROM cambios_secuencia WHERE id = 1) WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER cambios_reparaciones_historial_delete AFTER DELETE ON reparaciones_historial
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        INSERT INTO cambios_borrados (rowversion, tabla, fila_id, borrado_en)
+        VALUES ((SELECT valor FROM cambios_secuencia WHERE id = 1), 'reparaciones_historial', OLD.id, datetime('now', 'localtime'));
+    END
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_inventario_piezas_rowversion ON inventario_piezas(rowversion)",
+    "DROP TRIGGER IF EXISTS cambios_inventario_piezas_insert",
+    "DROP TRIGGER IF EXISTS cambios_inventario_piezas_update",
+    "DROP TRIGGER IF EXISTS cambios_inventario_piezas_delete",
+    """
+    CREATE TRIGGER cambios_inventario_piezas_insert AFTER INSERT ON inventario_piezas
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        UPDATE inventario_piezas SET rowversion = (SELECT valor FROM cambios_secuencia WHERE id = 1) WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER cambios_inventario_piezas_update AFTER UPDATE ON inventario_piezas
+    WHEN NEW.rowversion IS OLD.rowversion
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        UPDATE inventario_piezas SET rowversion = (SELECT valor FROM cambios_secuencia WHERE id = 1) WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER cambios_inventario_piezas_delete AFTER DELETE ON inventario_piezas
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        INSERT INTO cambios_borrados (rowversion, tabla, fila_id, borrado_en)
+        VALUES ((SELECT valor FROM cambios_secuencia WHERE id = 1), 'inventario_piezas', OLD.id, datetime('now', 'localtime'));
+    END
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_piezas_reparacion_rowversion ON piezas_reparacion(rowversion)",
+    "DROP TRIGGER IF EXISTS cambios_piezas_reparacion_insert",
+    "DROP TRIGGER IF EXISTS cambios_piezas_reparacion_update",
+    "DROP TRIGGER IF EXISTS cambios_piezas_reparacion_delete",
+    """
+    CREATE TRIGGER cambios_piezas_reparacion_insert AFTER INSERT ON piezas_reparacion
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        UPDATE piezas_reparacion SET rowversion = (SELECT valor FROM cambios_secuencia WHERE id = 1) WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER cambios_piezas_reparacion_update AFTER UPDATE ON piezas_reparacion
+    WHEN NEW.rowversion IS OLD.rowversion
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        UPDATE piezas_reparacion SET rowversion = (SELECT valor FROM cambios_secuencia WHERE id = 1) WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER cambios_piezas_reparacion_delete AFTER DELETE ON piezas_reparacion
+    BEGIN
+        UPDATE cambios_secuencia SET valor = valor + 1 WHERE id = 1;
+        INSERT INTO cambios_borrados (rowversion, tabla, fila_id, borrado_en)
+        VALUES ((SELECT valor FROM cambios_secuencia WHERE id = 1), 'piezas_reparacion', OLD.id, datetime('now', 'localtime'));
+    END
+    """,
+]
+
+
+def upgrade(conn):
+    for tabla in _TABLAS:
+        if not columna_existe(conn, tabla, "rowversion"):
+            conn.execute(f"ALTER TABLE {tabla} ADD COLUMN rowversion INTEGER NOT NULL DEFAULT 1")
+    for sql in _SQL:
+        conn.execute(sql)
@@ -0,0 +1,13 @@
+"""Indice para las facturas en lote (ver :mod:`facturacion`).
+
+El cierre de mes filtra ``estado_pago = 'Pagado'`` y un rango de
+``fecha_pago``; el indice de v004 es ``(estado_pago, precio)`` y obliga a
+revisar todas las reparaciones pagadas.
+"""
+
+DESCRIPCION = "Indice (estado_pago, fecha_pago) para facturas en lote"
+
+
+def upgrade(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reparaciones_pago_fecha "
+                 "ON reparaciones(estado_pago, fecha_pago)")
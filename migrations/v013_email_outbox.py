@@ -0,0 +1,29 @@
+"""Tabla ``email_outbox``: cola de emails pendientes (ver :mod:`utils.email_outbox`)."""
+
+DESCRIPCION = "Cola de emails con reintentos"
+
+_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS email_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL,
+        remitente TEXT NOT NULL,
+        destinatario TEXT NOT NULL,
+        asunto TEXT NOT NULL,
+        mensaje BLOB NOT NULL,
+        estado TEXT NOT NULL DEFAULT 'pendiente',
+        intentos INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        creado_en REAL NOT NULL,
+        proximo_intento REAL NOT NULL,
+        reclamado_en REAL,
+        enviado_en REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_email_outbox_estado ON email_outbox(estado, proximo_intento)",
+]
+
+
+def upgrade(conn):
+    for sql in _SQL:
+        conn.execute(sql)
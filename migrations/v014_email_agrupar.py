@@ -0,0 +1,12 @@
+"""Columna ``agrupar`` en ``email_outbox`` (ver :func:`utils.email_outbox.encolar`)."""
+
+from migrations import columna_existe
+
+DESCRIPCION = "Agrupar emails de cambio de estado por reparacion"
+
+
+def upgrade(conn):
+    if not columna_existe(conn, "email_outbox", "agrupar"):
+        conn.execute("ALTER TABLE email_outbox ADD COLUMN agrupar TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_email_outbox_agrupar "
+                 "ON email_outbox(agrupar, destinatario) WHERE estado = 'pendiente'")
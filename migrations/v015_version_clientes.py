@@ -0,0 +1,37 @@
+"""Las escrituras en ``clientes`` tambien incrementan ``version_datos``.
+
+El dashboard cacheado muestra ``total_clientes`` y los listados filtran
+por nombre de cliente: sin estos triggers, dar de alta o borrar un
+cliente no invalidaba la cache hasta que vencia el TTL (ver :mod:`cache`).
+"""
+
+DESCRIPCION = "Version de datos tambien con clientes"
+
+_SQL = [
+    "DROP TRIGGER IF EXISTS version_clientes_insert",
+    """
+    CREATE TRIGGER version_clientes_insert AFTER INSERT ON clientes
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS version_clientes_update",
+    """
+    CREATE TRIGGER version_clientes_update AFTER UPDATE ON clientes
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS version_clientes_delete",
+    """
+    CREATE TRIGGER version_clientes_delete AFTER DELETE ON clientes
+    BEGIN
+        UPDATE version_datos SET version = version + 1 WHERE id = 1;
+    END
+    """,
+]
+
+
+def upgrade(conn):
+    for sql in _SQL:
+        conn.execute(sql)
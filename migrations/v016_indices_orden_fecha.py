@@ -0,0 +1,23 @@
+"""Indices para el orden del listado de reparaciones con fechas NULL.
+
+``/reparaciones`` ordena y pagina por ``COALESCE(fecha_entrada, '')``
+para que las reparaciones sin fecha de entrada sigan siendo alcanzables
+con el cursor.  SQLite solo usa un indice para esa expresion si esta en
+el propio indice: se sustituye el ``(fecha_entrada, id)`` de v008 y se
+anade la variante por estado (el filtro mas usado del listado).
+"""
+
+DESCRIPCION = "Indices (COALESCE(fecha_entrada, ''), id) para el listado"
+
+_INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_reparaciones_orden_fecha "
+    "ON reparaciones(COALESCE(fecha_entrada, ''), id)",
+    "CREATE INDEX IF NOT EXISTS idx_reparaciones_estado_orden_fecha "
+    "ON reparaciones(estado, COALESCE(fecha_entrada, ''), id)",
+]
+
+
+def upgrade(conn):
+    for ddl in _INDICES:
+        conn.execute(ddl)
+    conn.execute("DROP INDEX IF EXISTS idx_reparaciones_fecha_id")
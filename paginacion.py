@@ -0,0 +1,109 @@
+"""Paginacion por cursor (keyset) para los listados de reparaciones.
+
+En lugar de ``LIMIT ? OFFSET ?`` la pagina siguiente se pide "despues de"
+la ultima fila mostrada: ``WHERE (fecha_entrada, id) < (?, ?)`` con el
+mismo ``ORDER BY ... DESC``.  Con un indice que cubra el orden, cualquier
+pagina cuesta lo mismo que la primera.
+
+Los cursores son opacos para el navegador: JSON en base64 url-safe con la
+direccion (``s`` siguiente / ``a`` anterior) y los valores de las columnas
+de orden de la fila frontera.  Un cursor invalido se trata como primera
+pagina.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+
+from cache import en_cache
+
+
+def codificar_cursor(direccion, valores):
+    crudo = json.dumps([direccion, list(valores)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token, n_columnas):
+    """Devuelve ``(direccion, valores)`` o None si el token no es valido."""
+    if not token:
+        return None
+    try:
+        crudo = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direccion, valores = json.loads(crudo)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if direccion not in ('s', 'a') or not isinstance(valores, list) or len(valores) != n_columnas:
+        return None
+    return direccion, valores
+
+
+def pagina_keyset(conn, select_from, where, params, orden, por_pagina, cursor=None):
+    """Una pagina de resultados ordenados de forma descendente por ``orden``.
+
+    Args:
+        select_from: ``"SELECT ... FROM ... [JOIN ...]"`` sin WHERE ni ORDER BY.
+        where: lista de condiciones (se unen con AND).
+        params: parametros de ``where``.
+        orden: columnas de orden como pares ``(expresion_sql, clave_en_fila)``;
+            la ultima debe ser unica (p. ej. el id).  Ninguna puede ser
+            NULL: una fila con NULL no cumple la comparacion del cursor y
+            no saldria en ninguna pagina (usar ``COALESCE``).
+        cursor: token recibido en la query string (o None).
+
+    Returns:
+        dict con ``filas`` (lista de dicts), ``siguiente`` y ``anterior``
+        (tokens o None si no hay mas paginas en esa direccion).
+    """
+    exprs = [e for e, _ in orden]
+    claves = [k for _, k in orden]
+    decodificado = decodificar_cursor(cursor, len(orden))
+    condiciones = list(where)
+    valores = list(params)
+    hacia_atras = False
+
+    if decodificado:
+        direccion, frontera = decodificado
+        hacia_atras = direccion == 'a'
+        op = '>' if hacia_atras else '<'
+        if len(exprs) > 1:
+            # Redundante, pero SQLite no usa un indice de expresion para
+            # comparar tuplas: sin este termino recorreria el indice desde
+            # el principio en cada pagina
+            condiciones.append(f"{exprs[0]} {op}= ?")
+            valores.append(frontera[0])
+        condiciones.append(f"({', '.join(exprs)}) {op} ({', '.join('?' * len(exprs))})")
+        valores.extend(frontera)
+
+    sentido = 'ASC' if hacia_atras else 'DESC'
+    sql = select_from
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += " ORDER BY " + ", ".join(f"{e} {sentido}" for e in exprs) + " LIMIT ?"
+    filas = [dict(r) for r in conn.execute(sql, valores + [por_pagina + 1]).fetchall()]
+
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    if hacia_atras:
+        filas.reverse()
+        hay_anterior, hay_siguiente = hay_mas, True
+    else:
+        hay_anterior, hay_siguiente = decodificado is not None, hay_mas
+
+    def token(direccion, fila):
+        return codificar_cursor(direccion, [fila[k] for k in claves])
+
+    return {
+        'filas': filas,
+        'siguiente': token('s', filas[-1]) if filas and hay_siguiente else None,
+        'anterior': token('a', filas[0]) if filas and hay_anterior else None,
+    }
+
+
+def total_cacheado(conn, sql, params):
+    """``COUNT(*)`` guardado en la cache compartida hasta la siguiente escritura.
+
+    Para los filtros que no se pueden leer de ``kpi_counters``.
+    """
+    clave = "count:" + hashlib.sha1(json.dumps([sql, list(params)], default=str).encode('utf-8')).hexdigest()
+    return en_cache(conn, clave, lambda: conn.execute(sql, params).fetchone()[0])
@@ -0,0 +1,176 @@
+"""Benchmark del formato de filas de los informes CSV: antiguo vs columnas compiladas.
+
+Llena una tabla en memoria con ``--filas`` reparaciones sinteticas (las
+columnas del informe completo de reparaciones) y mide el coste por fila de:
+
+- ``lectura``: recorrer el cursor sin dar formato (referencia);
+- ``legacy``: ``sqlite3.Row`` + la funcion de fila escrita a mano, con
+  ``strptime`` para las fechas y ``float``/``replace`` para los precios
+  (el codigo anterior a ``utils.csv_export.compilar_columnas``);
+- ``compilado``: tuplas + la funcion de :func:`compilar_columnas` para
+  ``exportaciones.COLUMNAS_REPARACIONES``.
+
+Las dos variantes escriben con ``csv.writer`` a un destino nulo y se
+comprueba que producen las mismas filas.
+
+Uso:
+    python scripts/bench_csv_formato.py                 # 1M filas
+    python scripts/bench_csv_formato.py --filas 200000 --repeticiones 3
+"""
+
+import argparse
+import csv
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from exportaciones import COLUMNAS_REPARACIONES  # noqa: E402
+from utils.csv_export import DELIMITADOR, compilar_columnas  # noqa: E402
+
+CAMPOS = [
+    'id', 'cliente', 'email', 'telefono', 'direccion', 'dispositivo', 'descripcion',
+    'estado', 'estado_pago', 'precio', 'fecha_entrada', 'fecha_salida', 'fecha_pago',
+    'metodo_pago', 'tipo_documento', 'num_fotos', 'num_notas', 'firmado',
+]
+
+
+def legacy_fmt_fecha(fecha_str):
+    if not fecha_str:
+        return ''
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(str(fecha_str), fmt).strftime('%d/%m/%Y')
+        except ValueError:
+            continue
+    return str(fecha_str)
+
+
+def legacy_fmt_precio(valor):
+    if valor is None:
+        return '0,00 €'
+    return f'{float(valor):.2f}'.replace('.', ',') + ' €'
+
+
+def legacy_fila(r):
+    """Replica de ``_fila_csv_reparacion`` antes de las columnas compiladas."""
+    return [
+        r['id'],
+        r['cliente']       or 'Sin asignar',
+        r['email']         or '',
+        r['telefono']      or '',
+        r['direccion']     or '',
+        r['dispositivo'],
+        r['descripcion']   or '',
+        r['estado'],
+        r['estado_pago'],
+        legacy_fmt_precio(r['precio']),
+        r['tipo_documento'] or '',
+        legacy_fmt_fecha(r['fecha_entrada']),
+        legacy_fmt_fecha(r['fecha_salida']),
+        legacy_fmt_fecha(r['fecha_pago']),
+        r['metodo_pago']   or '',
+        r['num_fotos'],
+        r['num_notas'],
+        r['firmado'],
+    ]
+
+
+def crear_datos(n, semilla=7):
+    rnd = random.Random(semilla)
+    conn = sqlite3.connect(':memory:')
+    conn.execute(f"CREATE TABLE detalle ({', '.join(CAMPOS)})")
+    base = datetime(2022, 1, 1)
+
+    def fila(i):
+        entrada = base + timedelta(minutes=rnd.randrange(0, 2_000_000))
+        salida = entrada + timedelta(days=rnd.randrange(1, 20)) if rnd.random() < 0.7 else None
+        pagado = salida is not None and rnd.random() < 0.8
+        return (
+            i, rnd.choice([f'Cliente {i % 5000}', None]), rnd.choice([f'c{i}@correo.es', None, '']),
+            rnd.choice(['633 234 395', None]), rnd.choice(['Calle Mayor 1, Huelva', None]),
+            rnd.choice(['iPhone 13', 'Samsung A52', 'Xiaomi Redmi 9', 'iPad Air']),
+            rnd.choice(['Pantalla rota', 'No carga', None]),
+            rnd.choice(['Pendiente', 'En proceso', 'Terminado', 'Entregado']),
+            'Pagado' if pagado else 'Pendiente',
+            rnd.choice([None, 0, rnd.randrange(1000, 40000) / 100]),
+            entrada.strftime('%Y-%m-%d %H:%M:%S'),
+            salida.strftime('%Y-%m-%d %H:%M:%S') if salida else None,
+            salida.strftime('%Y-%m-%d') if pagado else None,
+            rnd.choice(['Efectivo', 'Tarjeta', None]) if pagado else None,
+            rnd.choice(['factura', 'ticket', None]),
+            rnd.randrange(0, 4), rnd.randrange(0, 3), rnd.choice(['Si', 'No']),
+        )
+
+    conn.executemany(f"INSERT INTO detalle VALUES ({', '.join('?' * len(CAMPOS))})",
+                     (fila(i) for i in range(1, n + 1)))
+    return conn
+
+
+class _Nulo:
+    def write(self, texto):
+        pass
+
+
+def pasada(conn, variante):
+    w = csv.writer(_Nulo(), delimiter=DELIMITADOR)
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row if variante == 'legacy' else None
+    t0 = time.perf_counter()
+    cursor.execute("SELECT * FROM detalle ORDER BY id DESC")
+    if variante == 'lectura':
+        for _ in cursor:
+            pass
+    elif variante == 'legacy':
+        for fila in cursor:
+            w.writerow(legacy_fila(fila))
+    else:
+        fila_csv = compilar_columnas(COLUMNAS_REPARACIONES, [d[0] for d in cursor.description])
+        for fila in cursor:
+            w.writerow(fila_csv(fila))
+    return time.perf_counter() - t0
+
+
+def comprobar(conn, muestra=20000):
+    """Las dos variantes deben dar exactamente las mismas filas."""
+    cur_row = conn.cursor()
+    cur_row.row_factory = sqlite3.Row
+    cur_row.execute(f"SELECT * FROM detalle ORDER BY id LIMIT {muestra}")
+    cur_tup = conn.cursor()
+    cur_tup.execute(f"SELECT * FROM detalle ORDER BY id LIMIT {muestra}")
+    fila_csv = compilar_columnas(COLUMNAS_REPARACIONES, [d[0] for d in cur_tup.description])
+    for a, b in zip(cur_row, cur_tup):
+        if legacy_fila(a) != list(fila_csv(b)):
+            raise SystemExit(f"Salida distinta para la fila {a['id']}: {legacy_fila(a)} != {fila_csv(b)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del formato de filas CSV")
+    parser.add_argument('--filas', type=int, default=1000000)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    conn = crear_datos(args.filas)
+    print(f"# {args.filas} filas generadas en {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    comprobar(conn)
+
+    print(f"{'variante':<10} {'total s':>8} {'us/fila':>8} {'formato us/fila':>16}")
+    lectura = None
+    for variante in ('lectura', 'legacy', 'compilado'):
+        mejor = min(pasada(conn, variante) for _ in range(args.repeticiones))
+        por_fila = mejor / args.filas * 1e6
+        if variante == 'lectura':
+            lectura = por_fila
+            print(f"{variante:<10} {mejor:>8.2f} {por_fila:>8.2f} {'-':>16}")
+        else:
+            print(f"{variante:<10} {mejor:>8.2f} {por_fila:>8.2f} {por_fila - lectura:>16.2f}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
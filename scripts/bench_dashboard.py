@@ -0,0 +1,113 @@
+"""Benchmark de las metricas del dashboard: consultas antiguas vs dashboard_metrics.
+
+Genera BDs sinteticas (scripts/datos_sinteticos.py) de distintos tamanos y
+mide, para cada una, el numero de sentencias SQL y la latencia de:
+
+- ``legacy``: las consultas que hacia ``dashboard()`` antes de
+  kpi_counters/dashboard.py (COUNT/SUM sueltos + bucle de 6 meses);
+- ``dashboard_metrics``: el servicio actual (<= 3 consultas).
+
+Uso:
+    python scripts/bench_dashboard.py                      # 10k, 100k y 1M
+    python scripts/bench_dashboard.py --tamanos 10000 50000 --repeticiones 5
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dashboard import dashboard_metrics  # noqa: E402
+from scripts.datos_sinteticos import generar_bd  # noqa: E402
+
+
+def legacy_metrics(conn, hoy):
+    """Replica de las consultas de metricas de dashboard() antes del cambio."""
+    q = lambda sql, *p: conn.execute(sql, p).fetchone()[0]  # noqa: E731
+    m = {}
+    m['total_clientes'] = q("SELECT COUNT(*) FROM clientes")
+    m['total_reparaciones'] = q("SELECT COUNT(*) FROM reparaciones")
+    m['activas'] = q("SELECT COUNT(*) FROM reparaciones WHERE estado != 'Terminado' AND estado != 'Entregado'")
+    m['terminadas'] = q("SELECT COUNT(*) FROM reparaciones WHERE estado = 'Terminado' OR estado = 'Entregado'")
+    m['ingresos_total'] = q("SELECT IFNULL(SUM(precio), 0) FROM reparaciones WHERE precio IS NOT NULL")
+    inicio_mes = datetime(hoy.year, hoy.month, 1).strftime("%Y-%m-%d")
+    m['ingresos_mes'] = q("SELECT IFNULL(SUM(precio), 0) FROM reparaciones WHERE fecha_entrada >= ? AND precio IS NOT NULL", inicio_mes)
+    m['reparaciones_mes'] = q("SELECT COUNT(*) FROM reparaciones WHERE fecha_entrada >= ?", inicio_mes)
+    m['completadas_mes'] = q("SELECT COUNT(*) FROM reparaciones WHERE (estado = 'Terminado' OR estado = 'Entregado') AND fecha_entrada >= ?", inicio_mes)
+    m['cobrado'] = q("SELECT IFNULL(SUM(precio), 0) FROM reparaciones WHERE estado_pago = 'Pagado' AND precio IS NOT NULL")
+    m['pendientes_cobro'] = q("SELECT COUNT(*) FROM reparaciones WHERE estado_pago = 'Pendiente' AND precio IS NOT NULL AND precio > 0")
+    m['pagadas'] = q("SELECT COUNT(*) FROM reparaciones WHERE estado_pago = 'Pagado'")
+    m['dispositivos'] = conn.execute("""
+        SELECT dispositivo, COUNT(*) as cantidad FROM reparaciones
+        WHERE dispositivo IS NOT NULL AND dispositivo != ''
+        GROUP BY dispositivo ORDER BY cantidad DESC LIMIT 5""").fetchall()
+    m['estados'] = conn.execute(
+        "SELECT estado, COUNT(*) as cantidad FROM reparaciones GROUP BY estado ORDER BY cantidad DESC").fetchall()
+    m['ingresos_por_mes'] = []
+    for i in range(5, -1, -1):
+        fecha = hoy - timedelta(days=30 * i)
+        inicio = datetime(fecha.year, fecha.month, 1)
+        if i == 0:
+            fin = hoy
+        elif fecha.month == 12:
+            fin = datetime(fecha.year + 1, 1, 1) - timedelta(seconds=1)
+        else:
+            fin = datetime(fecha.year, fecha.month + 1, 1) - timedelta(seconds=1)
+        m['ingresos_por_mes'].append(q(
+            "SELECT IFNULL(SUM(precio), 0) FROM reparaciones WHERE fecha_entrada >= ? AND fecha_entrada <= ? AND precio IS NOT NULL",
+            inicio.strftime("%Y-%m-%d"), fin.strftime("%Y-%m-%d")))
+    if q("SELECT COUNT(*) FROM reparaciones WHERE estado = 'Terminado' OR estado = 'Entregado'"):
+        m['tiempo_medio'] = q("""
+            SELECT AVG(CAST((julianday(COALESCE(
+                (SELECT fecha_cambio FROM reparaciones_historial
+                 WHERE reparacion_id = reparaciones.id ORDER BY fecha_cambio DESC LIMIT 1),
+                reparaciones.fecha_entrada)) - julianday(reparaciones.fecha_entrada)) AS REAL))
+            FROM reparaciones WHERE estado = 'Terminado' OR estado = 'Entregado'""")
+    return m
+
+
+def medir(conn, funcion, hoy, repeticiones):
+    """(numero de sentencias, mediana ms, minimo ms) de ``funcion(conn, hoy)``."""
+    sentencias = []
+    conn.set_trace_callback(sentencias.append)
+    funcion(conn, hoy)
+    conn.set_trace_callback(None)
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion(conn, hoy)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return len(sentencias), statistics.median(tiempos), min(tiempos)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de metricas del dashboard")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    hoy = datetime.now()
+    tmp = tempfile.mkdtemp(prefix='androtech_bench_')
+    print(f"{'reparaciones':>12}  {'variante':<18} {'consultas':>9} {'mediana ms':>11} {'min ms':>9}")
+    for n in args.tamanos:
+        ruta = os.path.join(tmp, f"dash_{n}.db")
+        t0 = time.perf_counter()
+        generar_bd(ruta, n, ahora=hoy)
+        print(f"# BD de {n} reparaciones generada en {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+        conn = sqlite3.connect(ruta)
+        conn.row_factory = sqlite3.Row
+        for nombre, funcion in (('legacy', legacy_metrics), ('dashboard_metrics', dashboard_metrics)):
+            consultas, mediana, minimo = medir(conn, funcion, hoy, args.repeticiones)
+            print(f"{n:>12}  {nombre:<18} {consultas:>9} {mediana:>11.1f} {minimo:>9.1f}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Benchmark del PDF de historial de un cliente con miles de reparaciones.
+
+Genera una BD sintetica (scripts/datos_sinteticos.py) cuyo cliente 1 tiene
+``--reparaciones`` reparaciones y mide tiempo y pico de memoria
+(``tracemalloc``, en una pasada aparte para no falsear el tiempo) de:
+
+- ``legacy``: lo que hacia la ruta antes: ``SELECT *`` a dicts, totales en
+  Python y todo el detalle en una sola tabla;
+- ``actual``: totales en SQL, solo las columnas del PDF como tuplas y el
+  detalle en trozos de ``FILAS_POR_TABLA`` filas;
+- con ``--trozos``, el camino actual con otros tamanos de trozo.
+
+Uso:
+    python scripts/bench_historial_pdf.py
+    python scripts/bench_historial_pdf.py --reparaciones 10000 --trozos 100 250 500 1000
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scripts.datos_sinteticos import generar_bd  # noqa: E402
+from utils import pdf_generator  # noqa: E402
+
+CLIENTE_ID = 1
+
+
+def _cliente(conn):
+    return dict(conn.execute("SELECT * FROM clientes WHERE id=?", (CLIENTE_ID,)).fetchone())
+
+
+def legacy(conn):
+    """Replica de la ruta anterior (con una sola tabla de detalle)."""
+    cliente = _cliente(conn)
+    reparaciones = [dict(r) for r in conn.execute(
+        "SELECT * FROM reparaciones WHERE cliente_id=? ORDER BY fecha_entrada DESC",
+        (CLIENTE_ID,)).fetchall()]
+    resumen = {
+        'total': len(reparaciones),
+        'completadas': sum(1 for r in reparaciones if r['estado'] in ('Terminado', 'Entregado')),
+        'total_pagado': sum(r['precio'] or 0 for r in reparaciones if r['estado_pago'] == 'Pagado'),
+    }
+    filas = [tuple(r[c] for c in pdf_generator.COLUMNAS_HISTORIAL) for r in reparaciones]
+    return _generar(cliente, resumen, filas, trozo=len(filas) + 1)
+
+
+def actual(conn, trozo=None):
+    """Lo mismo que ``exportar_historial_cliente_pdf``."""
+    cliente = _cliente(conn)
+    resumen = dict(conn.execute("""
+        SELECT COUNT(*) AS total,
+               COALESCE(SUM(estado IN ('Terminado', 'Entregado')), 0) AS completadas,
+               COALESCE(SUM(CASE WHEN estado_pago = 'Pagado' THEN precio END), 0) AS total_pagado
+        FROM reparaciones WHERE cliente_id = ?
+    """, (CLIENTE_ID,)).fetchone())
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(f"""
+        SELECT {', '.join(pdf_generator.COLUMNAS_HISTORIAL)}
+        FROM reparaciones WHERE cliente_id = ? ORDER BY fecha_entrada DESC
+    """, (CLIENTE_ID,))
+    return _generar(cliente, resumen, cursor.fetchall(), trozo=trozo)
+
+
+def _generar(cliente, resumen, filas, trozo=None):
+    original = pdf_generator.FILAS_POR_TABLA
+    pdf_generator.FILAS_POR_TABLA = trozo or original
+    try:
+        return pdf_generator.generar_historial_cliente_pdf(cliente, resumen, filas).getvalue()
+    finally:
+        pdf_generator.FILAS_POR_TABLA = original
+
+
+def medir(fn, repeticiones):
+    """(mediana en s, pico de memoria en MB, bytes del PDF)."""
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        pdf = fn()
+        tiempos.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(tiempos), pico / 2**20, len(pdf)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del historial PDF de un cliente")
+    parser.add_argument('--reparaciones', type=int, default=5000,
+                        help="Reparaciones del cliente grande")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--trozos', type=int, nargs='*', default=[],
+                        help="Otros tamanos de trozo a probar con el camino actual")
+    parser.add_argument('--sin-legacy', action='store_true',
+                        help="No medir la version anterior (lenta con muchas filas)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = generar_bd(os.path.join(tmp, 'bench.db'), n_reparaciones=args.reparaciones * 2,
+                          cliente_grande=args.reparaciones)
+        conn = sqlite3.connect(ruta)
+        conn.row_factory = sqlite3.Row
+
+        casos = [('legacy', lambda: legacy(conn))] if not args.sin_legacy else []
+        casos.append((f'actual ({pdf_generator.FILAS_POR_TABLA}/tabla)', lambda: actual(conn)))
+        casos += [(f'actual ({t}/tabla)', lambda t=t: actual(conn, t)) for t in args.trozos]
+
+        print(f"Cliente con {args.reparaciones} reparaciones\n")
+        print(f"{'version':<24}{'tiempo s':>10}{'pico MB':>10}{'KB':>8}")
+        for nombre, fn in casos:
+            segundos, pico, tamano = medir(fn, args.repeticiones)
+            print(f"{nombre:<24}{segundos:>10.2f}{pico:>10.1f}{tamano / 1024:>8.0f}")
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
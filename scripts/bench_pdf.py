@@ -0,0 +1,230 @@
+"""Benchmark de los PDF de la app con control de regresiones.
+
+Genera una BD sintetica (scripts/datos_sinteticos.py), prepara
+reparaciones con 0, 5 y 50 piezas y clientes con 10, 1000 y 5000
+reparaciones, y pide cada documento a su ruta con el test client de Flask
+(sin red ni servidor):
+
+- presupuesto y factura: ``/reparaciones/pdf/<id>``;
+- ticket de recogida: ``/reparaciones/<id>/ticket``;
+- historial del cliente: ``/cliente/<id>/historial-pdf``.
+
+Para cada caso reporta el mejor tiempo de ``--repeticiones`` peticiones,
+el pico de memoria de una peticion aparte con ``tracemalloc`` y los bytes
+del PDF.  Los PDF se generan en el propio proceso (``PDF_WORKERS=0``) y la
+cache de PDF se vacia antes de cada peticion, asi que siempre se mide el
+render completo.
+
+Los valores de referencia se guardan en ``pdf_bench_baseline.json``.  Con
+``--check`` el script termina con codigo 1 si alguna metrica empeora mas
+de ``--umbral`` por ciento.  El tiempo ademas tiene que subir mas de
+``--margen-ms`` milisegundos: en los casos de pocos ms el ruido de la
+maquina supera el umbral relativo.  Bytes y memoria no tienen margen.
+Los tiempos dependen de la maquina: la baseline hay que generarla en la
+misma en la que se comprueba.
+
+    python scripts/bench_pdf.py
+    python scripts/bench_pdf.py --check --umbral 25 --margen-ms 20
+    python scripts/bench_pdf.py --actualizar-baseline
+    python scripts/bench_pdf.py --casos presupuesto_5 ticket
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdf_bench_baseline.json')
+
+PIEZAS = (0, 5, 50)
+HISTORIALES = (10, 1000, 5000)
+METRICAS = ('tiempo_ms', 'pico_kb', 'bytes')
+# Subida absoluta minima del tiempo para contar como regresion
+MARGEN_MS = 20
+
+
+def preparar_bd(ruta):
+    """BD sintetica con los casos del benchmark; devuelve ``{caso: url}``."""
+    from scripts.datos_sinteticos import generar_bd
+
+    grande = max(HISTORIALES)
+    generar_bd(ruta, n_reparaciones=grande + sum(HISTORIALES) + 1000, cliente_grande=grande)
+    conn = sqlite3.connect(ruta)
+    with conn:
+        # El cliente 1 ya tiene el historial grande; los demas se crean
+        # quitando reparaciones a otros clientes
+        clientes = {grande: 1}
+        for n in HISTORIALES:
+            if n in clientes:
+                continue
+            cur = conn.execute("INSERT INTO clientes (nombre, telefono, email, direccion) "
+                               "VALUES (?, '600000000', ?, 'Calle Mayor 1')",
+                               (f'Cliente bench {n}', f'bench{n}@example.com'))
+            clientes[n] = cur.lastrowid
+            conn.execute("""
+                UPDATE reparaciones SET cliente_id = ? WHERE id IN (
+                    SELECT id FROM reparaciones WHERE cliente_id NOT IN ({})
+                    ORDER BY id LIMIT ?)
+            """.format(','.join('?' * len(clientes))), (clientes[n], *clientes.values(), n))
+
+        # Reparaciones de otros clientes con un numero exacto de piezas
+        libres = [fila[0] for fila in conn.execute(
+            "SELECT id FROM reparaciones WHERE cliente_id NOT IN ({}) ORDER BY id LIMIT ?".format(
+                ','.join('?' * len(clientes))), (*clientes.values(), len(PIEZAS)))]
+        piezas = [fila[0] for fila in conn.execute(
+            "SELECT id FROM inventario_piezas ORDER BY id LIMIT ?", (max(PIEZAS),))]
+        reparaciones = dict(zip(PIEZAS, libres))
+        for n, rep_id in reparaciones.items():
+            conn.execute("DELETE FROM piezas_reparacion WHERE reparacion_id = ?", (rep_id,))
+            conn.executemany(
+                "INSERT INTO piezas_reparacion (reparacion_id, pieza_id, cantidad, fecha_uso, usuario) "
+                "VALUES (?, ?, ?, '2026-04-15 10:00:00', 'admin')",
+                [(rep_id, pieza_id, 1 + i % 3) for i, pieza_id in enumerate(piezas[:n])])
+    conn.close()
+
+    casos = {f'presupuesto_{n}': f'/reparaciones/pdf/{rep_id}' for n, rep_id in reparaciones.items()}
+    casos['factura_5'] = f'/reparaciones/pdf/{reparaciones[5]}?tipo=factura'
+    casos['ticket'] = f'/reparaciones/{reparaciones[5]}/ticket'
+    casos.update({f'historial_{n}': f'/cliente/{clientes[n]}/historial-pdf' for n in HISTORIALES})
+    return casos
+
+
+def medir(cliente, url, repeticiones, vaciar_cache):
+    """``{tiempo_ms, pico_kb, bytes}`` de una ruta que devuelve un PDF."""
+    def pedir():
+        vaciar_cache()
+        respuesta = cliente.get(url)
+        if respuesta.status_code != 200 or respuesta.mimetype != 'application/pdf':
+            raise RuntimeError(f"{url} devolvio {respuesta.status_code} {respuesta.mimetype}")
+        return respuesta.data
+
+    pedir()  # calentamiento (fuentes, imports perezosos)
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        pdf = pedir()
+        tiempos.append(time.perf_counter() - t0)
+    # tracemalloc ralentiza mucho: el pico se mide en una pasada aparte
+    tracemalloc.start()
+    pedir()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'tiempo_ms': round(min(tiempos) * 1000, 1), 'pico_kb': round(pico / 1024),
+            'bytes': len(pdf)}
+
+
+def ejecutar(casos_pedidos, repeticiones):
+    tmp = tempfile.mkdtemp(prefix='androtech_bench_pdf_')
+    ruta = os.path.join(tmp, 'bench.db')
+    cache = os.path.join(tmp, 'pdf_cache')
+    casos = preparar_bd(ruta)
+    if casos_pedidos:
+        desconocidos = set(casos_pedidos) - set(casos)
+        if desconocidos:
+            raise SystemExit(f"Casos desconocidos: {', '.join(sorted(desconocidos))}")
+        casos = {k: v for k, v in casos.items() if k in casos_pedidos}
+
+    # Antes de importar la app: PDF en este proceso y cache en el temporal
+    os.environ.update(DATABASE_PATH=ruta, PDF_WORKERS='0', PDF_CACHE_DIR=cache)
+    import db
+    db.DB_PATH = ruta
+    import logging
+    logging.getLogger('androtech').disabled = True
+    cwd = os.getcwd()
+    os.chdir(tmp)  # logs/ y demas artefactos fuera del repo
+    try:
+        import app as aplicacion
+        aplicacion.app.config['TESTING'] = True
+        cliente = aplicacion.app.test_client()
+        with cliente.session_transaction() as s:
+            s['usuario'] = 'admin'
+            s['rol'] = 'admin'
+            s['permisos'] = []
+            s['csrf_token'] = 'bench'
+
+        def vaciar_cache():
+            shutil.rmtree(cache, ignore_errors=True)
+
+        resultados = {}
+        for nombre, url in casos.items():
+            resultados[nombre] = medir(cliente, url, repeticiones, vaciar_cache)
+            r = resultados[nombre]
+            print(f"{nombre:<18}{r['tiempo_ms']:>11.1f}{r['pico_kb']:>11}{r['bytes']:>10}", flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+    return resultados
+
+
+def regresiones(resultados, baseline, umbral, margen_ms=MARGEN_MS):
+    """Lista de ``(caso, metrica, antes, ahora)`` que empeoran mas de ``umbral`` %.
+
+    ``tiempo_ms`` solo cuenta si ademas sube mas de ``margen_ms``.
+    """
+    peores = []
+    for caso, r in resultados.items():
+        for metrica in METRICAS:
+            antes = baseline.get(caso, {}).get(metrica)
+            if not antes or r[metrica] <= antes * (1 + umbral / 100):
+                continue
+            if metrica == 'tiempo_ms' and r[metrica] - antes <= margen_ms:
+                continue
+            peores.append((caso, metrica, antes, r[metrica]))
+    return peores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de los PDF con baseline")
+    parser.add_argument('--repeticiones', type=int, default=5,
+                        help='peticiones cronometradas por caso (se toma la mejor)')
+    parser.add_argument('--casos', nargs='*', default=[], help='solo estos casos')
+    parser.add_argument('--umbral', type=float, default=25,
+                        help='empeoramiento maximo admitido, en %% (default 25)')
+    parser.add_argument('--margen-ms', type=float, default=MARGEN_MS,
+                        help='subida minima del tiempo, en ms, para contar como '
+                             f'regresion (default {MARGEN_MS})')
+    parser.add_argument('--check', action='store_true',
+                        help='falla (exit 1) si alguna metrica empeora mas del umbral')
+    parser.add_argument('--actualizar-baseline', action='store_true',
+                        help='guarda los resultados como baseline')
+    args = parser.parse_args(argv)
+
+    print(f"{'caso':<18}{'tiempo ms':>11}{'pico KB':>11}{'bytes':>10}")
+    resultados = ejecutar(args.casos, args.repeticiones)
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    if args.actualizar_baseline:
+        baseline.update(resultados)
+        with open(BASELINE, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline actualizada con {len(resultados)} casos.")
+        return 0
+
+    peores = regresiones(resultados, baseline, args.umbral, args.margen_ms)
+    if peores:
+        print()
+        for caso, metrica, antes, ahora in peores:
+            print(f"[REGRESION] {caso} {metrica}: {antes} -> {ahora} "
+                  f"(+{(ahora - antes) / antes * 100:.0f}%)")
+    if args.check and peores:
+        print(f"ERROR: {len(peores)} metrica(s) empeoran mas de un {args.umbral:g}% "
+              f"(tiempo: y mas de {args.margen_ms:g} ms).")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Benchmark de los generadores PDF con estilos compartidos (``utils.pdf_toolkit``).
+
+Para cada documento (presupuesto con piezas, ticket de recogida e
+historial de un cliente) mide la mediana de:
+
+- ``render``: generar el PDF con la hoja de estilos y los ``TableStyle``
+  construidos una vez por proceso (lo que hacen ahora los generadores);
+- ``por documento``: lo mismo mas reconstruir estilos de parrafo y de
+  tabla antes de cada PDF, que es lo que hacia el codigo anterior
+  (``getSampleStyleSheet`` + estilos propios en cada llamada).
+
+La diferencia es el tiempo ahorrado por documento.  Los datos son
+sinteticos; no hace falta base de datos.
+
+Uso:
+    python scripts/bench_pdf_toolkit.py
+    python scripts/bench_pdf_toolkit.py --repeticiones 200 --reparaciones 200
+"""
+
+import argparse
+import importlib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils import pdf_generator, pdf_toolkit  # noqa: E402
+
+BASE_URL = 'https://androtech.example'
+
+
+def datos_presupuesto(n_piezas=5):
+    return {
+        'id': 1234, 'cliente_nombre': 'Maria Lopez Garcia', 'cliente_telefono': '633234395',
+        'cliente_email': 'maria@example.com', 'dispositivo': 'Samsung Galaxy S21',
+        'descripcion': 'Pantalla rota y bateria degradada', 'estado': 'En proceso',
+        'precio': 89.9, 'fecha_entrada': '2026-04-15',
+        'piezas': [{'nombre': f'Pieza {i}', 'cantidad': 1 + i % 2, 'precio_venta': 12.5 + i}
+                   for i in range(n_piezas)],
+    }
+
+
+def datos_ticket():
+    return {'id': 1234, 'cliente_nombre': 'Maria Lopez Garcia', 'dispositivo': 'Samsung Galaxy S21',
+            'estado': 'Terminado', 'fecha_entrada': '2026-04-15', 'precio': 89.9}
+
+
+def datos_historial(n):
+    cliente = {'nombre': 'Maria Lopez Garcia', 'email': 'maria@example.com',
+               'telefono': '633234395', 'direccion': 'Calle Concepcion 1, Huelva'}
+    estados = ('Pendiente', 'En proceso', 'Terminado', 'Entregado')
+    reparaciones = [
+        (i, f'Dispositivo {i}', estados[i % 4], 20.0 + i % 90,
+         'Pagado' if i % 3 else 'Pendiente', f'2026-{1 + i % 12:02d}-{1 + i % 28:02d}')
+        for i in range(n, 0, -1)]
+    resumen = {
+        'total': n,
+        'completadas': sum(1 for r in reparaciones if r[2] in ('Terminado', 'Entregado')),
+        'total_pagado': sum(r[3] for r in reparaciones if r[4] == 'Pagado'),
+    }
+    return cliente, resumen, reparaciones
+
+
+def reconstruir_estilos():
+    """Coste de construir estilos de parrafo, de tabla y metricas (antes, en cada PDF)."""
+    importlib.reload(pdf_toolkit)
+
+
+def _cronometrar(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def medir(fn, repeticiones):
+    return statistics.median(_cronometrar(fn) for _ in range(repeticiones)) * 1000
+
+
+def comparar(fn, repeticiones):
+    """(render, por documento) en ms; se alternan para que el ruido afecte a ambos."""
+    render, antes = [], []
+    for _ in range(repeticiones):
+        render.append(_cronometrar(fn))
+        antes.append(_cronometrar(lambda: (reconstruir_estilos(), fn())))
+    return statistics.median(render) * 1000, statistics.median(antes) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de estilos PDF compartidos")
+    parser.add_argument('--repeticiones', type=int, default=100)
+    parser.add_argument('--reparaciones', type=int, default=50,
+                        help="Reparaciones del historial sintetico")
+    args = parser.parse_args(argv)
+
+    presupuesto = datos_presupuesto()
+    ticket = datos_ticket()
+    cliente, resumen, reparaciones = datos_historial(args.reparaciones)
+    documentos = [
+        ('presupuesto (5 piezas)',
+         lambda: pdf_generator.generar_presupuesto_pdf(presupuesto, base_url=BASE_URL)),
+        ('ticket de recogida',
+         lambda: pdf_generator.generar_ticket_recogida_pdf(ticket, BASE_URL)),
+        (f'historial ({args.reparaciones} rep.)',
+         lambda: pdf_generator.generar_historial_cliente_pdf(cliente, resumen, reparaciones)),
+    ]
+
+    # Calentamiento: primer PDF del proceso (fuentes, imports perezosos)
+    for _, fn in documentos:
+        fn()
+
+    estilos = medir(reconstruir_estilos, args.repeticiones)
+    print(f"Construccion de estilos: {estilos:.3f} ms (mediana de {args.repeticiones})\n")
+    print(f"{'documento':<26}{'render ms':>11}{'por doc. ms':>13}{'ahorro':>9}")
+    for nombre, fn in documentos:
+        render, antes = comparar(fn, args.repeticiones)
+        ahorro = (antes - render) / antes * 100 if antes else 0
+        print(f"{nombre:<26}{render:>11.2f}{antes:>13.2f}{ahorro:>8.1f}%")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Benchmark del envio de emails: una sesion SMTP por correo o reutilizada.
+
+Levanta un servidor SMTP de pega en local (AUTH PLAIN/LOGIN, sin TLS) que
+simula la red con ``--rtt`` ms antes de cada respuesta y ``--handshake``
+ms extra al conectar (TCP + TLS de un proveedor real), y envia
+``--correos`` notificaciones de estado sinteticas de tres formas:
+
+- ``por_correo``: lo que se hacia antes, ``abrir_smtp`` + ``sendmail`` +
+  ``quit`` para cada correo;
+- ``reutilizada``: una :class:`utils.email_outbox.SesionSmtp`;
+- ``cola``: ``enviar_pendientes`` sobre una ``email_outbox`` temporal con
+  los correos ya encolados (incluye el coste de la BD).
+
+Con ``--cortar-cada K`` el servidor cierra la conexion tras K correos para
+comprobar que la sesion reconecta sin perder ninguno.
+
+Uso:
+    python scripts/bench_smtp.py
+    python scripts/bench_smtp.py --correos 200 --rtt 20 --handshake 60 --cortar-cada 50
+"""
+
+import argparse
+import os
+import socketserver
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from email import policy
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from migrations import v013_email_outbox, v014_email_agrupar  # noqa: E402
+from utils import email_outbox  # noqa: E402
+
+REMITENTE = 'taller@androtech.example'
+
+
+class ServidorFalso(socketserver.ThreadingTCPServer):
+    """SMTP minimo que cuenta conexiones y correos recibidos."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, rtt, handshake, cortar_cada):
+        super().__init__(('127.0.0.1', 0), _Sesion)
+        self.rtt = rtt / 1000
+        self.handshake = handshake / 1000
+        self.cortar_cada = cortar_cada
+        self.conexiones = 0
+        self.recibidos = 0
+        self._cerrojo = threading.Lock()
+
+    def reiniciar(self):
+        with self._cerrojo:
+            self.conexiones = self.recibidos = 0
+
+
+class _Sesion(socketserver.StreamRequestHandler):
+
+    def responder(self, *lineas):
+        time.sleep(self.server.rtt)
+        self.wfile.write(''.join(f'{linea}\r\n' for linea in lineas).encode())
+
+    def handle(self):
+        servidor = self.server
+        with servidor._cerrojo:
+            servidor.conexiones += 1
+        time.sleep(servidor.handshake)
+        self.responder('220 bench ESMTP')
+        en_sesion = 0
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            orden = linea.decode().strip().upper()
+            if orden.startswith(('EHLO', 'HELO')):
+                self.responder('250-bench', '250 AUTH PLAIN LOGIN')
+            elif orden.startswith('AUTH PLAIN'):
+                if len(orden.split()) == 2:
+                    self.responder('334 ')
+                    self.rfile.readline()
+                self.responder('235 ok')
+            elif orden.startswith('AUTH LOGIN'):
+                self.responder('334 VXNlcm5hbWU6')
+                self.rfile.readline()
+                self.responder('334 UGFzc3dvcmQ6')
+                self.rfile.readline()
+                self.responder('235 ok')
+            elif orden == 'DATA':
+                self.responder('354 adelante')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with servidor._cerrojo:
+                    servidor.recibidos += 1
+                self.responder('250 encolado')
+                en_sesion += 1
+                if servidor.cortar_cada and en_sesion >= servidor.cortar_cada:
+                    return  # corte sin aviso, como un servidor que recicla conexiones
+            elif orden.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.responder('250 ok')
+            elif orden == 'QUIT':
+                self.responder('221 adios')
+                return
+            else:
+                self.responder('502 no implementado')
+
+
+def correo(n):
+    """Bytes de una notificacion de cambio de estado (~4 KB de HTML)."""
+    msg = EmailMessage()
+    msg['Subject'] = f'Tu reparacion #{n} ha cambiado de estado'
+    msg['From'] = REMITENTE
+    msg['To'] = f'cliente{n}@example.com'
+    msg.set_content('Tu reparacion ha cambiado de estado.')
+    msg.add_alternative('<html><body>' + '<p>Estado: Terminado</p>' * 180 + '</body></html>',
+                        subtype='html')
+    return msg['To'], msg.as_bytes(policy=policy.SMTP)
+
+
+def por_correo(config, correos):
+    for destinatario, datos in correos:
+        smtp = email_outbox.abrir_smtp(config)
+        try:
+            smtp.sendmail(REMITENTE, [destinatario], datos)
+        finally:
+            email_outbox.cerrar_smtp(smtp)
+
+
+def reutilizada(config, correos):
+    with email_outbox.SesionSmtp(config) as sesion:
+        for destinatario, datos in correos:
+            sesion.enviar(REMITENTE, [destinatario], datos)
+
+
+def cola(config, correos):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'outbox.db'))
+        conn.row_factory = sqlite3.Row
+        v013_email_outbox.upgrade(conn)
+        v014_email_agrupar.upgrade(conn)
+        ahora = time.time()
+        conn.executemany("""
+            INSERT INTO email_outbox (tipo, remitente, destinatario, asunto, mensaje,
+                                      creado_en, proximo_intento)
+            VALUES ('estado', ?, ?, 'bench', ?, ?, ?)
+        """, [(REMITENTE, destinatario, datos, ahora, ahora) for destinatario, datos in correos])
+        conn.commit()
+        with email_outbox.SesionSmtp(config) as sesion:
+            enviados = email_outbox.enviar_pendientes(conn, sesion)
+        conn.close()
+    if enviados != len(correos):
+        raise RuntimeError(f"cola: enviados {enviados} de {len(correos)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de sesiones SMTP")
+    parser.add_argument('--correos', type=int, default=200)
+    parser.add_argument('--rtt', type=float, default=5, help='ms antes de cada respuesta')
+    parser.add_argument('--handshake', type=float, default=20,
+                        help='ms extra al abrir cada conexion (TCP + TLS)')
+    parser.add_argument('--cortar-cada', type=int, default=0,
+                        help='el servidor cierra la conexion tras K correos')
+    args = parser.parse_args(argv)
+
+    servidor = ServidorFalso(args.rtt, args.handshake, args.cortar_cada)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    config = {'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': servidor.server_address[1],
+              'MAIL_USE_TLS': False, 'MAIL_USERNAME': 'bench', 'MAIL_PASSWORD': 'bench'}
+    correos = [correo(n) for n in range(args.correos)]
+
+    print(f"{args.correos} correos, rtt {args.rtt:g} ms, handshake {args.handshake:g} ms"
+          + (f", corte cada {args.cortar_cada}" if args.cortar_cada else '') + "\n")
+    print(f"{'modo':<13}{'segundos':>10}{'correos/s':>11}{'conexiones':>12}{'recibidos':>11}")
+    fallos = 0
+    for nombre, fn in (('por_correo', por_correo), ('reutilizada', reutilizada), ('cola', cola)):
+        servidor.reiniciar()
+        t0 = time.perf_counter()
+        fn(config, correos)
+        segundos = time.perf_counter() - t0
+        if servidor.recibidos != args.correos:
+            fallos += 1
+        print(f"{nombre:<13}{segundos:>10.2f}{args.correos / segundos:>11.1f}"
+              f"{servidor.conexiones:>12}{servidor.recibidos:>11}")
+    servidor.shutdown()
+    if fallos:
+        print("\nERROR: no han llegado todos los correos.")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Tiempo y tamano del ticket de recogida: ESC/POS y texto frente al PDF.
+
+Genera el mismo ticket (datos sinteticos) en los tres formatos y muestra
+la mediana por ticket y los bytes.  Con ``--impresora`` el ticket ESC/POS
+se envia tambien a esa impresora (una ruta de fichero hace de impresora
+de pruebas; ``tcp://host:9100`` para una de red) y con ``--texto`` se
+muestra la version en texto plano.
+
+Uso:
+    python scripts/bench_ticket_termico.py
+    python scripts/bench_ticket_termico.py --ancho 58 --texto
+    python scripts/bench_ticket_termico.py --impresora /tmp/impresora.bin
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils import ticket_termico  # noqa: E402
+from utils.pdf_generator import generar_ticket_recogida_pdf  # noqa: E402
+
+BASE_URL = 'https://androtech.example'
+REPARACION = {
+    'id': 1234, 'cliente_nombre': 'María López García', 'dispositivo': 'Samsung Galaxy S21 Ultra 5G',
+    'estado': 'Terminado', 'fecha_entrada': '2026-04-15', 'precio': 89.9,
+}
+
+
+def medir(fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = fn()
+        tiempos.append(time.perf_counter() - t0)
+    return statistics.median(tiempos), resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del ticket termico")
+    parser.add_argument('--ancho', type=int, default=80, choices=sorted(ticket_termico.COLUMNAS))
+    parser.add_argument('--repeticiones', type=int, default=200)
+    parser.add_argument('--impresora', help="Ruta o tcp://host:puerto donde enviar el ticket")
+    parser.add_argument('--texto', action='store_true', help="Mostrar el ticket en texto plano")
+    args = parser.parse_args(argv)
+
+    formatos = [
+        ('escpos', lambda: ticket_termico.ticket_escpos(REPARACION, BASE_URL, args.ancho)),
+        ('texto', lambda: ticket_termico.ticket_texto(REPARACION, BASE_URL, args.ancho).encode('utf-8')),
+        ('pdf', lambda: generar_ticket_recogida_pdf(REPARACION, BASE_URL).getvalue()),
+    ]
+    print(f"{'formato':<10}{'us/ticket':>12}{'bytes':>9}")
+    for nombre, fn in formatos:
+        fn()  # calentamiento
+        repeticiones = args.repeticiones if nombre != 'pdf' else max(args.repeticiones // 10, 5)
+        segundos, datos = medir(fn, repeticiones)
+        print(f"{nombre:<10}{segundos * 1e6:>12.1f}{len(datos):>9}")
+
+    if args.texto:
+        print()
+        print(ticket_termico.ticket_texto(REPARACION, BASE_URL, args.ancho), end='')
+
+    if args.impresora:
+        destino = args.impresora
+        if destino.startswith('tcp://'):
+            host, _, puerto = destino[len('tcp://'):].partition(':')
+            impresora = ticket_termico.ImpresoraRed(host, int(puerto or 9100))
+        else:
+            impresora = ticket_termico.ImpresoraFichero(destino)
+        impresora.imprimir(ticket_termico.ticket_escpos(REPARACION, BASE_URL, args.ancho))
+        print(f"\nTicket ESC/POS enviado a {destino}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Comprueba que la paginacion por cursor de /reparaciones llega a todas las filas.
+
+Genera una BD sintetica (scripts/datos_sinteticos.py), deja sin fecha de
+entrada una de cada ``--cada-nula`` reparaciones y, para cada filtro,
+recorre ``/reparaciones`` con el test client de Flask siguiendo el cursor
+``siguiente`` hasta el final y despues el ``anterior`` de vuelta al
+principio.  Termina con codigo 1 si algun recorrido repite filas, se deja
+alguna o no coincide con el ``COUNT(*)`` del mismo filtro en SQL.
+
+Uso:
+    python scripts/check_paginacion.py
+    python scripts/check_paginacion.py --reparaciones 2000 --cada-nula 3
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Filtro -> (query string, condicion SQL equivalente, parametros)
+FILTROS = {
+    'sin filtro': ('', '1', ()),
+    'estado': ('estado=Pendiente', "estado = 'Pendiente'", ()),
+    'cliente': ('cliente_id=1', 'cliente_id = 1', ()),
+    'precio': ('precio_min=50', 'precio >= 50', ()),
+    'fechas': ('desde=2000-01-01&hasta=2100-01-01',
+               "fecha_entrada >= '2000-01-01' AND fecha_entrada <= '2100-01-01'", ()),
+}
+
+_RE_ID = re.compile(r'>#(\d+)</span>')
+_RE_CURSOR = re.compile(r'href="\?cursor=([^"&]*)')
+
+
+def _pagina(cliente, filtro, cursor):
+    url = '/reparaciones?' + '&'.join(p for p in (f'cursor={cursor}' if cursor else '', filtro) if p)
+    respuesta = cliente.get(url)
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"{url} devolvio {respuesta.status_code}")
+    html = respuesta.get_data(as_text=True)
+    anterior, siguiente = _RE_CURSOR.findall(html)
+    return [int(i) for i in _RE_ID.findall(html)], anterior, siguiente
+
+
+def recorrer(cliente, filtro, max_paginas):
+    """Ids en orden hacia delante y ids del recorrido de vuelta (en orden de listado)."""
+    paginas = []
+    cursor = None
+    for _ in range(max_paginas):
+        ids, _, siguiente = _pagina(cliente, filtro, cursor)
+        paginas.append(ids)
+        if not siguiente:
+            break
+        cursor = siguiente
+    else:
+        raise RuntimeError(f"'{filtro}': mas de {max_paginas} paginas, posible bucle")
+
+    # De vuelta desde la ultima pagina con el cursor anterior
+    vuelta = [paginas[-1]]
+    _, anterior, _ = _pagina(cliente, filtro, cursor)
+    while anterior:
+        ids, anterior, _ = _pagina(cliente, filtro, anterior)
+        vuelta.insert(0, ids)
+    return [i for p in paginas for i in p], [i for p in vuelta for i in p]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recorre todos los cursores de /reparaciones")
+    parser.add_argument('--reparaciones', type=int, default=400)
+    parser.add_argument('--cada-nula', type=int, default=4,
+                        help='una de cada N reparaciones queda con fecha_entrada NULL')
+    args = parser.parse_args(argv)
+
+    from scripts.datos_sinteticos import generar_bd
+
+    tmp = tempfile.mkdtemp(prefix='androtech_check_paginacion_')
+    ruta = generar_bd(os.path.join(tmp, 'check.db'), n_reparaciones=args.reparaciones,
+                      cliente_grande=args.reparaciones // 10)
+    conn = sqlite3.connect(ruta)
+    with conn:
+        conn.execute("UPDATE reparaciones SET fecha_entrada = NULL WHERE id % ? = 0", (args.cada_nula,))
+
+    os.environ.update(DATABASE_PATH=ruta, PDF_WORKERS='0')
+    import db
+    db.DB_PATH = ruta
+    import logging
+    logging.getLogger('androtech').disabled = True
+    cwd = os.getcwd()
+    os.chdir(tmp)  # logs/ fuera del repo
+    errores = 0
+    try:
+        import app as aplicacion
+        aplicacion.app.config['TESTING'] = True
+        cliente = aplicacion.app.test_client()
+        with cliente.session_transaction() as s:
+            s['usuario'] = 'admin'
+            s['rol'] = 'admin'
+            s['permisos'] = []
+
+        print(f"{'filtro':<12}{'COUNT(*)':>10}{'adelante':>10}{'vuelta':>8}  resultado")
+        for nombre, (filtro, condicion, params) in FILTROS.items():
+            esperados = {fila[0] for fila in conn.execute(
+                f"SELECT id FROM reparaciones WHERE {condicion}", params)}
+            adelante, vuelta = recorrer(cliente, filtro, len(esperados) + 2)
+            fallos = []
+            if len(adelante) != len(set(adelante)):
+                fallos.append('filas repetidas')
+            if set(adelante) != esperados:
+                fallos.append(f'faltan {len(esperados - set(adelante))}')
+            if vuelta != adelante:
+                fallos.append('la vuelta no coincide')
+            errores += bool(fallos)
+            print(f"{nombre:<12}{len(esperados):>10}{len(adelante):>10}{len(vuelta):>8}  "
+                  f"{', '.join(fallos) or 'ok'}")
+    finally:
+        conn.close()
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if errores:
+        print(f"\nERROR: {errores} filtro(s) con la paginacion incompleta.")
+        return 1
+    print("\nTodos los cursores llegan a todas las filas.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
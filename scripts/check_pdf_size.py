@@ -0,0 +1,55 @@
+"""Comprueba que los presupuestos y facturas tipicos no pasan de un tamano.
+
+La factura va adjunta al email de confirmacion de pago
+(``EmailService.send_payment_confirmation``), donde ocupa un tercio mas
+por el base64.  Genera presupuestos y facturas con 0, 5 y 10 piezas
+(datos sinteticos, sin base de datos) y termina con codigo 1 si alguno
+pasa de ``--max-kb``.
+
+Uso:
+    python scripts/check_pdf_size.py
+    python scripts/check_pdf_size.py --max-kb 8 --piezas 0 5 10 50
+"""
+
+import argparse
+import base64
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scripts.bench_pdf_toolkit import BASE_URL, datos_presupuesto  # noqa: E402
+from utils.pdf_generator import generar_presupuesto_pdf  # noqa: E402
+
+# Tamano maximo de una factura tipica (hasta 10 piezas)
+MAX_KB = 6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tamano maximo de presupuestos y facturas")
+    parser.add_argument('--max-kb', type=float, default=MAX_KB)
+    parser.add_argument('--piezas', type=int, nargs='*', default=[0, 5, 10])
+    args = parser.parse_args(argv)
+
+    print(f"{'documento':<21}{'bytes':>8}{'en email':>10}")
+    excedidos = 0
+    for tipo in ('presupuesto', 'factura'):
+        for n in args.piezas:
+            pdf = generar_presupuesto_pdf(datos_presupuesto(n), tipo_documento=tipo,
+                                          base_url=BASE_URL).getvalue()
+            en_email = len(base64.encodebytes(pdf))
+            marca = ''
+            if len(pdf) > args.max_kb * 1024:
+                excedidos += 1
+                marca = '  EXCEDE'
+            print(f"{f'{tipo} ({n} p.)':<21}{len(pdf):>8}{en_email:>10}{marca}")
+
+    if excedidos:
+        print(f"\nERROR: {excedidos} documento(s) pasan de {args.max_kb:g} KB.")
+        return 1
+    print(f"\nTodos por debajo de {args.max_kb:g} KB.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,60 +1,24 @@
-import sqlite3
-import os
-
-# Ruta correcta
-db_path = "database/andro_tech.db"
-
-# Crear carpeta si no existe
-os.makedirs("database", exist_ok=True)
+"""Crea (o actualiza) la base de datos aplicando todas las migraciones.
 
-# Si quieres borrar la base anterior para recrearla desde cero, descomenta esto:
-# if os.path.exists(db_path):
-#     os.remove(db_path)
-
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
+Equivale a ``python -m migrations``; se mantiene por compatibilidad con
+la guia de instalacion.
+"""
+import os
+import sys
 
-# Tabla de clientes
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS clientes (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    nombre TEXT NOT NULL,
-    telefono TEXT,
-    email TEXT,
-    direccion TEXT
-);
-""")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-# Tabla de reparaciones
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS reparaciones (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    cliente_id INTEGER,
-    dispositivo TEXT NOT NULL,
-    descripcion TEXT,
-    estado TEXT DEFAULT 'Pendiente',
-    fecha_entrada TEXT,
-    fecha_salida TEXT,
-    precio REAL,
-    tipo_documento TEXT DEFAULT 'presupuesto',
-    estado_pago TEXT DEFAULT 'Pendiente',
-    fecha_pago TEXT,
-    metodo_pago TEXT,
-    FOREIGN KEY (cliente_id) REFERENCES clientes(id)
-);
-""")
+from db import get_db, DB_PATH
+from migrations import aplicar_migraciones, version_actual
 
-# Tabla usuarios (para login futuro)
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS usuarios (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    usuario TEXT NOT NULL UNIQUE,
-    contraseña TEXT NOT NULL,
-    rol TEXT DEFAULT 'tecnico'
-);
-""")
+# Crear carpeta si no existe
+os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
 
-conn.commit()
+conn = get_db()
+aplicadas = aplicar_migraciones(conn)
+version = version_actual(conn)
 conn.close()
 
-print("Base de datos creada correctamente ✔")
+if aplicadas:
+    print(f"Migraciones aplicadas: {', '.join(str(v) for v in aplicadas)}")
+print(f"Base de datos lista en {DB_PATH} (esquema v{version}) ✔")
@@ -0,0 +1,185 @@
+"""Generador de una BD sintetica a escala para diagnosticos y benchmarks.
+
+Crea el esquema con las migraciones y rellena clientes, reparaciones,
+historial, fotos, notas, inventario y piezas usadas con datos aleatorios
+reproducibles (semilla fija).  Lo usan los scripts de analisis de planes
+de consulta y de benchmark.
+
+Uso:
+    python scripts/datos_sinteticos.py RUTA_BD --reparaciones 100000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from werkzeug.security import generate_password_hash
+
+ESTADOS = ('Pendiente', 'En proceso', 'Terminado', 'Entregado')
+DISPOSITIVOS = ('iPhone 12', 'iPhone 13', 'Samsung Galaxy A52', 'Xiaomi Redmi Note 10',
+                'MacBook Air', 'iPad Pro', 'Huawei P30', 'HP Pavilion', 'OnePlus 9', 'Lenovo IdeaPad')
+AVERIAS = ('Pantalla rota', 'Bateria agotada', 'No carga', 'Camara no funciona',
+           'Teclado no responde', 'Se apaga solo', 'Va muy lento', 'Altavoz sin sonido')
+NOMBRES = ('Juan', 'María', 'Carlos', 'Ana', 'Pedro', 'Lucía', 'José', 'Carmen', 'Ángel', 'Sofía')
+APELLIDOS = ('Pérez', 'García', 'López', 'Martínez', 'Sánchez', 'Gómez', 'Fernández', 'Núñez')
+METODOS = ('Efectivo', 'Bizum', 'Tarjeta (Stripe)')
+CATEGORIAS = ('Pantallas', 'Baterias', 'Accesorios', 'Consumibles')
+
+LOTE = 5000
+
+
+def _fmt(dt):
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _lotes(filas, tam=LOTE):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tam:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def generar_bd(ruta, n_reparaciones=10000, n_clientes=None, n_piezas=200,
+               semilla=2026, ahora=None, cliente_grande=0):
+    """Crea una BD en ``ruta`` con ``n_reparaciones`` reparaciones.
+
+    ``cliente_grande`` reserva ese numero de reparaciones para el cliente 1
+    (cliente corporativo con historial muy largo).  Devuelve la ruta.
+    """
+    from migrations import aplicar_migraciones
+
+    rnd = random.Random(semilla)
+    ahora = ahora or datetime.now()
+    n_clientes = n_clientes or max(10, n_reparaciones // 4)
+
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    conn = sqlite3.connect(ruta)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    aplicar_migraciones(conn)
+
+    conn.execute(
+        "INSERT OR IGNORE INTO usuarios (usuario, contraseña, rol) VALUES (?, ?, ?)",
+        ('admin', generate_password_hash('admin123'), 'admin')
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO usuarios (usuario, contraseña, rol) VALUES (?, ?, ?)",
+        ('tecnico1', generate_password_hash('Tecnico123'), 'tecnico')
+    )
+
+    def clientes():
+        for i in range(1, n_clientes + 1):
+            nombre = f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {i}"
+            yield (nombre, f"6{rnd.randint(10000000, 99999999)}",
+                   f"cliente{i}@example.com", f"Calle {rnd.randint(1, 200)}, Huelva")
+
+    for lote in _lotes(clientes()):
+        conn.executemany(
+            "INSERT INTO clientes (nombre, telefono, email, direccion) VALUES (?, ?, ?, ?)", lote)
+
+    def piezas():
+        for i in range(1, n_piezas + 1):
+            coste = round(rnd.uniform(2, 80), 2)
+            yield (f"Pieza {rnd.choice(DISPOSITIVOS)} {i}", rnd.choice(CATEGORIAS),
+                   rnd.randint(0, 40), 5, coste, round(coste * 1.8, 2),
+                   'ElectroParts', _fmt(ahora))
+
+    conn.executemany(
+        """INSERT INTO inventario_piezas (nombre, categoria, cantidad, cantidad_minima,
+               precio_coste, precio_venta, proveedor, fecha_actualizacion)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", list(piezas()))
+
+    def reparaciones():
+        for i in range(1, n_reparaciones + 1):
+            cliente_id = 1 if i <= cliente_grande else rnd.randint(1, n_clientes)
+            entrada = ahora - timedelta(days=rnd.randint(0, 730), seconds=rnd.randint(0, 86399))
+            estado = rnd.choice(ESTADOS)
+            precio = None if rnd.random() < 0.1 else round(rnd.uniform(20, 300), 2)
+            pagado = precio is not None and estado in ('Terminado', 'Entregado') and rnd.random() < 0.8
+            salida = _fmt(entrada + timedelta(days=rnd.randint(1, 20))) if estado in ('Terminado', 'Entregado') else None
+            yield (cliente_id, rnd.choice(DISPOSITIVOS), rnd.choice(AVERIAS), estado,
+                   _fmt(entrada), salida, precio, 'presupuesto',
+                   'Pagado' if pagado else 'Pendiente',
+                   salida if pagado else None,
+                   rnd.choice(METODOS) if pagado else None)
+
+    for lote in _lotes(reparaciones()):
+        conn.executemany(
+            """INSERT INTO reparaciones (cliente_id, dispositivo, descripcion, estado,
+                   fecha_entrada, fecha_salida, precio, tipo_documento, estado_pago,
+                   fecha_pago, metodo_pago)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", lote)
+
+    def historial():
+        # Por tramos de id para no mantener un cursor abierto mientras se inserta
+        for desde in range(1, n_reparaciones + 1, LOTE):
+            filas = conn.execute(
+                "SELECT id, estado, fecha_entrada FROM reparaciones WHERE id BETWEEN ? AND ?",
+                (desde, desde + LOTE - 1)).fetchall()
+            for rid, estado, entrada in filas:
+                t = datetime.strptime(entrada, "%Y-%m-%d %H:%M:%S")
+                anterior = None
+                for paso in ESTADOS[:ESTADOS.index(estado) + 1]:
+                    yield (rid, anterior, paso, _fmt(t), rnd.choice(('admin', 'tecnico1')))
+                    anterior = paso
+                    t += timedelta(days=rnd.randint(0, 5))
+
+    for lote in _lotes(historial()):
+        conn.executemany(
+            """INSERT INTO reparaciones_historial
+                   (reparacion_id, estado_anterior, estado_nuevo, fecha_cambio, usuario)
+               VALUES (?, ?, ?, ?, ?)""", lote)
+
+    def detalles():
+        for rid in range(1, n_reparaciones + 1):
+            if rnd.random() < 0.3:
+                yield ('nota', (rid, 'admin', f"Nota interna {rnd.choice(AVERIAS).lower()}",
+                                _fmt(ahora), rnd.randint(0, 1)))
+            if rnd.random() < 0.2:
+                yield ('foto', (rid, f"{rid}_foto.jpg", '', _fmt(ahora), 'admin'))
+            if rnd.random() < 0.4:
+                yield ('pieza', (rid, rnd.randint(1, n_piezas), rnd.randint(1, 3), _fmt(ahora), 'admin'))
+
+    sql = {
+        'nota': "INSERT INTO notas_reparacion (reparacion_id, usuario, contenido, fecha_creacion, es_importante) VALUES (?, ?, ?, ?, ?)",
+        'foto': "INSERT INTO fotos_reparacion (reparacion_id, filename, descripcion, fecha_subida, subido_por) VALUES (?, ?, ?, ?, ?)",
+        'pieza': "INSERT INTO piezas_reparacion (reparacion_id, pieza_id, cantidad, fecha_uso, usuario) VALUES (?, ?, ?, ?, ?)",
+    }
+    for lote in _lotes(detalles()):
+        for tipo in sql:
+            filas = [f for t, f in lote if t == tipo]
+            if filas:
+                conn.executemany(sql[tipo], filas)
+
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return ruta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera una BD sintetica de AndroTech")
+    parser.add_argument("ruta")
+    parser.add_argument("--reparaciones", type=int, default=10000)
+    parser.add_argument("--clientes", type=int, default=None)
+    parser.add_argument("--cliente-grande", type=int, default=0,
+                        help="reparaciones asignadas al cliente 1")
+    args = parser.parse_args(argv)
+    if os.path.exists(args.ruta):
+        parser.error(f"{args.ruta} ya existe")
+    generar_bd(args.ruta, args.reparaciones, args.clientes, cliente_grande=args.cliente_grande)
+    print(f"BD sintetica creada en {args.ruta} ({args.reparaciones} reparaciones)")
+
+
+if __name__ == '__main__':
+    main()
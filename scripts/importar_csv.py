@@ -0,0 +1,73 @@
+"""Importa clientes, reparaciones o piezas desde un CSV (ver :mod:`importacion`).
+
+Uso:
+    python scripts/importar_csv.py clientes clientes.csv
+    python scripts/importar_csv.py reparaciones reparaciones.csv --simular
+    python scripts/importar_csv.py piezas stock.csv --rechazos rechazadas.csv
+
+Las reparaciones se asocian a clientes ya existentes, asi que conviene
+importar antes los clientes.  Con ``--simular`` se valida todo y no se
+guarda nada.
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db  # noqa: E402
+from audit import registrar_auditoria  # noqa: E402
+from importacion import TIPOS, importar  # noqa: E402
+from migrations import aplicar_migraciones  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importacion masiva desde CSV")
+    parser.add_argument('tipo', choices=sorted(TIPOS))
+    parser.add_argument('fichero')
+    parser.add_argument('--db', help="Ruta de la BD (por defecto DATABASE_PATH)")
+    parser.add_argument('--simular', action='store_true', help="Validar sin guardar")
+    parser.add_argument('--rechazos', help="CSV donde escribir las filas rechazadas")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.DB_PATH = args.db
+    conn = db.open_db()
+    aplicar_migraciones(conn)
+    try:
+        with open(args.fichero, encoding='utf-8-sig', newline='') as f:
+            resultado = importar(conn, args.tipo, f, simular=args.simular)
+    except ValueError as e:
+        conn.close()
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if not args.simular:
+        registrar_auditoria(conn, 'importacion_csv', 'cli', {
+            'tipo': args.tipo, 'fichero': os.path.basename(args.fichero),
+            'insertadas': resultado['insertadas'], 'rechazadas': len(resultado['rechazadas']),
+        })
+    conn.close()
+
+    rechazadas = resultado['rechazadas']
+    print(f"{'Simulacion' if args.simular else 'Importacion'} de {args.tipo}: "
+          f"{resultado['leidas']} filas leidas, {resultado['insertadas']} insertadas, "
+          f"{resultado['duplicadas']} duplicadas, {len(rechazadas) - resultado['duplicadas']} con errores "
+          f"({resultado['segundos']} s)")
+    if args.rechazos:
+        with open(args.rechazos, 'w', encoding='utf-8-sig', newline='') as f:
+            w = csv.writer(f, delimiter=';')
+            w.writerow(['Linea', 'Motivo'])
+            w.writerows(rechazadas)
+    else:
+        for linea, motivo in rechazadas[:20]:
+            print(f"  linea {linea}: {motivo}")
+        if len(rechazadas) > 20:
+            print(f"  ... y {len(rechazadas) - 20} mas (usa --rechazos para verlas todas)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
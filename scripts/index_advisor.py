@@ -0,0 +1,279 @@
+"""Asesor de indices y control de regresiones de planes de consulta.
+
+Genera una BD sintetica a escala, recorre las rutas de app.py con el test
+client de Flask recogiendo todo el SQL emitido (trace callback de db.py),
+ejecuta ``EXPLAIN QUERY PLAN`` sobre cada consulta y reporta los ``SCAN``
+sobre tablas grandes junto con un indice sugerido.
+
+Los recorridos completos aceptados (listados sin filtro, agregados sobre
+toda la tabla...) se guardan en ``query_plan_baseline.json``.  Con
+``--check`` el script termina con codigo 1 si aparece un SCAN nuevo que no
+esta en la baseline, de forma que sirve como comprobacion en CI:
+
+    python scripts/index_advisor.py --check
+    python scripts/index_advisor.py --actualizar-baseline
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_plan_baseline.json')
+
+# Rutas GET que se recorren (con ids/filtros representativos)
+RUTAS = [
+    '/', '/dashboard', '/clientes', '/reparaciones', '/reparaciones?page=50',
+    '/reparaciones?estado=Pendiente', '/reparaciones?cliente_id=7',
+    '/reparaciones?q=Garc', '/reparaciones?q=123',
+    '/reparaciones?desde=2026-01-01&hasta=2026-03-01',
+    '/reparaciones?precio_min=50&precio_max=100',
+    '/cliente/historial', '/cliente/historial?page=20',
+    '/cliente/historial?estado=Terminado', '/cliente/historial?cliente_id=7',
+    '/cliente/1/historial-pdf', '/buscar?q=iphone', '/buscar?q=42',
+    '/exportar/reparaciones.csv', '/exportar/clientes.csv',
+    '/export/reparaciones?estado=Pendiente',
+    '/reparaciones/editar/10', '/reparaciones/10/firma', '/reparaciones/10/ticket',
+    '/reparaciones/pdf/10', '/reparaciones/pdf/10?tipo=factura',
+    '/reparaciones/facturas-lote?desde=2026-01-01&hasta=2026-01-07',
+    '/inventario', '/inventario?q=iphone&categoria=Pantallas', '/inventario/editar/3',
+    '/api/inventario/buscar?q=Pieza', '/api/calendario/eventos',
+    '/admin/usuarios', '/admin/roles', '/admin/roles/editar/1',
+    '/admin/solicitudes', '/admin/solicitudes?estado=pendiente', '/admin/sistema',
+    '/consulta?id=10',
+]
+
+# Formularios POST de solo lectura
+POSTS = [
+    ('/mis-reparaciones', {'email': 'cliente7@example.com'}),
+    ('/consulta', {'id_reparacion': '10'}),
+]
+
+_RE_FROM = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|LEFT\b|JOIN\b|INNER\b|ORDER\b|GROUP\b|LIMIT\b)(\w+))?', re.I)
+# Palabras que el patron de predicados confunde con columnas; ``id`` ya es el rowid
+_NO_COLUMNAS = {'id', 'rowid', 'select', 'and', 'or', 'not', 'null', 'case', 'when', 'then', 'else'}
+_RE_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalizar(sql):
+    """Huella de una consulta: literales sustituidos por ? y espacios colapsados."""
+    return ' '.join(_RE_LITERAL.sub('?', sql).split())
+
+
+def huella(sql, tabla):
+    return hashlib.sha1(f"{normalizar(sql)}|{tabla}".encode('utf-8')).hexdigest()[:16]
+
+
+def _alias(sql):
+    """Mapa alias -> tabla real a partir de las clausulas FROM/JOIN."""
+    mapa = {}
+    for tabla, alias in _RE_FROM.findall(sql):
+        mapa[tabla] = tabla
+        if alias:
+            mapa[alias] = tabla
+    return mapa
+
+
+def sugerir_indice(sql, tabla, alias):
+    """Indice candidato con las columnas de ``tabla`` usadas en predicados.
+
+    Primero columnas comparadas por igualdad, despues rangos y por ultimo
+    ORDER BY.  Devuelve None si la consulta no filtra esa tabla (recorrido
+    inherente: listado o agregado completo).
+    """
+    nombres = {a for a, t in alias.items() if t == tabla}
+    unica = len(set(alias.values())) == 1
+    partes = re.split(r'\bWHERE\b', sql, maxsplit=1, flags=re.I)
+    if len(partes) < 2:
+        return None
+    condiciones, _, orden = (re.split(r'\b(ORDER\s+BY)\b', partes[1], maxsplit=1, flags=re.I)
+                             + ['', ''])[:3]
+
+    def propia(cualif):
+        return cualif in nombres if cualif else unica
+
+    igualdad, rango = [], []
+    patron = r'(LOWER\()?(?:\b(\w+)\.)?\b(\w+)\)?\s*(=|>=|<=|<|>|\bIN\b)'
+    for funcion, cualif, col, op in re.findall(patron, condiciones, flags=re.I):
+        if not propia(cualif) or col.lower() in _NO_COLUMNAS:
+            continue
+        expr = f"LOWER({col})" if funcion else col
+        if expr in igualdad or expr in rango:
+            continue
+        (igualdad if op.upper() in ('=', 'IN') else rango).append(expr)
+    if not igualdad and not rango:
+        return None
+    columnas = igualdad + rango
+    if not rango:
+        for cualif, col in re.findall(r'(?:\b(\w+)\.)?\b(\w+)\s+(?:ASC|DESC)\b', orden, flags=re.I):
+            if propia(cualif) and col not in columnas and col.lower() not in _NO_COLUMNAS:
+                columnas.append(col)
+    sufijo = '_'.join(re.sub(r'\W', '', c.lower().replace('lower(', 'lower_')) for c in columnas)
+    return f"CREATE INDEX IF NOT EXISTS idx_{tabla}_{sufijo} ON {tabla}({', '.join(columnas)})"
+
+
+def _indices_existentes(conn):
+    """Columnas (en orden) de cada indice, agrupadas por tabla."""
+    indices = {}
+    for nombre, tabla in conn.execute(
+            "SELECT name, tbl_name FROM sqlite_master WHERE type='index'"):
+        cols = [fila[2] for fila in conn.execute(f'PRAGMA index_info("{nombre}")')]
+        indices.setdefault(tabla, []).append((nombre, cols))
+    return indices
+
+
+def _cubierta(sugerencia, tabla, indices):
+    """Nombre del indice existente cuyo prefijo ya contiene las columnas sugeridas."""
+    cols = re.search(r'\((.*)\)$', sugerencia).group(1).split(', ')
+    for nombre, existentes in indices.get(tabla, []):
+        if existentes[:len(cols)] == cols:
+            return nombre
+    return None
+
+
+def analizar(conn, sentencias, umbral):
+    """Ejecuta EXPLAIN QUERY PLAN y devuelve los SCAN sobre tablas grandes."""
+    # Las tablas virtuales (FTS5) resuelven MATCH con su propio indice: su
+    # "SCAN ... VIRTUAL TABLE" y la ordenacion por bm25 no son recorridos.
+    filas = {}
+    for (nombre,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table' "
+                                  "AND sql NOT LIKE 'CREATE VIRTUAL TABLE%'"):
+        filas[nombre] = conn.execute(f'SELECT COUNT(*) FROM "{nombre}"').fetchone()[0]
+
+    indices = _indices_existentes(conn)
+    hallazgos = {}
+    for sql in sentencias:
+        alias = _alias(sql)
+        try:
+            plan = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+        except sqlite3.Error:
+            continue
+        for _id, _padre, _nu, detalle in plan:
+            m = re.match(r'SCAN (\w+)', detalle)
+            if m:
+                tabla = alias.get(m.group(1), m.group(1))
+            elif detalle == 'USE TEMP B-TREE FOR ORDER BY' and alias:
+                # Ordenacion en memoria: se atribuye a la tabla principal del FROM
+                tabla = next(iter(alias.values()))
+            else:
+                continue
+            if filas.get(tabla, 0) < umbral:
+                continue
+            clave = huella(sql, tabla)
+            sugerencia = sugerir_indice(sql, tabla, alias)
+            hallazgos[clave] = {
+                'tabla': tabla,
+                'filas': filas[tabla],
+                'detalle': detalle,
+                'consulta': normalizar(sql),
+                'sugerencia': sugerencia,
+                'cubierta_por': sugerencia and _cubierta(sugerencia, tabla, indices),
+            }
+    return hallazgos
+
+
+def recoger_sql(n_reparaciones):
+    """Genera la BD sintetica, recorre las rutas y devuelve (ruta_bd, sentencias)."""
+    from scripts.datos_sinteticos import generar_bd
+
+    tmp = tempfile.mkdtemp(prefix='androtech_eqp_')
+    ruta = os.path.join(tmp, 'eqp.db')
+    generar_bd(ruta, n_reparaciones)
+    os.environ['DATABASE_PATH'] = ruta
+
+    import db
+    db.DB_PATH = ruta
+    sentencias = []
+
+    def traza(sql):
+        texto = sql.strip()
+        if texto.upper().startswith(('SELECT', 'WITH')) and 'sqlite_master' not in texto:
+            sentencias.append(texto)
+
+    db.set_trace_callback(traza)
+    import logging
+    logging.getLogger('androtech').disabled = True
+    cwd = os.getcwd()
+    os.chdir(tmp)  # logs/ y demas artefactos fuera del repo
+    try:
+        import app as aplicacion
+        aplicacion.app.config['TESTING'] = True
+        cliente = aplicacion.app.test_client()
+        with cliente.session_transaction() as s:
+            s['usuario'] = 'admin'
+            s['rol'] = 'admin'
+            s['permisos'] = []
+            s['csrf_token'] = 'eqp'
+        for url in RUTAS:
+            cliente.get(url)
+        for url, datos in POSTS:
+            cliente.post(url, data=dict(datos, csrf_token='eqp'))
+    finally:
+        os.chdir(cwd)
+        db.set_trace_callback(None)
+
+    unicas = list(dict.fromkeys(sentencias))
+    return ruta, unicas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Asesor de indices (EXPLAIN QUERY PLAN)")
+    parser.add_argument('--reparaciones', type=int, default=20000,
+                        help='tamano de la BD sintetica (default 20000)')
+    parser.add_argument('--umbral', type=int, default=1000,
+                        help='filas minimas para considerar grande una tabla')
+    parser.add_argument('--check', action='store_true',
+                        help='falla (exit 1) si hay SCAN nuevos fuera de la baseline')
+    parser.add_argument('--actualizar-baseline', action='store_true',
+                        help='acepta los SCAN actuales como baseline')
+    args = parser.parse_args(argv)
+
+    ruta, sentencias = recoger_sql(args.reparaciones)
+    conn = sqlite3.connect(ruta)
+    hallazgos = analizar(conn, sentencias, args.umbral)
+    conn.close()
+
+    print(f"Consultas distintas analizadas: {len(sentencias)}")
+    print(f"SCAN sobre tablas grandes: {len(hallazgos)}\n")
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    nuevos = {k: v for k, v in hallazgos.items() if k not in baseline}
+    for clave, h in sorted(hallazgos.items(), key=lambda kv: -kv[1]['filas']):
+        marca = 'NUEVO' if clave in nuevos else 'aceptado'
+        print(f"[{marca}] {h['detalle']} ({h['tabla']}: {h['filas']} filas)")
+        print(f"    {h['consulta'][:200]}")
+        if h['cubierta_por']:
+            print(f"    ya existe {h['cubierta_por']}; el planificador prefiere otro plan")
+        elif h['sugerencia']:
+            print(f"    sugerencia: {h['sugerencia']}")
+        else:
+            print("    sin predicado sobre la tabla: recorrido completo inherente")
+        print()
+
+    if args.actualizar_baseline:
+        aceptados = {k: {'tabla': v['tabla'], 'consulta': v['consulta']} for k, v in hallazgos.items()}
+        with open(BASELINE, 'w', encoding='utf-8') as f:
+            json.dump(aceptados, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline actualizada con {len(aceptados)} recorridos aceptados.")
+        return 0
+
+    if args.check and nuevos:
+        print(f"ERROR: {len(nuevos)} consulta(s) nuevas hacen SCAN completo sobre tablas grandes.")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
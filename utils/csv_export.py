@@ -0,0 +1,241 @@
+"""Exportacion CSV en streaming para los informes de AndroTech.
+
+Los informes se generan fila a fila desde el cursor de SQLite y se envian
+al navegador en bloques, en lugar de ``fetchall()`` + ``StringIO`` +
+``BytesIO``: la memoria del worker no crece con el historial y el primer
+byte (BOM y cabecera corporativa) sale antes de ejecutar ninguna consulta.
+
+Cada informe abre su propia conexion (no la del pool, que se devuelve al
+terminar la vista) y lee resumen y detalle dentro de una misma
+transaccion de lectura, asi que los totales del resumen cuadran con las
+filas aunque haya escrituras mientras se descarga.
+
+El detalle se describe con una lista de :class:`Columna` que
+:func:`compilar_columnas` convierte, una vez por informe, en una funcion
+que lee la tupla del cursor por posicion (``itemgetter`` y un closure por
+columna).  Asi cada fila no paga la busqueda por nombre de ``sqlite3.Row``
+ni un ``if`` por formato.
+"""
+
+import csv
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
+
+from flask import Response
+
+# Excel necesita el BOM para abrir el CSV como UTF-8
+BOM = '\ufeff'
+SEPARADOR = '=' * 62   # separador visual de seccion
+DELIMITADOR = ';'
+FILAS_POR_BLOQUE = 500
+
+
+def fmt_fecha(fecha_str):
+    """Convierte '2026-04-15 20:35:44' o '2026-04-15' a '15/04/2026'."""
+    if not fecha_str:
+        return ''
+    # Camino rapido: el dia se parsea una vez por fecha distinta (cache) y la
+    # hora solo se comprueba; lo que no valga (30 de febrero, hora rota...)
+    # va a strptime y, como antes, sale tal cual
+    if type(fecha_str) is str and (
+            len(fecha_str) == 10
+            or (len(fecha_str) == 19 and fecha_str[10] == ' ' and _hora_valida(fecha_str[11:]))):
+        dia = _fmt_dia(fecha_str[:10])
+        if dia is not None:
+            return dia
+    return _fmt_fecha_lento(fecha_str)
+
+
+@lru_cache(maxsize=4096)
+def _fmt_dia(dia):
+    """'15/04/2026' de '2026-04-15', o None si strptime no la acepta."""
+    try:
+        return datetime.strptime(dia, '%Y-%m-%d').strftime('%d/%m/%Y')
+    except ValueError:
+        return None
+
+
+def _hora_valida(hora):
+    """'HH:MM:SS' con cifras ASCII y en rango (lo que acepta ``%H:%M:%S``)."""
+    return (hora[2] == ':' and hora[5] == ':' and hora.isascii()
+            and (hora[:2] + hora[3:5] + hora[6:]).isdigit()
+            and hora[:2] <= '23' and hora[3:5] <= '59' and hora[6:] <= '59')
+
+
+def _fmt_fecha_lento(fecha_str):
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(str(fecha_str), fmt).strftime('%d/%m/%Y')
+        except ValueError:
+            continue
+    return str(fecha_str)
+
+
+def fmt_precio(valor):
+    """Formatea un precio como '89,99 €' (coma decimal, sin notacion cientifica)."""
+    if valor is None:
+        return '0,00 €'
+    tipo = type(valor)
+    if tipo is int:
+        return f'{valor},00 €'
+    if tipo is float and 0 < valor < 1e12:
+        # En centimos con aritmetica entera; solo si el valor ya tiene como
+        # mucho dos decimales, para redondear igual que el formato ``.2f``
+        centimos = round(valor * 100)
+        if abs(valor * 100 - centimos) < 1e-6:
+            return f'{centimos // 100},{centimos % 100:02d} €'
+    return f'{float(valor):.2f}'.replace('.', ',') + ' €'
+
+
+# Columna del detalle: ``campos`` son nombres de columna del SELECT (uno,
+# o una tupla si ``formato`` es un callable que recibe varios valores) y
+# ``formato`` es 'valor' (tal cual), 'texto' (``vacio`` si es nulo o
+# vacio), 'fecha', 'precio' o un callable.  Con 'fecha' o un callable,
+# ``vacio`` sustituye al resultado vacio.
+Columna = namedtuple('Columna', 'cabecera campos formato vacio', defaults=('valor', ''))
+
+_FORMATOS = {'fecha': fmt_fecha, 'precio': fmt_precio}
+
+
+def compilar_columnas(columnas, nombres):
+    """Funcion ``(tupla) -> tuple`` que da formato a una fila del cursor.
+
+    ``nombres`` son los nombres de columna del cursor
+    (``cursor.description``); cada campo se resuelve aqui a su posicion y
+    cada columna queda en un closure que lee la tupla por indice.
+    """
+    posiciones = {nombre: i for i, nombre in enumerate(nombres)}
+    funciones = [_compilar_columna(col, posiciones) for col in columnas]
+
+    def fila(r):
+        return tuple([f(r) for f in funciones])
+    return fila
+
+
+def _compilar_columna(col, posiciones):
+    campos = col.campos if isinstance(col.campos, tuple) else (col.campos,)
+    try:
+        indices = [posiciones[c] for c in campos]
+    except KeyError as e:
+        raise ValueError(f'La columna {col.cabecera!r} usa el campo {e.args[0]!r}, que no esta en la consulta')
+    leer = itemgetter(*indices)
+    vacio = col.vacio
+
+    formato = col.formato
+    if formato == 'valor':
+        return leer
+    if formato == 'texto':
+        return lambda r: leer(r) or vacio
+
+    funcion = _FORMATOS.get(formato, formato)
+    if not callable(funcion):
+        raise ValueError(f'Formato desconocido en la columna {col.cabecera!r}: {formato!r}')
+    # Con varios campos ``itemgetter`` devuelve una tupla: se pasan como argumentos
+    if len(indices) == 1:
+        if vacio:
+            return lambda r: funcion(leer(r)) or vacio
+        return lambda r: funcion(leer(r))
+    if vacio:
+        return lambda r: funcion(*leer(r)) or vacio
+    return lambda r: funcion(*leer(r))
+
+
+def cabecera_empresa(writer, titulo, usuario):
+    """Escribe el bloque de cabecera corporativa en el CSV."""
+    writer.writerow([SEPARADOR])
+    writer.writerow(['ANDROTECH — Taller de Reparacion de Dispositivos'])
+    writer.writerow(['Huelva, España  |  Tel: +34 633 234 395  |  manuelcortescontreras11@gmail.com'])
+    writer.writerow([SEPARADOR])
+    writer.writerow([])
+    writer.writerow([titulo])
+    writer.writerow([f'Generado: {datetime.now().strftime("%d/%m/%Y a las %H:%M")}'])
+    writer.writerow([f'Exportado por: {usuario}'])
+    writer.writerow([])
+
+
+def pie_informe(writer):
+    """Escribe el cierre del informe."""
+    writer.writerow([])
+    writer.writerow([SEPARADOR])
+    writer.writerow([f'Fin del informe  |  AndroTech  |  {datetime.now().strftime("%d/%m/%Y %H:%M")}'])
+    writer.writerow([SEPARADOR])
+
+
+class _Bloque:
+    """Destino de ``csv.writer`` que acumula texto hasta vaciarlo."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, texto):
+        self.partes.append(texto)
+
+    def vaciar(self):
+        datos = ''.join(self.partes).encode('utf-8')
+        self.partes.clear()
+        return datos
+
+
+def generar_informe(abrir_conexion, titulo, usuario, resumen, titulo_detalle,
+                    columnas, consulta, params,
+                    filas_por_bloque=FILAS_POR_BLOQUE, progreso=None):
+    """Generador de bytes con el informe completo.
+
+    Args:
+        abrir_conexion: callable que devuelve una conexion nueva; el
+            generador la cierra al terminar o si el cliente corta.
+        titulo, usuario: datos de la cabecera corporativa.
+        resumen: callable ``(conn) -> filas`` con el bloque de resumen
+            (una sola consulta agregada).
+        titulo_detalle: rotulo de la seccion de detalle.
+        columnas: lista de :class:`Columna` del detalle.
+        consulta, params: SELECT del detalle; se recorre sin ``fetchall``.
+        progreso: callable opcional ``(filas_escritas)`` llamado en cada bloque.
+    """
+    bloque = _Bloque()
+    w = csv.writer(bloque, delimiter=DELIMITADOR)
+    bloque.write(BOM)
+    cabecera_empresa(w, titulo, usuario)
+    yield bloque.vaciar()
+
+    conn = abrir_conexion()
+    try:
+        # Resumen y detalle sobre la misma instantanea (WAL)
+        conn.execute("BEGIN")
+        for fila in resumen(conn):
+            w.writerow(fila)
+        w.writerow([titulo_detalle])
+        w.writerow([col.cabecera for col in columnas])
+        yield bloque.vaciar()
+
+        # Tuplas en lugar de sqlite3.Row: el formato accede por posicion
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(consulta, params)
+        fila_csv = compilar_columnas(columnas, [d[0] for d in cursor.description])
+
+        escritas = 0
+        for fila in cursor:
+            w.writerow(fila_csv(fila))
+            escritas += 1
+            if escritas % filas_por_bloque == 0:
+                yield bloque.vaciar()
+                if progreso is not None:
+                    progreso(escritas)
+    finally:
+        conn.rollback()
+        conn.close()
+
+    pie_informe(w)
+    yield bloque.vaciar()
+
+
+def respuesta_csv(generador, nombre_fichero):
+    """``Response`` en streaming para un generador de :func:`generar_informe`."""
+    return Response(generador, mimetype='text/csv', headers={
+        'Content-Disposition': f'attachment; filename={nombre_fichero}',
+        # Que un proxy (nginx) no acumule la respuesta entera antes de enviarla
+        'X-Accel-Buffering': 'no',
+    })
@@ -0,0 +1,405 @@
+"""Cola de emails en la BD (``email_outbox``) y su envio en segundo plano.
+
+Antes cada ``EmailService.send_*`` abria una sesion SMTP dentro de la
+peticion: un servidor lento dejaba el worker de gunicorn parado hasta el
+timeout de 20 s.  Ahora el servicio renderiza el mensaje completo (MIME,
+con adjuntos) y :func:`encolar` lo guarda como ``pendiente``; la
+peticion solo paga un INSERT.
+
+Un hilo de fondo por worker reclama los pendientes (``UPDATE ...
+RETURNING``, asi que dos workers nunca cogen el mismo) y los envia:
+
+- si falla, vuelve a ``pendiente`` con ``proximo_intento`` a
+  ``EMAIL_REINTENTO_BASE * 2**(intentos - 1)`` segundos (maximo
+  ``EMAIL_REINTENTO_MAX``);
+- tras ``EMAIL_MAX_INTENTOS`` fallos, o si el servidor rechaza al
+  destinatario, queda ``fallido`` hasta que alguien lo reintente desde
+  el panel de sistema;
+- uno que lleva ``SEGUNDOS_HUERFANO`` en ``enviando`` (worker reiniciado
+  a mitad de envio) vuelve a la cola: puede llegar dos veces, pero no se
+  pierde.
+
+Los enviados se borran pasados ``EMAIL_RETENCION_DIAS``.  El hilo
+necesita la configuracion SMTP fuera de las peticiones: la app la pasa
+una vez con :func:`configurar`.
+
+El hilo no abre una sesion por correo: :class:`SesionSmtp` mantiene una
+autenticada y la reutiliza hasta ``EMAIL_SMTP_MAX_MENSAJES`` correos o
+``EMAIL_SMTP_MAX_SEGUNDOS`` desde que se abrio, y se cierra cuando la
+cola se queda vacia.  Si el servidor corta la conexion entre correos se
+reconecta y reintenta ese correo una vez, sin gastar un intento.
+
+Los correos con clave ``agrupar`` (los de cambio de estado, una clave por
+reparacion) se encolan con ``retraso``: mientras el primero siga
+``pendiente``, los siguientes con la misma clave y destinatario
+sustituyen su mensaje en vez de encolar otro, y sale uno solo con el
+estado final.
+"""
+
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+from email import policy
+
+from db import open_db
+
+logger = logging.getLogger("androtech")
+
+EMAIL_MAX_INTENTOS = int(os.environ.get("EMAIL_MAX_INTENTOS", "6"))
+EMAIL_REINTENTO_BASE = float(os.environ.get("EMAIL_REINTENTO_BASE", "60"))
+EMAIL_REINTENTO_MAX = float(os.environ.get("EMAIL_REINTENTO_MAX", "3600"))
+EMAIL_RETENCION_DIAS = float(os.environ.get("EMAIL_RETENCION_DIAS", "7"))
+# Segundos que espera un email de cambio de estado por si hay mas cambios
+# de la misma reparacion que agrupar con el (0 = uno por cambio)
+EMAIL_VENTANA_ESTADO = float(os.environ.get("EMAIL_VENTANA_ESTADO", "300"))
+# Una sesion SMTP se reutiliza hasta este numero de correos o segundos
+EMAIL_SMTP_MAX_MENSAJES = int(os.environ.get("EMAIL_SMTP_MAX_MENSAJES", "100"))
+EMAIL_SMTP_MAX_SEGUNDOS = float(os.environ.get("EMAIL_SMTP_MAX_SEGUNDOS", "60"))
+# 0 = este proceso solo encola (no arranca el hilo de envio)
+EMAIL_OUTBOX_HILO = os.environ.get("EMAIL_OUTBOX_HILO", "1") != "0"
+
+SEGUNDOS_ESPERA = 15
+SEGUNDOS_HUERFANO = 300
+
+ESTADOS = ('pendiente', 'enviando', 'enviado', 'fallido')
+
+# Claves de app.config que usa el envio
+_CLAVES_SMTP = ('MAIL_SERVER', 'MAIL_PORT', 'MAIL_USE_TLS', 'MAIL_USE_SSL',
+                'MAIL_USERNAME', 'MAIL_PASSWORD')
+
+
+# =========================================
+#  SMTP
+# =========================================
+
+_config = {}
+
+
+def configurar(config):
+    """Guarda la configuracion SMTP (``app.config``) y arranca el envio."""
+    _config.update({k: config.get(k) for k in _CLAVES_SMTP})
+    if EMAIL_OUTBOX_HILO:
+        despertar()
+
+
+def abrir_smtp(config=None):
+    """Sesion SMTP autenticada con la configuracion de :func:`configurar`."""
+    cfg = config or _config
+    host = cfg.get('MAIL_SERVER') or 'smtp.gmail.com'
+    port = int(cfg.get('MAIL_PORT') or 587)
+    use_ssl = bool(cfg.get('MAIL_USE_SSL'))
+    use_tls = bool(cfg.get('MAIL_USE_TLS', True))
+    user = cfg.get('MAIL_USERNAME') or ''
+    pwd = cfg.get('MAIL_PASSWORD') or ''
+    if not user or not pwd:
+        raise RuntimeError('SMTP no configurado: faltan MAIL_USERNAME o MAIL_PASSWORD en .env')
+
+    # El timeout global lo fija socket.setdefaulttimeout(20) en app.py
+    smtp = smtplib.SMTP_SSL(host, port) if use_ssl else smtplib.SMTP(host, port)
+    try:
+        smtp.ehlo()
+        if use_tls and not use_ssl:
+            smtp.starttls()
+            smtp.ehlo()
+        smtp.login(user, pwd)
+    except Exception:
+        cerrar_smtp(smtp)
+        raise
+    return smtp
+
+
+def cerrar_smtp(smtp):
+    try:
+        smtp.quit()
+    except Exception:
+        smtp.close()
+
+
+class SesionSmtp:
+    """Sesion SMTP que se abre al primer envio y se reutiliza.
+
+    Se renueva al llegar a ``max_mensajes`` correos o ``max_segundos``
+    desde que se abrio (los servidores cortan las sesiones largas o
+    inactivas).  Si el servidor ya la ha cerrado, ``enviar`` reconecta y
+    lo intenta una vez mas.
+    """
+
+    def __init__(self, config=None, max_mensajes=None, max_segundos=None):
+        self.config = config
+        self.max_mensajes = max_mensajes or EMAIL_SMTP_MAX_MENSAJES
+        self.max_segundos = max_segundos or EMAIL_SMTP_MAX_SEGUNDOS
+        self.conexiones = 0
+        self._smtp = None
+        self._abierta_en = 0.0
+        self._mensajes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    @property
+    def abierta(self):
+        return self._smtp is not None
+
+    def _caducada(self):
+        return (self._mensajes >= self.max_mensajes
+                or time.monotonic() - self._abierta_en >= self.max_segundos)
+
+    def abrir(self):
+        """Abre la sesion si no hay una valida (errores de :func:`abrir_smtp`)."""
+        if self._smtp is not None and self._caducada():
+            self.cerrar()
+        if self._smtp is None:
+            self._smtp = abrir_smtp(self.config)
+            self._abierta_en = time.monotonic()
+            self._mensajes = 0
+            self.conexiones += 1
+
+    def cerrar(self):
+        if self._smtp is not None:
+            cerrar_smtp(self._smtp)
+            self._smtp = None
+
+    def enviar(self, remitente, destinatarios, mensaje):
+        """``sendmail`` con la sesion abierta; ``mensaje`` en bytes con CRLF."""
+        self.abrir()
+        try:
+            self._sendmail(remitente, destinatarios, mensaje)
+        except smtplib.SMTPServerDisconnected:
+            # Cortada por el servidor desde el ultimo envio: una sesion nueva
+            self.abrir()
+            self._sendmail(remitente, destinatarios, mensaje)
+
+    def _sendmail(self, remitente, destinatarios, mensaje):
+        try:
+            self._smtp.sendmail(remitente, destinatarios, mensaje)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # Rechazo del servidor: smtplib ya ha hecho RSET y la sesion sigue valida
+            self._mensajes += 1
+            raise
+        except Exception:
+            self.cerrar()
+            raise
+        self._mensajes += 1
+
+
+# =========================================
+#  Cola
+# =========================================
+
+def encolar(mensaje, tipo, agrupar=None, retraso=0):
+    """Guarda un ``EmailMessage`` ya construido y avisa al hilo de envio.
+
+    Con ``agrupar``, si hay un correo pendiente con esa clave para el mismo
+    destinatario se sustituye su mensaje (sin mover su hora de envio).
+    ``retraso`` son los segundos que espera un correo nuevo antes de salir.
+    Devuelve el id de la fila.
+    """
+    if agrupar:
+        return encolar_agrupado(lambda desde: mensaje, tipo, agrupar, mensaje['To'], retraso)
+    conn = open_db()
+    try:
+        correo_id = _insertar(conn, mensaje, tipo, None, retraso)
+        conn.commit()
+    finally:
+        conn.close()
+    if EMAIL_OUTBOX_HILO:
+        despertar()
+    return correo_id
+
+
+def encolar_agrupado(construir, tipo, agrupar, destinatario, retraso=0):
+    """Como :func:`encolar` con ``agrupar``, con el mensaje hecho por ``construir``.
+
+    ``construir(desde)`` recibe el ``creado_en`` del correo pendiente que va
+    a sustituir, o ``None`` si no hay ninguno (entonces se encola uno nuevo),
+    y devuelve el ``EmailMessage``.  La busqueda, ``construir`` y la
+    escritura van en una transaccion ``BEGIN IMMEDIATE``: el hilo de envio
+    no puede reclamar el pendiente entre medias, asi que lo que se agrupa
+    con el no ha salido ya en otro correo.
+    """
+    conn = open_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        pendiente = conn.execute("""
+            SELECT id, creado_en FROM email_outbox
+            WHERE agrupar = ? AND destinatario = ? AND estado = 'pendiente'
+            ORDER BY id LIMIT 1
+        """, (agrupar, destinatario)).fetchone()
+        mensaje = construir(pendiente['creado_en'] if pendiente else None)
+        if pendiente:
+            correo_id = pendiente['id']
+            conn.execute("UPDATE email_outbox SET asunto = ?, mensaje = ? WHERE id = ?",
+                         (mensaje['Subject'], _bytes(mensaje), correo_id))
+        else:
+            correo_id = _insertar(conn, mensaje, tipo, agrupar, retraso)
+        conn.commit()
+    finally:
+        # Sin commit (``construir`` ha fallado) se deshace al cerrar
+        conn.close()
+    if pendiente:
+        logger.info(f"Email {correo_id} ({tipo}) agrupado con el pendiente para {destinatario}")
+    elif EMAIL_OUTBOX_HILO:
+        despertar()
+    return correo_id
+
+
+def _bytes(mensaje):
+    # Con CRLF, como lo enviaria send_message: sendmail manda los bytes tal cual
+    return mensaje.as_bytes(policy=policy.SMTP)
+
+
+def _insertar(conn, mensaje, tipo, agrupar, retraso):
+    ahora = time.time()
+    cur = conn.execute("""
+        INSERT INTO email_outbox (tipo, remitente, destinatario, asunto, mensaje,
+                                  agrupar, creado_en, proximo_intento)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (tipo, mensaje['From'], mensaje['To'], mensaje['Subject'], _bytes(mensaje),
+          agrupar, ahora, ahora + retraso))
+    return cur.lastrowid
+
+
+def _reclamar(conn):
+    """Marca como ``enviando`` el pendiente que toca y lo devuelve."""
+    ahora = time.time()
+    # Los que se quedaron a medias en un worker que ya no existe
+    conn.execute("UPDATE email_outbox SET estado = 'pendiente' "
+                 "WHERE estado = 'enviando' AND reclamado_en < ?", (ahora - SEGUNDOS_HUERFANO,))
+    fila = conn.execute("""
+        UPDATE email_outbox
+        SET estado = 'enviando', reclamado_en = ?, intentos = intentos + 1
+        WHERE id = (SELECT id FROM email_outbox
+                    WHERE estado = 'pendiente' AND proximo_intento <= ?
+                    ORDER BY proximo_intento, id LIMIT 1)
+        RETURNING id, tipo, remitente, destinatario, mensaje, intentos
+    """, (ahora, ahora)).fetchone()
+    conn.commit()
+    return dict(fila) if fila else None
+
+
+def retraso_reintento(intentos):
+    """Segundos hasta el siguiente intento tras ``intentos`` fallos."""
+    return min(EMAIL_REINTENTO_BASE * 2 ** (intentos - 1), EMAIL_REINTENTO_MAX)
+
+
+def _registrar_fallo(conn, correo, error):
+    # Un destinatario rechazado no se arregla reintentando
+    definitivo = (isinstance(error, smtplib.SMTPRecipientsRefused)
+                  or correo['intentos'] >= EMAIL_MAX_INTENTOS)
+    texto = f"{type(error).__name__}: {error}"[:500]
+    if definitivo:
+        conn.execute("UPDATE email_outbox SET estado = 'fallido', error = ? WHERE id = ?",
+                     (texto, correo['id']))
+        logger.error(json.dumps({
+            "event": "email_fallido", "id": correo['id'], "tipo": correo['tipo'],
+            "intentos": correo['intentos'], "error": texto,
+        }, ensure_ascii=False))
+    else:
+        retraso = retraso_reintento(correo['intentos'])
+        conn.execute("UPDATE email_outbox SET estado = 'pendiente', error = ?, proximo_intento = ? "
+                     "WHERE id = ?", (texto, time.time() + retraso, correo['id']))
+        logger.warning(f"Email {correo['id']} ({correo['tipo']}) fallido, intento "
+                       f"{correo['intentos']}; se reintenta en {retraso:.0f} s: {texto}")
+    conn.commit()
+
+
+def enviar_pendientes(conn, sesion=None):
+    """Envia todos los pendientes que ya tocan; devuelve cuantos se han enviado.
+
+    Con ``sesion`` (una :class:`SesionSmtp`) los envios la reutilizan y se
+    queda abierta; sin ella se abre una para esta tanda y se cierra al final.
+    """
+    if sesion is None:
+        with SesionSmtp() as sesion:
+            return enviar_pendientes(conn, sesion)
+    enviados = 0
+    while True:
+        correo = _reclamar(conn)
+        if correo is None:
+            return enviados
+        try:
+            sesion.abrir()
+        except Exception as e:
+            # Servidor caido o credenciales mal: el resto fallaria igual
+            _registrar_fallo(conn, correo, e)
+            return enviados
+        try:
+            sesion.enviar(correo['remitente'], [correo['destinatario']], correo['mensaje'])
+        except Exception as e:
+            _registrar_fallo(conn, correo, e)
+            continue
+        conn.execute("UPDATE email_outbox SET estado = 'enviado', error = NULL, enviado_en = ?, "
+                     "mensaje = x'' WHERE id = ?", (time.time(), correo['id']))
+        conn.commit()
+        enviados += 1
+        logger.info(f"Email {correo['id']} ({correo['tipo']}) enviado a {correo['destinatario']}")
+
+
+def purgar_enviados(conn):
+    conn.execute("DELETE FROM email_outbox WHERE estado = 'enviado' AND enviado_en < ?",
+                 (time.time() - EMAIL_RETENCION_DIAS * 86400,))
+    conn.commit()
+
+
+def reintentar_fallidos(conn):
+    """Devuelve los ``fallido`` a la cola con los intentos a cero; cuantos."""
+    cur = conn.execute("UPDATE email_outbox SET estado = 'pendiente', intentos = 0, "
+                       "proximo_intento = ? WHERE estado = 'fallido'", (time.time(),))
+    conn.commit()
+    if cur.rowcount and EMAIL_OUTBOX_HILO:
+        despertar()
+    return cur.rowcount
+
+
+def estadisticas(conn):
+    """Correos por estado y el ultimo error, para el panel de sistema."""
+    datos = dict.fromkeys(ESTADOS, 0)
+    for estado, total in conn.execute("SELECT estado, COUNT(*) FROM email_outbox GROUP BY estado"):
+        datos[estado] = total
+    fila = conn.execute("SELECT error FROM email_outbox WHERE estado IN ('pendiente', 'fallido') "
+                        "AND error IS NOT NULL ORDER BY id DESC LIMIT 1").fetchone()
+    datos['ultimo_error'] = fila[0] if fila else None
+    return datos
+
+
+# Un hilo por proceso, como el de exportaciones: se despierta al encolar y
+# revisa la cola cada SEGUNDOS_ESPERA (reintentos y correos de otros workers)
+_aviso = threading.Event()
+_hilo = None
+_cerrojo = threading.Lock()
+
+
+def _bucle():
+    sesion = SesionSmtp()
+    while True:
+        _aviso.wait(SEGUNDOS_ESPERA)
+        _aviso.clear()
+        try:
+            conn = open_db()
+            try:
+                # La sesion sigue abierta mientras lleguen correos; en cuanto
+                # una vuelta no envia nada se cierra
+                if not enviar_pendientes(conn, sesion):
+                    sesion.cerrar()
+                purgar_enviados(conn)
+            finally:
+                conn.close()
+        except Exception:
+            sesion.cerrar()
+            logger.exception("Error en el hilo de envio de emails")
+
+
+def despertar():
+    """Arranca el hilo de envio de este proceso si hace falta y lo avisa."""
+    global _hilo
+    with _cerrojo:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_bucle, name="email_outbox", daemon=True)
+            _hilo.start()
+    _aviso.set()
@@ -11,14 +11,20 @@ La API nativa de Python 3.6+ maneja Unicode correctamente via el modulo `email`,
 codificando Subject con Base64/Quoted-Printable y el cuerpo con el charset
 declarado. Mantenemos la interfaz publica identica (los mismos metodos que
 consume app.py) para no tocar nada fuera de este fichero.
+
+Los `send_*` no hablan con el servidor SMTP: dejan el mensaje ya construido
+en la cola `email_outbox` (ver utils/email_outbox.py) y un hilo de fondo lo
+envia con reintentos. Solo `send_test` envia en el momento, para que el
+administrador vea el error SMTP.
 """
 
-import smtplib
 import logging
 from email.message import EmailMessage
 from datetime import datetime
 from flask import current_app, render_template
 
+from utils import email_outbox
+
 logger = logging.getLogger(__name__)
 
 
@@ -32,20 +38,16 @@ class EmailService:
         self._unused = _legacy_mail_instance
 
     # ──────────────────────────────────────────────────────────────────────
-    # Core: envio de bajo nivel con SMTP nativo y encoding correcto
+    # Core: construccion del mensaje con encoding correcto y envio
     # ──────────────────────────────────────────────────────────────────────
-    def _send(self, *, subject: str, to_email: str, html_body: str,
-              attachments: list[tuple] | None = None) -> None:
-        """Envia un email HTML (con adjuntos opcionales) via SMTP.
+    def _mensaje(self, *, subject: str, to_email: str, html_body: str,
+                 attachments: list[tuple] | None = None) -> EmailMessage:
+        """Construye el email HTML (con adjuntos opcionales).
 
         `attachments` es una lista de tuplas (filename, mime_type, data_bytes).
-        Lanza la excepcion al llamador para que decida como manejarla.
+        Lanza RuntimeError si el SMTP no esta configurado.
         """
         cfg = current_app.config
-        host    = cfg.get('MAIL_SERVER', 'smtp.gmail.com')
-        port    = int(cfg.get('MAIL_PORT', 587))
-        use_tls = bool(cfg.get('MAIL_USE_TLS', True))
-        use_ssl = bool(cfg.get('MAIL_USE_SSL', False))
         user    = cfg.get('MAIL_USERNAME', '') or ''
         pwd     = cfg.get('MAIL_PASSWORD', '') or ''
         sender  = cfg.get('MAIL_DEFAULT_SENDER') or user
@@ -77,26 +79,24 @@ class EmailService:
                     data, maintype=maintype, subtype=subtype or 'octet-stream',
                     filename=filename,
                 )
+        return msg
 
-        # Conexion SMTP (el timeout global lo fija socket.setdefaulttimeout(20)
-        # en app.py, por lo que no hace falta pasarlo aqui).
-        if use_ssl:
-            smtp = smtplib.SMTP_SSL(host, port)
-        else:
-            smtp = smtplib.SMTP(host, port)
+    def _send(self, *, tipo: str, **kwargs) -> int:
+        """Encola el email en `email_outbox`; devuelve el id de la cola.
+
+        Los argumentos son los de `_mensaje`. No abre conexion SMTP, asi que
+        la peticion no depende de lo que tarde el servidor.
+        """
+        return email_outbox.encolar(self._mensaje(**kwargs), tipo)
 
+    def _send_now(self, **kwargs) -> None:
+        """Envia el email en el momento (sin cola). Lanza el error SMTP."""
+        msg = self._mensaje(**kwargs)
+        smtp = email_outbox.abrir_smtp(current_app.config)
         try:
-            smtp.ehlo()
-            if use_tls and not use_ssl:
-                smtp.starttls()
-                smtp.ehlo()
-            smtp.login(user, pwd)
             smtp.send_message(msg)
         finally:
-            try:
-                smtp.quit()
-            except Exception:
-                pass
+            email_outbox.cerrar_smtp(smtp)
 
     # ──────────────────────────────────────────────────────────────────────
     # API publica (misma firma que antes para no romper app.py)
@@ -122,34 +122,61 @@ class EmailService:
                 logger.debug(f'PDF adjuntado al email de reparacion {reparacion_id}')
 
             self._send(
+                tipo='pago',
                 subject=f'Confirmacion de Pago - Reparacion #{reparacion_id} - AndroTech',
                 to_email=to_email, html_body=html, attachments=attachments,
             )
-            logger.info(f'Email de confirmacion de pago enviado a {to_email} para reparacion {reparacion_id}')
+            logger.info(f'Email de confirmacion de pago para {to_email} encolado, reparacion {reparacion_id}')
         except Exception as e:
             logger.error(f'Error enviando email de confirmacion de pago: {type(e).__name__}: {str(e)}')
             raise
 
     def send_repair_status_update(self, to_email, cliente_nombre, reparacion_id,
-                                  estado_anterior, estado_nuevo, dispositivo, descripcion):
-        """Actualizacion de estado de una reparacion."""
-        try:
+                                  estado_anterior, estado_nuevo, dispositivo, descripcion,
+                                  leer_cambios=None):
+        """Actualizacion de estado de una reparacion.
+
+        Espera `EMAIL_VENTANA_ESTADO` segundos en la cola; si en ese tiempo
+        hay mas cambios, el nuevo email sustituye al pendiente.
+        `leer_cambios(desde)` devuelve las filas de `reparaciones_historial`
+        desde que se encolo el pendiente, que se muestran como linea de
+        tiempo; se llama dentro de la transaccion de la cola
+        (`email_outbox.encolar_agrupado`), y si no queda pendiente el email
+        lleva solo este cambio.
+        """
+        subject = f'Actualizacion de Estado - Reparacion #{reparacion_id} - AndroTech'
+
+        def construir(desde):
+            cambios = leer_cambios(desde) if desde is not None and leer_cambios else []
+            anterior = estado_anterior
+            if cambios and cambios[0]['estado_anterior']:
+                anterior = cambios[0]['estado_anterior']
             html = render_template(
                 'emails/repair_status_update.html',
                 cliente_nombre=cliente_nombre,
                 reparacion_id=reparacion_id,
-                estado_anterior=estado_anterior,
+                estado_anterior=anterior,
                 estado_nuevo=estado_nuevo,
                 dispositivo=dispositivo,
                 descripcion=descripcion,
                 fecha_actualizacion=datetime.now().strftime('%d/%m/%Y %H:%M'),
+                cambios=[
+                    {**c, 'fecha': datetime.strptime(c['fecha_cambio'], '%Y-%m-%d %H:%M:%S')
+                                          .strftime('%d/%m/%Y %H:%M')}
+                    for c in cambios
+                ] if len(cambios) > 1 else [],
                 year=datetime.now().year,
             )
-            self._send(
-                subject=f'Actualizacion de Estado - Reparacion #{reparacion_id} - AndroTech',
-                to_email=to_email, html_body=html,
-            )
-            logger.info(f'Email de actualizacion de estado enviado a {to_email} para reparacion {reparacion_id}: {estado_anterior} -> {estado_nuevo}')
+            return self._mensaje(subject=subject, to_email=to_email, html_body=html)
+
+        try:
+            ventana = email_outbox.EMAIL_VENTANA_ESTADO
+            if ventana:
+                email_outbox.encolar_agrupado(construir, 'estado', f'estado:{reparacion_id}',
+                                              to_email, retraso=ventana)
+            else:
+                email_outbox.encolar(construir(None), 'estado')
+            logger.info(f'Email de actualizacion de estado para {to_email} encolado, reparacion {reparacion_id}: {estado_anterior} -> {estado_nuevo}')
         except Exception as e:
             logger.error(f'Error enviando email de actualizacion de estado: {str(e)}')
             raise
@@ -168,10 +195,11 @@ class EmailService:
                 year=datetime.now().year,
             )
             self._send(
+                tipo='factura',
                 subject=f'Factura - Reparacion #{reparacion_id} - AndroTech',
                 to_email=to_email, html_body=html,
             )
-            logger.info(f'Email de factura enviado a {to_email} para reparacion {reparacion_id}')
+            logger.info(f'Email de factura para {to_email} encolado, reparacion {reparacion_id}')
         except Exception as e:
             logger.error(f'Error enviando email de factura: {str(e)}')
             raise
@@ -190,10 +218,11 @@ class EmailService:
                 year=datetime.now().year,
             )
             self._send(
+                tipo='nueva_reparacion',
                 subject=f'Nueva Reparacion Registrada #{reparacion_id} - AndroTech',
                 to_email=to_email, html_body=html,
             )
-            logger.info(f'Email de nueva reparacion enviado a {to_email} para reparacion {reparacion_id}')
+            logger.info(f'Email de nueva reparacion para {to_email} encolado, reparacion {reparacion_id}')
         except Exception as e:
             logger.error(f'Error enviando email de nueva reparacion: {type(e).__name__}: {str(e)}')
             raise
@@ -207,10 +236,11 @@ class EmailService:
                 year=datetime.now().year,
             )
             self._send(
+                tipo='bienvenida',
                 subject='Bienvenido a AndroTech - Servicio Tecnico Especializado',
                 to_email=to_email, html_body=html,
             )
-            logger.info(f'Email de bienvenida enviado a {to_email} para cliente {cliente_nombre}')
+            logger.info(f'Email de bienvenida para {to_email} encolado, cliente {cliente_nombre}')
         except Exception as e:
             logger.error(f'Error enviando email de bienvenida: {type(e).__name__}: {str(e)}')
             raise
@@ -222,7 +252,7 @@ class EmailService:
             cliente_nombre=cliente_nombre,
             year=datetime.now().year,
         )
-        self._send(
+        self._send_now(
             subject='AndroTech - Prueba de envio de email',
             to_email=to_email, html_body=html,
         )
@@ -0,0 +1,208 @@
+"""Cache en disco de los PDF de presupuesto y factura.
+
+Cada PDF se guarda con un nombre que incluye el hash de todo lo que
+influye en el documento: los datos de la reparacion (cliente y piezas
+incluidos), el tipo de documento, la ``base_url`` del QR, el propio
+codigo de :mod:`utils.pdf_generator` y :mod:`utils.pdf_toolkit` y el dia
+de hoy, que es la ``Fecha:`` de la cabecera.  Si cualquiera cambia, la
+clave cambia y el PDF se vuelve a generar; una descarga repetida es solo
+una lectura de fichero.  Lo unico que se queda congelado es la hora del
+pie ("Documento generado el ... a las ..."): es la del primer render de
+ese dia.  Los PDF de dias anteriores dejan de pedirse y salen por la
+expulsion de los menos usados.
+
+Los ficheros se llaman ``r<id>-<tipo>-<hash>.pdf`` para poder borrar de
+golpe los de una reparacion cuando se edita (:func:`invalidar`), y el
+directorio se mantiene por debajo de ``PDF_CACHE_MAX_MB`` expulsando los
+menos usados (la fecha de modificacion se actualiza en cada acierto).
+
+Es compartida entre workers: se escribe en un temporal y se publica con
+``os.replace``, y un fichero que desaparece entre el ``stat`` y la
+lectura cuenta como fallo.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import date
+from io import BytesIO
+
+from utils import pdf_generator, pdf_pool, pdf_toolkit
+
+logger = logging.getLogger("androtech")
+
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR", "pdf_cache")
+PDF_CACHE_MAX_MB = float(os.environ.get("PDF_CACHE_MAX_MB", "200"))
+# Al expulsar se baja hasta esta fraccion del limite para no expulsar en
+# cada escritura
+FRACCION_TRAS_EXPULSION = 0.9
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def _huella_generador():
+    """Hash del codigo de los PDF: un cambio de plantilla o estilos invalida todo."""
+    h = hashlib.sha256()
+    try:
+        for modulo in (pdf_generator, pdf_toolkit):
+            with open(modulo.__file__, 'rb') as f:
+                h.update(f.read())
+    except OSError:
+        return 'desconocida'
+    return h.hexdigest()[:16]
+
+
+_HUELLA_GENERADOR = _huella_generador()
+
+
+def clave(reparacion_data, tipo_documento, base_url):
+    """Hash SHA-256 del contenido que determina el PDF (incluida la fecha de hoy)."""
+    contenido = json.dumps(
+        [_HUELLA_GENERADOR, date.today().isoformat(), tipo_documento, base_url, reparacion_data],
+        sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str,
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _ruta(reparacion_id, tipo_documento, hash_):
+    return os.path.join(PDF_CACHE_DIR, f"r{reparacion_id}-{tipo_documento}-{hash_}.pdf")
+
+
+def _contar(evento, n=1):
+    with _lock:
+        _stats[evento] += n
+
+
+def obtener_pdf(reparacion_data, tipo_documento="presupuesto", base_url=None, esperar=0):
+    """Como ``generar_presupuesto_pdf`` pero pasando por la cache.
+
+    Devuelve un ``BytesIO`` posicionado al principio.  Si el disco falla
+    se genera el PDF igualmente.  Los fallos se generan en
+    :mod:`utils.pdf_pool` (``esperar``: segundos que se aguarda un hueco)
+    y pueden lanzar :class:`~utils.pdf_pool.PdfNoDisponible`.
+    """
+    datos = leer(reparacion_data, tipo_documento, base_url)
+    if datos is not None:
+        return BytesIO(datos)
+    buffer = pdf_pool.renderizar(
+        'generar_presupuesto_pdf', reparacion_data, esperar=esperar,
+        tipo_documento=tipo_documento, base_url=base_url)
+    guardar(reparacion_data, tipo_documento, base_url, buffer.getvalue())
+    return buffer
+
+
+def leer(reparacion_data, tipo_documento, base_url):
+    """Bytes del PDF en cache o ``None`` (y cuenta el acierto o fallo)."""
+    ruta = _ruta(reparacion_data.get('id', 0), tipo_documento,
+                 clave(reparacion_data, tipo_documento, base_url))
+    try:
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+        os.utime(ruta)
+    except OSError:
+        _contar("misses")
+        return None
+    _contar("hits")
+    return datos
+
+
+def guardar(reparacion_data, tipo_documento, base_url, datos):
+    """Guarda un PDF recien generado; un error de disco solo se registra."""
+    ruta = _ruta(reparacion_data.get('id', 0), tipo_documento,
+                 clave(reparacion_data, tipo_documento, base_url))
+    try:
+        _guardar(ruta, datos)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el PDF en cache: {e}")
+
+
+def _guardar(ruta, datos):
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=PDF_CACHE_DIR, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+    except OSError:
+        try:
+            os.unlink(temporal)
+        except OSError:
+            pass
+        raise
+    _contar("stores")
+    _expulsar()
+
+
+def _entradas():
+    """[(mtime, bytes, ruta)] de los PDF de la cache."""
+    entradas = []
+    try:
+        with os.scandir(PDF_CACHE_DIR) as it:
+            for e in it:
+                if not e.name.endswith('.pdf'):
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                entradas.append((st.st_mtime, st.st_size, e.path))
+    except OSError:
+        pass
+    return entradas
+
+
+def _expulsar():
+    """Borra los PDF menos usados si la cache supera ``PDF_CACHE_MAX_MB``."""
+    limite = PDF_CACHE_MAX_MB * 1024 * 1024
+    entradas = _entradas()
+    total = sum(tam for _, tam, _ in entradas)
+    if total <= limite:
+        return
+    objetivo = limite * FRACCION_TRAS_EXPULSION
+    for _, tam, ruta in sorted(entradas):
+        if total <= objetivo:
+            break
+        try:
+            os.unlink(ruta)
+            _contar("evictions")
+        except OSError:
+            pass
+        total -= tam
+
+
+def invalidar(reparacion_ids):
+    """Borra los PDF en cache de las reparaciones indicadas."""
+    for reparacion_id in reparacion_ids:
+        for ruta in glob.glob(os.path.join(PDF_CACHE_DIR, f"r{int(reparacion_id)}-*.pdf")):
+            try:
+                os.unlink(ruta)
+            except OSError:
+                pass
+
+
+def invalidar_cliente(conn, cliente_id):
+    """Borra los PDF de todas las reparaciones de un cliente."""
+    invalidar(r[0] for r in conn.execute(
+        "SELECT id FROM reparaciones WHERE cliente_id = ?", (cliente_id,)))
+
+
+def invalidar_pieza(conn, pieza_id):
+    """Borra los PDF de las reparaciones que usan una pieza."""
+    invalidar(r[0] for r in conn.execute(
+        "SELECT DISTINCT reparacion_id FROM piezas_reparacion WHERE pieza_id = ?", (pieza_id,)))
+
+
+def estadisticas():
+    """Contadores de este proceso y ocupacion actual del directorio."""
+    entradas = _entradas()
+    with _lock:
+        datos = dict(_stats)
+    datos["entries"] = len(entradas)
+    datos["size_mb"] = round(sum(tam for _, tam, _ in entradas) / (1024 * 1024), 2)
+    datos["max_mb"] = PDF_CACHE_MAX_MB
+    return datos
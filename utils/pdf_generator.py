@@ -7,64 +7,29 @@ Adaptado para taller de reparacion de dispositivos moviles en Huelva, España.
 import os
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from itertools import groupby
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.platypus import (
+    SimpleDocTemplate, Paragraph, Spacer, Table, LongTable, PageBreak, Flowable,
+)
+from reportlab.graphics.barcode import qrencoder
 from io import BytesIO
 
-logger = logging.getLogger(__name__)
+from utils.pdf_toolkit import (
+    COMPANY, MARGEN_A4, PIE_CORTO, PIE_EMPRESA, STYLES,
+    TS_CABECERA, TS_CLIENTE, TS_DISPOSITIVO, TS_SERVICIOS, TS_TOTALES, TS_QR,
+    TS_HISTORIAL_CLIENTE, TS_HISTORIAL_RESUMEN, TS_HISTORIAL_DETALLE,
+    TS_TICKET_INFO, TS_TICKET_LAYOUT, TS_SEPARADOR,
+)
 
-# Colores corporativos AndroTech
-AT_PRIMARY = colors.HexColor('#2B8AC4')
-AT_DARK = colors.HexColor('#0F1923')
-AT_LIGHT = colors.HexColor('#EBF5FB')
-AT_SUCCESS = colors.HexColor('#198754')
-AT_GRAY = colors.HexColor('#6c757d')
-AT_BORDER = colors.HexColor('#dee2e6')
-
-# Datos de la empresa
-COMPANY = {
-    'name': 'AndroTech',
-    'tagline': 'Taller de Reparacion de Dispositivos Moviles',
-    'address': 'Huelva, España',
-    'phone': '+34 633 234 395',
-    'email': 'manuelcortescontreras11@gmail.com',
-    'web': 'AndroTech',
-    'iva_rate': 0.21,
-}
+logger = logging.getLogger(__name__)
 
 
 def _get_styles():
-    """Configurar estilos del documento."""
-    styles = getSampleStyleSheet()
-
-    styles.add(ParagraphStyle(
-        name='ATTitle', parent=styles['Heading1'], fontSize=22,
-        textColor=AT_PRIMARY, alignment=TA_CENTER, spaceAfter=5
-    ))
-    styles.add(ParagraphStyle(
-        name='ATSub', parent=styles['Normal'], fontSize=10,
-        textColor=AT_GRAY, alignment=TA_CENTER, spaceAfter=20
-    ))
-    styles.add(ParagraphStyle(
-        name='ATSection', parent=styles['Heading2'], fontSize=13,
-        textColor=AT_DARK, spaceAfter=10
-    ))
-    styles.add(ParagraphStyle(
-        name='ATSmall', parent=styles['Normal'], fontSize=8,
-        textColor=AT_GRAY, alignment=TA_CENTER
-    ))
-    styles.add(ParagraphStyle(
-        name='ATFooter', parent=styles['Normal'], fontSize=8,
-        textColor=colors.HexColor('#9ba5b0'), alignment=TA_CENTER
-    ))
-    return styles
+    """Hoja de estilos compartida (ver :mod:`utils.pdf_toolkit`)."""
+    return STYLES
 
 
 def _build_header(styles, doc_type="PRESUPUESTO", doc_number=""):
@@ -78,23 +43,11 @@ def _build_header(styles, doc_type="PRESUPUESTO", doc_number=""):
     # Tipo de documento y numero
     header_data = [
         [doc_type, f'N. {doc_number}'],
+        # Fecha de hoy: utils.pdf_cache mete el dia en la clave de cache
         ['Fecha:', datetime.now().strftime('%d/%m/%Y')],
     ]
     header_table = Table(header_data, colWidths=[8.5 * cm, 8.5 * cm])
-    header_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), AT_PRIMARY),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('TEXTCOLOR', (0, 1), (-1, -1), AT_GRAY),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('LEFTPADDING', (0, 0), (-1, -1), 12),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
-    ]))
+    header_table.setStyle(TS_CABECERA)
     elements.append(header_table)
     elements.append(Spacer(1, 15))
     return elements
@@ -112,14 +65,7 @@ def _build_client_info(styles, cliente):
         ['Direccion:', cliente.get('direccion', '—') or '—'],
     ]
     info_table = Table(info_data, colWidths=[3.5 * cm, 13.5 * cm])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-        ('TOPPADDING', (0, 0), (-1, -1), 5),
-        ('TEXTCOLOR', (0, 0), (0, -1), AT_PRIMARY),
-        ('LINEBELOW', (0, -1), (-1, -1), 0.5, AT_BORDER),
-    ]))
+    info_table.setStyle(TS_CLIENTE)
     elements.append(info_table)
     elements.append(Spacer(1, 12))
     return elements
@@ -137,14 +83,7 @@ def _build_device_info(styles, reparacion):
         ['Fecha Entrada:', reparacion.get('fecha_entrada', '—') or '—'],
     ]
     device_table = Table(device_data, colWidths=[3.5 * cm, 13.5 * cm])
-    device_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-        ('TOPPADDING', (0, 0), (-1, -1), 5),
-        ('TEXTCOLOR', (0, 0), (0, -1), AT_DARK),
-        ('LINEBELOW', (0, -1), (-1, -1), 0.5, AT_BORDER),
-    ]))
+    device_table.setStyle(TS_DISPOSITIVO)
     elements.append(device_table)
     elements.append(Spacer(1, 12))
     return elements
@@ -183,21 +122,7 @@ def _build_services_table(styles, servicios, piezas=None):
             ])
 
     svc_table = Table(table_data, colWidths=[8 * cm, 2 * cm, 3.5 * cm, 3.5 * cm])
-    svc_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), AT_DARK),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-        ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, AT_BORDER),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-    ]))
+    svc_table.setStyle(TS_SERVICIOS)
     elements.append(svc_table)
     elements.append(Spacer(1, 12))
     return elements
@@ -217,18 +142,7 @@ def _build_totals(styles, subtotal):
     ]
 
     totals_table = Table(totals_data, colWidths=[12.5 * cm, 4.5 * cm])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (-1, -1), 13),
-        ('BACKGROUND', (0, -1), (-1, -1), AT_SUCCESS),
-        ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
-        ('LINEABOVE', (0, 0), (-1, 0), 1, AT_BORDER),
-    ]))
+    totals_table.setStyle(TS_TOTALES)
     elements.append(totals_table)
     elements.append(Spacer(1, 15))
     return elements
@@ -255,15 +169,51 @@ def _build_terms(styles, tipo="presupuesto"):
             '<b>4.</b> AndroTech no se hace responsable de datos almacenados en el dispositivo.'
         )
 
-    terms = Paragraph(terms_text, ParagraphStyle(
-        'Terms', parent=styles['Normal'], fontSize=8, textColor=AT_GRAY,
-        leading=13
-    ))
+    terms = Paragraph(terms_text, styles['Terms'])
     elements.append(terms)
     elements.append(Spacer(1, 15))
     return elements
 
 
+class _QrVectorial(Flowable):
+    """QR de ``valor`` dibujado como un unico trazado relleno.
+
+    ``QrCodeWidget`` dentro de un ``Drawing`` guarda y restaura el estado
+    grafico en cada tramo oscuro y anade la fuente Times-Roman al PDF;
+    aqui cada tramo es un rectangulo mas del mismo trazado.  ``lado`` es
+    el del QR con su margen de ``borde`` modulos y ``caja`` el del hueco
+    que ocupa en la pagina.
+    """
+
+    def __init__(self, valor, lado, caja=None, borde=4):
+        super().__init__()
+        self.valor = valor
+        self.lado = lado
+        self.borde = borde
+        self.width = self.height = caja or lado
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        qr = qrencoder.QRCode(None, qrencoder.QRErrorCorrectLevel.L)
+        qr.addData(self.valor)
+        qr.make()
+        modulo = self.lado / (qr.getModuleCount() + 2 * self.borde)
+        trazado = self.canv.beginPath()
+        for fila, modulos in enumerate(qr.modules):
+            columna = 0
+            for oscuro, tramo in groupby(modulos, key=bool):
+                largo = len(list(tramo))
+                if oscuro:
+                    trazado.rect((columna + self.borde) * modulo,
+                                 self.lado - (fila + self.borde + 1) * modulo,
+                                 largo * modulo, modulo)
+                columna += largo
+        self.canv.setFillColor(colors.black)
+        self.canv.drawPath(trazado, stroke=0, fill=1)
+
+
 def _build_qr(styles, reparacion_id, base_url=None):
     """
     Construir QR de consulta directa.
@@ -282,25 +232,17 @@ def _build_qr(styles, reparacion_id, base_url=None):
             )
         url = f"{base_url.rstrip('/')}/consulta?id={reparacion_id}"
 
-        qr = QrCodeWidget(url)
-        qr.barWidth = 80
-        qr.barHeight = 80
-        d = Drawing(90, 90)
-        d.add(qr)
+        d = _QrVectorial(url, 80, caja=90)
 
         qr_data = [
             [d, Paragraph(
                 f'<b>Reparacion #{reparacion_id}</b><br/>'
                 f'Escanea el QR para consultar<br/>el estado de tu reparacion',
-                ParagraphStyle('QRText', parent=styles['Normal'], fontSize=8,
-                               textColor=AT_GRAY, alignment=TA_LEFT)
+                styles['QRText']
             )]
         ]
         qr_table = Table(qr_data, colWidths=[3 * cm, 10 * cm])
-        qr_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 5),
-        ]))
+        qr_table.setStyle(TS_QR)
         elements.append(qr_table)
         elements.append(Spacer(1, 10))
     except Exception as e:
@@ -312,8 +254,7 @@ def _build_footer(styles):
     """Construir pie de pagina."""
     elements = []
     footer_text = (
-        f'<b>{COMPANY["name"]}</b> — {COMPANY["tagline"]}<br/>'
-        f'{COMPANY["address"]} | Tel: {COMPANY["phone"]} | {COMPANY["email"]}<br/>'
+        f'{PIE_EMPRESA}<br/>'
         f'Documento generado el {datetime.now().strftime("%d/%m/%Y a las %H:%M")}'
     )
     elements.append(Paragraph(footer_text, styles['ATFooter']))
@@ -334,8 +275,34 @@ def generar_presupuesto_pdf(reparacion_data, tipo_documento="presupuesto", base_
         BytesIO buffer con el PDF generado
     """
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2 * cm, leftMargin=2 * cm,
-                            topMargin=2 * cm, bottomMargin=2 * cm)
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=MARGEN_A4, leftMargin=MARGEN_A4,
+                            topMargin=MARGEN_A4, bottomMargin=MARGEN_A4)
+    doc.build(_elementos_documento(reparacion_data, tipo_documento, base_url))
+    buffer.seek(0)
+    return buffer
+
+
+def generar_documentos_pdf(documentos, tipo_documento="factura", base_url=None):
+    """Varios presupuestos/facturas en un unico PDF, cada uno desde pagina nueva.
+
+    ``documentos`` es una lista de dicts como los de
+    :func:`generar_presupuesto_pdf`.
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=MARGEN_A4, leftMargin=MARGEN_A4,
+                            topMargin=MARGEN_A4, bottomMargin=MARGEN_A4)
+    elements = []
+    for reparacion_data in documentos:
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(_elementos_documento(reparacion_data, tipo_documento, base_url))
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer
+
+
+def _elementos_documento(reparacion_data, tipo_documento, base_url):
+    """Flowables de un presupuesto o factura."""
     styles = _get_styles()
     elements = []
 
@@ -385,6 +352,155 @@ def generar_presupuesto_pdf(reparacion_data, tipo_documento="presupuesto", base_
     # Footer
     elements.extend(_build_footer(styles))
 
+    return elements
+
+
+def generar_ticket_recogida_pdf(reparacion, base_url):
+    """Ticket de recogida en media hoja A4 con el QR de consulta.
+
+    ``reparacion`` necesita ``id``, ``cliente_nombre``, ``dispositivo``,
+    ``estado``, ``fecha_entrada`` y ``precio``.
+    """
+    rep_id = reparacion['id']
+    buffer = BytesIO()
+    # Media hoja A4
+    page_w = A4[0]
+    page_h = A4[1] / 2
+    doc = SimpleDocTemplate(buffer, pagesize=(page_w, page_h),
+                            rightMargin=1.5 * cm, leftMargin=1.5 * cm,
+                            topMargin=1 * cm, bottomMargin=1 * cm)
+    styles = STYLES
+
+    elements = []
+
+    # Cabecera
+    elements.append(Paragraph("AndroTech", styles['TKTitle']))
+    elements.append(Paragraph("TICKET DE RECOGIDA", styles['TKSub']))
+
+    # QR: URL directa a la consulta de esta reparacion
+    d = _QrVectorial(f"{base_url}/consulta?id={rep_id}", 100, caja=110)
+
+    info_rows = [
+        ['Reparación:', f'#{rep_id}'],
+        ['Cliente:', reparacion['cliente_nombre']],
+        ['Dispositivo:', reparacion['dispositivo']],
+        ['Estado:', reparacion['estado']],
+        ['Fecha entrada:', reparacion['fecha_entrada'] or '—'],
+        ['Precio:', f"{reparacion['precio']:.2f} €" if reparacion['precio'] else 'Pendiente'],
+    ]
+    info_table = Table(info_rows, colWidths=[3 * cm, 7 * cm])
+    info_table.setStyle(TS_TICKET_INFO)
+
+    # Datos a la izquierda, QR a la derecha
+    layout = Table([[info_table, d]], colWidths=[10.5 * cm, 4 * cm])
+    layout.setStyle(TS_TICKET_LAYOUT)
+    elements.append(layout)
+    elements.append(Spacer(1, 8))
+
+    divider = Table([['']], colWidths=[page_w - 3 * cm])
+    divider.setStyle(TS_SEPARADOR)
+    elements.append(divider)
+    elements.append(Spacer(1, 5))
+
+    elements.append(Paragraph(
+        '<font size="8" color="#6c757d">'
+        'Presente este ticket al recoger su dispositivo. '
+        'Escanee el código QR para consultar el estado de su reparación en línea.<br/>'
+        f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")} — AndroTech, Huelva — +34 633 234 395'
+        '</font>', styles['TKCenter']
+    ))
+
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer
+
+
+# Columnas de las filas de detalle del historial, en este orden
+COLUMNAS_HISTORIAL = ('id', 'dispositivo', 'estado', 'precio', 'estado_pago', 'fecha_entrada')
+# Filas por tabla del detalle: partir una tabla entre paginas copia todas
+# las filas que quedan, asi que una sola tabla de miles de filas cuesta
+# cuadratico; con trozos el coste queda acotado por trozo
+FILAS_POR_TABLA = 500
+_CABECERA_HISTORIAL = ['#', 'Dispositivo', 'Estado', 'Precio', 'Pago', 'Fecha']
+_ANCHOS_HISTORIAL = [1.2 * cm, 5.5 * cm, 2.5 * cm, 2.5 * cm, 2.5 * cm, 2.5 * cm]
+
+
+def _tablas_historial(reparaciones):
+    """``LongTable`` de hasta ``FILAS_POR_TABLA`` filas, con la cabecera repetida en cada pagina."""
+    trozo = [_CABECERA_HISTORIAL]
+    for rep_id, dispositivo, estado, precio, estado_pago, fecha_entrada in reparaciones:
+        trozo.append([
+            str(rep_id),
+            str(dispositivo)[:30],
+            estado,
+            f"{precio:.2f} €" if precio else '—',
+            estado_pago or 'Pendiente',
+            fecha_entrada or '—'
+        ])
+        if len(trozo) > FILAS_POR_TABLA:
+            yield trozo
+            trozo = [_CABECERA_HISTORIAL]
+    if len(trozo) > 1:
+        yield trozo
+
+
+def generar_historial_cliente_pdf(cliente, resumen, reparaciones):
+    """Historial de reparaciones de un cliente con resumen y detalle.
+
+    ``resumen`` trae ``total``, ``completadas`` y ``total_pagado`` (se
+    calculan en SQL); ``reparaciones`` son tuplas con las columnas de
+    :data:`COLUMNAS_HISTORIAL` (mas recientes primero).
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=MARGEN_A4, leftMargin=MARGEN_A4,
+                            topMargin=MARGEN_A4, bottomMargin=MARGEN_A4)
+    styles = STYLES
+
+    elements = []
+
+    # Cabecera
+    elements.append(Paragraph("AndroTech", styles['ATTitle']))
+    elements.append(Paragraph("Historial de Reparaciones del Cliente", styles['ATSub']))
+
+    # Datos del cliente
+    elements.append(Paragraph("Datos del Cliente", styles['ATSection']))
+    info_data = [
+        ['Nombre:', cliente['nombre']],
+        ['Email:', cliente['email'] or '—'],
+        ['Teléfono:', cliente['telefono'] or '—'],
+        ['Dirección:', cliente['direccion'] or '—'],
+    ]
+    info_table = Table(info_data, colWidths=[3.5 * cm, 13 * cm])
+    info_table.setStyle(TS_HISTORIAL_CLIENTE)
+    elements.append(info_table)
+    elements.append(Spacer(1, 15))
+
+    # Resumen
+    elements.append(Paragraph("Resumen", styles['ATSection']))
+    stats_data = [
+        ['Total Reparaciones', 'Completadas', 'Total Pagado'],
+        [str(resumen['total']), str(resumen['completadas']), f"{resumen['total_pagado']:.2f} €"]
+    ]
+    stats_table = Table(stats_data, colWidths=[5.5 * cm, 5.5 * cm, 5.5 * cm])
+    stats_table.setStyle(TS_HISTORIAL_RESUMEN)
+    elements.append(stats_table)
+    elements.append(Spacer(1, 15))
+
+    # Detalle
+    if reparaciones:
+        elements.append(Paragraph("Detalle de Reparaciones", styles['ATSection']))
+        for table_data in _tablas_historial(reparaciones):
+            rep_table = LongTable(table_data, colWidths=_ANCHOS_HISTORIAL, repeatRows=1)
+            rep_table.setStyle(TS_HISTORIAL_DETALLE)
+            elements.append(rep_table)
+
+    elements.append(Spacer(1, 25))
+    elements.append(Paragraph(
+        f'<para alignment="center"><font size="8" color="#9ba5b0">'
+        f'Generado el {datetime.now().strftime("%d/%m/%Y %H:%M")} — {PIE_CORTO}'
+        f'</font></para>', styles['Normal']
+    ))
+
     doc.build(elements)
     buffer.seek(0)
     return buffer
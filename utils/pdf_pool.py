@@ -0,0 +1,221 @@
+"""Generacion de PDF en procesos aparte.
+
+ReportLab es CPU puro: generado dentro de la peticion bloquea el GIL del
+worker de gunicorn y, con pocos workers, una racha de descargas de
+tickets, facturas e historiales deja colgado el resto de paginas.  Aqui
+cada worker tiene un ``ProcessPoolExecutor`` pequeno (``PDF_WORKERS``
+procesos) y la peticion solo espera el resultado.
+
+- Como mucho ``PDF_COLA_MAX`` documentos por worker entre los que se
+  estan generando y los que esperan; el siguiente recibe
+  :class:`PdfNoDisponible` al momento, que la app convierte en un 503
+  con ``Retry-After``.
+- Cada peticion espera como mucho ``PDF_TIMEOUT`` segundos.  Si se
+  agota, el trabajo pendiente se cancela; uno que ya se esta generando
+  termina en su proceso y ocupa su hueco hasta entonces.
+
+Los lotes (:func:`renderizar_lote`, facturas de fin de mes) usan un pool
+propio de ``PDF_LOTE_WORKERS`` procesos que solo vive mientras dura el
+lote, y solo puede haber uno a la vez por worker.
+
+Los argumentos viajan por pickle, asi que hay que pasar ``dict`` y no
+``sqlite3.Row``.  Con ``PDF_WORKERS=0`` se genera en el propio proceso
+(desarrollo y scripts).
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+logger = logging.getLogger("androtech")
+
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "1"))
+PDF_COLA_MAX = int(os.environ.get("PDF_COLA_MAX", "3"))
+PDF_TIMEOUT = float(os.environ.get("PDF_TIMEOUT", "30"))
+PDF_RETRY_AFTER = int(os.environ.get("PDF_RETRY_AFTER", "5"))
+PDF_LOTE_WORKERS = int(os.environ.get("PDF_LOTE_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+# Funciones de utils.pdf_generator que se pueden pedir al pool
+GENERADORES = frozenset({
+    'generar_presupuesto_pdf',
+    'generar_ticket_recogida_pdf',
+    'generar_historial_cliente_pdf',
+    'generar_documentos_pdf',
+})
+
+
+class PdfNoDisponible(Exception):
+    """No se ha podido generar el PDF a tiempo (cola llena o timeout)."""
+
+    def __init__(self, motivo, retry_after=PDF_RETRY_AFTER):
+        super().__init__(motivo)
+        self.retry_after = retry_after
+
+
+_cerrojo = threading.Lock()
+_pool = None
+_pid = None
+_huecos = threading.BoundedSemaphore(max(PDF_COLA_MAX, 1))
+_lote_en_curso = threading.Lock()
+_stats = {"completados": 0, "rechazados": 0, "timeouts": 0, "errores": 0, "en_cola": 0}
+
+
+def _iniciar_proceso():
+    # Estilos y metricas de fuentes listos antes del primer documento
+    import utils.pdf_generator  # noqa: F401
+
+
+def _generar(nombre, args, kwargs):
+    """Se ejecuta en el proceso hijo; devuelve los bytes del PDF."""
+    from utils import pdf_generator
+    return getattr(pdf_generator, nombre)(*args, **kwargs).getvalue()
+
+
+def _contexto():
+    # forkserver evita hacer fork de un worker con hilos (pool de BD,
+    # exportaciones, gthread)
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+
+def _executor():
+    """Pool de este proceso; se crea al primer uso y tras un fork o una caida."""
+    global _pool, _pid
+    with _cerrojo:
+        if _pool is None or _pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=_contexto(),
+                                        initializer=_iniciar_proceso)
+            _pid = os.getpid()
+        return _pool
+
+
+def _descartar(pool):
+    global _pool
+    with _cerrojo:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _contar(evento, n=1):
+    with _cerrojo:
+        _stats[evento] += n
+
+
+def _liberar(_future):
+    _contar("en_cola", -1)
+    _huecos.release()
+
+
+def renderizar(nombre, *args, esperar=0, timeout=None, **kwargs):
+    """Genera el PDF ``pdf_generator.<nombre>(*args, **kwargs)`` en el pool.
+
+    Devuelve un ``BytesIO`` al principio.  ``esperar`` son los segundos que
+    se aguarda un hueco en la cola antes de rendirse (0: fallar en el acto).
+    Lanza :class:`PdfNoDisponible` si la cola esta llena o se agota
+    ``timeout`` (por defecto ``PDF_TIMEOUT``).
+    """
+    timeout = PDF_TIMEOUT if timeout is None else timeout
+    if nombre not in GENERADORES:
+        raise ValueError(f"Generador PDF desconocido: {nombre}")
+    if PDF_WORKERS <= 0:
+        return BytesIO(_generar(nombre, args, kwargs))
+
+    libre = _huecos.acquire(timeout=esperar) if esperar > 0 else _huecos.acquire(blocking=False)
+    if not libre:
+        _contar("rechazados")
+        logger.warning(f"Cola de PDF llena ({PDF_COLA_MAX}), se rechaza {nombre}")
+        raise PdfNoDisponible("cola llena")
+    _contar("en_cola")
+
+    pool = None
+    try:
+        pool = _executor()
+        future = pool.submit(_generar, nombre, args, kwargs)
+    except Exception:
+        _liberar(None)
+        if pool is not None:
+            _descartar(pool)
+        raise
+    # El hueco se libera cuando el trabajo acaba de verdad, no cuando la
+    # peticion deja de esperar
+    future.add_done_callback(_liberar)
+
+    try:
+        datos = future.result(timeout=timeout)
+    except FuturesTimeout:
+        future.cancel()
+        _contar("timeouts")
+        logger.warning(f"PDF {nombre} sin terminar tras {timeout} s")
+        raise PdfNoDisponible("tiempo agotado")
+    except BrokenProcessPool:
+        # Un hijo ha muerto (p. ej. por memoria): el proximo uso crea otro pool
+        _descartar(pool)
+        _contar("errores")
+        logger.error(f"El pool de PDF se ha roto generando {nombre}")
+        raise PdfNoDisponible("pool caido")
+    except Exception:
+        _contar("errores")
+        raise
+    _contar("completados")
+    return BytesIO(datos)
+
+
+def renderizar_lote(nombre, trabajos):
+    """Genera muchos PDF en paralelo; ``trabajos`` es una lista de ``(args, kwargs)``.
+
+    Devuelve un generador con los bytes de cada PDF en el orden de
+    ``trabajos`` segun van estando listos, para poder enviarlos mientras
+    se generan los siguientes.  El hueco del lote se reserva aqui y no al
+    empezar a iterar: si ya hay otro lote en marcha en este worker lanza
+    :class:`PdfNoDisponible` en la llamada, antes de que la vista envie
+    nada.  Tambien la lanza el generador si un documento tarda mas de
+    ``PDF_TIMEOUT``.  Hay que cerrar el generador (``close``) para liberar
+    el hueco si no se recorre entero.
+    """
+    if nombre not in GENERADORES:
+        raise ValueError(f"Generador PDF desconocido: {nombre}")
+    if PDF_WORKERS <= 0 or not trabajos:
+        return (_generar(nombre, args, kwargs) for args, kwargs in trabajos)
+
+    lote = _lote(nombre, trabajos)
+    # Arranca hasta el primer yield: el cerrojo queda tomado y, ya dentro
+    # del try, close() lo libera aunque no se llegue a pedir ningun PDF
+    next(lote)
+    return lote
+
+
+def _lote(nombre, trabajos):
+    if not _lote_en_curso.acquire(blocking=False):
+        _contar("rechazados")
+        raise PdfNoDisponible("lote en curso", retry_after=PDF_RETRY_AFTER * 6)
+    try:
+        yield
+        with ProcessPoolExecutor(max_workers=max(1, min(PDF_LOTE_WORKERS, len(trabajos))),
+                                 mp_context=_contexto(), initializer=_iniciar_proceso) as pool:
+            futures = [pool.submit(_generar, nombre, args, kwargs) for args, kwargs in trabajos]
+            try:
+                for future in futures:
+                    yield future.result(timeout=PDF_TIMEOUT)
+                    _contar("completados")
+            except FuturesTimeout:
+                _contar("timeouts")
+                raise PdfNoDisponible("tiempo agotado")
+            finally:
+                # Si el cliente corta la descarga no se sigue generando
+                for future in futures:
+                    future.cancel()
+    finally:
+        _lote_en_curso.release()
+
+
+def estadisticas():
+    """Contadores de este proceso para el panel de sistema."""
+    with _cerrojo:
+        datos = dict(_stats)
+    datos.update(workers=PDF_WORKERS, cola_max=PDF_COLA_MAX, timeout=PDF_TIMEOUT, pid=os.getpid())
+    return datos
@@ -0,0 +1,229 @@
+"""Recursos compartidos por los generadores PDF de AndroTech.
+
+Colores, datos de la empresa, hojas de estilo de parrafo y ``TableStyle``
+se construyen una sola vez por proceso, al importar el modulo, en lugar
+de en cada documento.  Los ``TableStyle`` no se modifican al aplicarlos
+(``Table.setStyle`` solo lee sus comandos), asi que una misma instancia
+sirve para todas las tablas; no hay que llamar a ``.add()`` sobre ellos.
+
+Los tres documentos (presupuesto/factura, ticket de recogida e historial
+del cliente) usan las fuentes estandar Helvetica, que no se incrustan;
+:func:`precargar` deja cargadas sus metricas para que el primer PDF de
+cada worker no pague ese coste.
+
+Los flujos de pagina van comprimidos y en binario (sin ASCII85).
+"""
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.platypus import TableStyle
+
+# ASCII85 solo hace falta para transportes de 7 bits: engorda un 25% los
+# flujos y los adjuntos de email ya van en base64
+rl_config.useA85 = 0
+
+# Colores corporativos AndroTech
+AT_PRIMARY = colors.HexColor('#2B8AC4')
+AT_DARK = colors.HexColor('#0F1923')
+AT_LIGHT = colors.HexColor('#EBF5FB')
+AT_SUCCESS = colors.HexColor('#198754')
+AT_GRAY = colors.HexColor('#6c757d')
+AT_BORDER = colors.HexColor('#dee2e6')
+AT_ROW_ALT = colors.HexColor('#f8f9fa')
+AT_FOOTER = colors.HexColor('#9ba5b0')
+
+# Datos de la empresa
+COMPANY = {
+    'name': 'AndroTech',
+    'tagline': 'Taller de Reparacion de Dispositivos Moviles',
+    'address': 'Huelva, España',
+    'phone': '+34 633 234 395',
+    'email': 'manuelcortescontreras11@gmail.com',
+    'web': 'AndroTech',
+    'iva_rate': 0.21,
+}
+
+# Pie corporativo sin la fecha, que se anade en cada documento
+PIE_EMPRESA = (
+    f'<b>{COMPANY["name"]}</b> — {COMPANY["tagline"]}<br/>'
+    f'{COMPANY["address"]} | Tel: {COMPANY["phone"]} | {COMPANY["email"]}'
+)
+PIE_CORTO = 'AndroTech, Huelva | +34 633 234 395'
+
+FUENTES = ('Helvetica', 'Helvetica-Bold')
+
+
+def _construir_estilos():
+    """Hoja de estilos con los estilos propios de los tres documentos."""
+    styles = getSampleStyleSheet()
+    for estilo in (
+        # Presupuesto/factura e historial
+        ParagraphStyle(name='ATTitle', parent=styles['Heading1'], fontSize=22,
+                       textColor=AT_PRIMARY, alignment=TA_CENTER, spaceAfter=5),
+        ParagraphStyle(name='ATSub', parent=styles['Normal'], fontSize=10,
+                       textColor=AT_GRAY, alignment=TA_CENTER, spaceAfter=20),
+        ParagraphStyle(name='ATSection', parent=styles['Heading2'], fontSize=13,
+                       textColor=AT_DARK, spaceAfter=10),
+        ParagraphStyle(name='ATSmall', parent=styles['Normal'], fontSize=8,
+                       textColor=AT_GRAY, alignment=TA_CENTER),
+        ParagraphStyle(name='ATFooter', parent=styles['Normal'], fontSize=8,
+                       textColor=AT_FOOTER, alignment=TA_CENTER),
+        ParagraphStyle(name='Terms', parent=styles['Normal'], fontSize=8,
+                       textColor=AT_GRAY, leading=13),
+        ParagraphStyle(name='QRText', parent=styles['Normal'], fontSize=8,
+                       textColor=AT_GRAY, alignment=TA_LEFT),
+        # Ticket de recogida
+        ParagraphStyle(name='TKTitle', parent=styles['Heading1'], fontSize=20,
+                       textColor=AT_PRIMARY, alignment=TA_CENTER, spaceAfter=2),
+        ParagraphStyle(name='TKSub', parent=styles['Normal'], fontSize=9,
+                       textColor=AT_GRAY, alignment=TA_CENTER, spaceAfter=10),
+        ParagraphStyle(name='TKCenter', parent=styles['Normal'], fontSize=9,
+                       alignment=TA_CENTER),
+    ):
+        styles.add(estilo)
+    return styles
+
+
+STYLES = _construir_estilos()
+
+
+# =========================================
+#  Estilos de tabla
+# =========================================
+
+_PADDING_8 = [
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+]
+
+# Presupuesto/factura
+TS_CABECERA = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), AT_PRIMARY),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('TEXTCOLOR', (0, 1), (-1, -1), AT_GRAY),
+    *_PADDING_8,
+    ('LEFTPADDING', (0, 0), (-1, -1), 12),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+])
+
+
+def _ts_ficha(color_etiqueta):
+    return TableStyle([
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ('TOPPADDING', (0, 0), (-1, -1), 5),
+        ('TEXTCOLOR', (0, 0), (0, -1), color_etiqueta),
+        ('LINEBELOW', (0, -1), (-1, -1), 0.5, AT_BORDER),
+    ])
+
+
+TS_CLIENTE = _ts_ficha(AT_PRIMARY)
+TS_DISPOSITIVO = _ts_ficha(AT_DARK)
+
+TS_SERVICIOS = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), AT_DARK),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+    ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    *_PADDING_8,
+    ('LEFTPADDING', (0, 0), (-1, -1), 8),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, AT_BORDER),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, AT_ROW_ALT]),
+])
+
+TS_TOTALES = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    *_PADDING_8,
+    ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, -1), (-1, -1), 13),
+    ('BACKGROUND', (0, -1), (-1, -1), AT_SUCCESS),
+    ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+    ('LINEABOVE', (0, 0), (-1, 0), 1, AT_BORDER),
+])
+
+TS_QR = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 5),
+])
+
+# Historial del cliente
+TS_HISTORIAL_CLIENTE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('TEXTCOLOR', (0, 0), (0, -1), AT_PRIMARY),
+    ('LINEBELOW', (0, -1), (-1, -1), 1, AT_BORDER),
+])
+
+TS_HISTORIAL_RESUMEN = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), AT_PRIMARY),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 0.5, AT_BORDER),
+    ('BACKGROUND', (0, 1), (-1, -1), AT_LIGHT),
+])
+
+TS_HISTORIAL_DETALLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), AT_PRIMARY),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 7),
+    ('TOPPADDING', (0, 0), (-1, -1), 7),
+    ('GRID', (0, 0), (-1, -1), 0.5, AT_BORDER),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, AT_ROW_ALT]),
+])
+
+# Ticket de recogida
+TS_TICKET_INFO = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('TEXTCOLOR', (0, 0), (0, -1), AT_PRIMARY),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ('TOPPADDING', (0, 0), (-1, -1), 4),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+TS_TICKET_LAYOUT = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('ALIGN', (1, 0), (1, 0), 'CENTER'),
+])
+
+TS_SEPARADOR = TableStyle([
+    ('LINEABOVE', (0, 0), (-1, 0), 1, AT_BORDER),
+])
+
+# Margenes de los documentos A4
+MARGEN_A4 = 2 * cm
+
+
+def precargar():
+    """Carga las metricas de las fuentes estandar (idempotente)."""
+    for nombre in FUENTES:
+        pdfmetrics.getFont(nombre)
+        pdfmetrics.stringWidth('AndroTech', nombre, 10)
+
+
+precargar()
@@ -0,0 +1,202 @@
+"""Ticket de recogida para la impresora termica del mostrador (58/80 mm).
+
+Alternativa ligera al PDF de :func:`utils.pdf_generator.generar_ticket_recogida_pdf`:
+con los mismos datos de la reparacion genera
+
+- :func:`ticket_escpos`: bytes ESC/POS (texto, QR nativo de la impresora
+  con ``GS ( k`` y corte de papel), unos cientos de bytes;
+- :func:`ticket_texto`: el mismo ticket en texto plano, con la URL en vez
+  del QR, para impresoras sin ESC/POS o para verlo en pantalla.
+
+La maquetacion se describe una vez (:func:`_bloques`) y cada formato la
+pinta a su manera.  El texto va en la pagina de codigos PC858 (la de
+Epson con el simbolo del euro); lo que no exista en ella sale como ``?``.
+
+Para enviar el ticket, :func:`impresora_configurada` lee ``TICKET_IMPRESORA``:
+una ruta (dispositivo como ``/dev/usb/lp0`` o un fichero normal, que sirve
+de impresora de pruebas) o ``tcp://host:9100`` para impresoras de red.
+"""
+
+import os
+import socket
+import textwrap
+from datetime import datetime
+from functools import lru_cache
+
+from utils.pdf_toolkit import PIE_CORTO
+
+TICKET_IMPRESORA = os.environ.get("TICKET_IMPRESORA", "")
+TICKET_ANCHO_MM = int(os.environ.get("TICKET_ANCHO_MM", "80"))
+
+# Caracteres por linea con la fuente A
+COLUMNAS = {58: 32, 80: 48}
+# Tamano del modulo del QR (puntos) segun el ancho del papel
+MODULO_QR = {58: 5, 80: 6}
+
+CODIFICACION = 'cp858'
+
+# Comandos ESC/POS (ASCII, se codifican junto con el texto)
+ESC_INICIAR = '\x1b@'
+ESC_PC858 = '\x1bt\x13'
+ESC_IZQUIERDA = '\x1ba\x00'
+ESC_CENTRO = '\x1ba\x01'
+ESC_NEGRITA = '\x1bE\x01'
+ESC_NORMAL = '\x1bE\x00'
+GS_DOBLE = '\x1d!\x11'
+GS_TAMANO_NORMAL = '\x1d!\x00'
+GS_CORTE_PARCIAL = '\x1dVB\x03'  # avanza 3 lineas y corta
+
+
+# Controles C0 (menos el salto de linea) y DEL: dentro de un dato, un ESC o
+# GS seria un comando para la impresora (p. ej. abrir el cajon con ESC p).
+# Los datos vienen en parte del formulario publico de solicitud.
+_CONTROLES = dict.fromkeys([c for c in range(0x20) if c != 0x0a] + [0x7f])
+
+
+def _dato(valor):
+    """Campo de la reparacion sin caracteres de control, o ``-`` si queda vacio."""
+    return ('' if valor is None else str(valor)).translate(_CONTROLES) or '-'
+
+
+def _columnas(ancho_mm):
+    try:
+        return COLUMNAS[ancho_mm]
+    except KeyError:
+        raise ValueError(f"Ancho de papel no soportado: {ancho_mm} mm")
+
+
+def _bloques(reparacion, base_url, fecha=None):
+    """Contenido del ticket como lista de ``(tipo, *datos)``."""
+    rep_id = _dato(reparacion['id'])
+    fecha = fecha or datetime.now()
+    precio = reparacion['precio']
+    return [
+        ('titulo', 'AndroTech'),
+        ('negrita', 'TICKET DE RECOGIDA'),
+        ('separador',),
+        ('fila', 'Reparación:', f'#{rep_id}'),
+        ('fila', 'Cliente:', _dato(reparacion['cliente_nombre'])),
+        ('fila', 'Dispositivo:', _dato(reparacion['dispositivo'])),
+        ('fila', 'Estado:', _dato(reparacion['estado'])),
+        ('fila', 'Fecha entrada:', _dato(reparacion['fecha_entrada'])),
+        ('fila', 'Precio:', f"{precio:.2f} €" if precio else 'Pendiente'),
+        ('separador',),
+        ('qr', _dato(f"{base_url}/consulta?id={rep_id}")),
+        ('centro', 'Escanee el código QR para consultar el estado de su reparación en línea.'),
+        ('centro', 'Presente este ticket al recoger su dispositivo.'),
+        ('centro', f'Generado: {fecha.strftime("%d/%m/%Y %H:%M")}'),
+        *(('centro', parte) for parte in PIE_CORTO.split(' | ')),
+    ]
+
+
+@lru_cache(maxsize=256)
+def _envolver(texto, columnas):
+    # textwrap es lo mas caro del ticket y casi todos los textos son fijos
+    return tuple(textwrap.wrap(texto, columnas, break_on_hyphens=False))
+
+
+def _fila(etiqueta, valor, columnas):
+    """Etiqueta a la izquierda y valor a la derecha; si no cabe, valor debajo."""
+    hueco = columnas - len(etiqueta) - len(valor)
+    if hueco >= 1:
+        return [etiqueta + ' ' * hueco + valor]
+    return [etiqueta] + ['  ' + l for l in _envolver(valor, columnas - 2)]
+
+
+def ticket_texto(reparacion, base_url, ancho_mm=TICKET_ANCHO_MM, fecha=None):
+    """Ticket en texto plano (``str``, lineas de 32 o 48 caracteres)."""
+    columnas = _columnas(ancho_mm)
+    lineas = []
+    for tipo, *datos in _bloques(reparacion, base_url, fecha):
+        if tipo == 'separador':
+            lineas.append('-' * columnas)
+        elif tipo == 'fila':
+            lineas.extend(_fila(datos[0], datos[1], columnas))
+        elif tipo == 'qr':
+            lineas.append('')
+            lineas.extend(_envolver(datos[0], columnas))
+            lineas.append('')
+        else:
+            lineas.extend(l.center(columnas).rstrip() for l in _envolver(datos[0], columnas))
+    return '\n'.join(lineas) + '\n'
+
+
+def _qr(datos, modulo):
+    """QR modelo 2, correccion M, con los comandos ``GS ( k`` de la impresora."""
+    datos = datos.encode('ascii', errors='replace')
+    largo = len(datos) + 3
+    return b''.join([
+        b'\x1d(k\x04\x001A2\x00',                   # modelo 2
+        b'\x1d(k\x03\x001C' + bytes([modulo]),      # tamano del modulo
+        b'\x1d(k\x03\x001E1',                       # correccion M
+        b'\x1d(k' + bytes([largo & 0xff, largo >> 8]) + b'1P0' + datos,
+        b'\x1d(k\x03\x001Q0',                       # imprimir
+    ])
+
+
+def ticket_escpos(reparacion, base_url, ancho_mm=TICKET_ANCHO_MM, fecha=None):
+    """Ticket en bytes ESC/POS listo para enviar a la impresora."""
+    columnas = _columnas(ancho_mm)
+    # Los comandos de texto son ASCII y se codifican junto con el texto, de
+    # una vez; solo el QR (con su longitud en binario) va aparte
+    partes = []
+    texto = [ESC_INICIAR + ESC_PC858]
+    for tipo, *datos in _bloques(reparacion, base_url, fecha):
+        if tipo == 'titulo':
+            texto += [ESC_CENTRO, GS_DOBLE, datos[0], '\n', GS_TAMANO_NORMAL]
+        elif tipo == 'negrita':
+            texto += [ESC_CENTRO, ESC_NEGRITA, datos[0], '\n', ESC_NORMAL]
+        elif tipo == 'separador':
+            texto += [ESC_IZQUIERDA, '-' * columnas, '\n']
+        elif tipo == 'fila':
+            texto.append(ESC_IZQUIERDA)
+            texto += [l + '\n' for l in _fila(datos[0], datos[1], columnas)]
+        elif tipo == 'qr':
+            texto.append(ESC_CENTRO)
+            partes += [''.join(texto).encode(CODIFICACION, errors='replace'),
+                       _qr(datos[0], MODULO_QR[ancho_mm])]
+            texto = ['\n']
+        else:
+            texto.append(ESC_CENTRO)
+            texto += [l + '\n' for l in _envolver(datos[0], columnas)]
+    texto.append(GS_CORTE_PARCIAL)
+    partes.append(''.join(texto).encode(CODIFICACION, errors='replace'))
+    return b''.join(partes)
+
+
+class ImpresoraFichero:
+    """Escribe los tickets al final de un fichero o dispositivo.
+
+    Sirve para impresoras USB/paralelo (``/dev/usb/lp0``) y como impresora
+    de pruebas: cada ticket queda anadido al fichero tal cual.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+
+    def imprimir(self, datos):
+        with open(self.ruta, 'ab') as f:
+            f.write(datos)
+
+
+class ImpresoraRed:
+    """Impresora ESC/POS en red (puerto RAW, normalmente 9100)."""
+
+    def __init__(self, host, puerto=9100, timeout=5):
+        self.host = host
+        self.puerto = puerto
+        self.timeout = timeout
+
+    def imprimir(self, datos):
+        with socket.create_connection((self.host, self.puerto), timeout=self.timeout) as s:
+            s.sendall(datos)
+
+
+def impresora_configurada():
+    """Impresora de ``TICKET_IMPRESORA`` o ``None`` si no hay ninguna."""
+    if not TICKET_IMPRESORA:
+        return None
+    if TICKET_IMPRESORA.startswith('tcp://'):
+        host, _, puerto = TICKET_IMPRESORA[len('tcp://'):].partition(':')
+        return ImpresoraRed(host, int(puerto or 9100))
+    return ImpresoraFichero(TICKET_IMPRESORA)